@@ -0,0 +1,96 @@
+"""History store: ingest, compaction and query latency at millions of rows.
+
+Rows are generated straight into the log (Zipf-distributed over the
+distinct errors, spread over --days days), compacted every --batch rows
+the way `sb` would, and then the queries behind `sb stats` and `sb
+history` are timed on the resulting store.
+
+    python benchmarks/bench_history.py [--rows N] [--errors N] [--days N] [--batch N] [--repeat N]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from stackback import history
+
+DAY = 86400.0
+
+
+def fill(directory: str, rows: int, errors: int, days: int, batch: int) -> float:
+    """Write `rows` rows in time order, compacting every `batch`; returns seconds spent compacting."""
+    rng = random.Random(1)
+    weights = [1 / (rank + 1) for rank in range(errors)]
+    kinds = rng.choices(range(errors), weights, k=rows)
+    start = time.time() - days * DAY
+    step = days * DAY / rows
+    log = os.path.join(directory, history.LOG_FILE)
+    compacting = 0.0
+    for first in range(0, rows, batch):
+        with open(log, "w") as f:
+            for i in range(first, min(rows, first + batch)):
+                kind = kinds[i]
+                f.write(json.dumps({
+                    "ts": round(start + i * step, 3), "fingerprint": f"{kind:040x}", "error_type": "KeyError",
+                    "message": f"'key{kind}'", "location": f"app/mod{kind % 50}.py:{kind}", "language": "python",
+                    "command": f"pytest tests/test_{kind % 20}.py", "host": f"ci-{i % 8}", "exit_code": 1,
+                }) + "\n")
+        started = time.perf_counter()
+        history.compact(directory)
+        compacting += time.perf_counter() - started
+    return compacting
+
+
+def best(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--errors", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--batch", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="sb-history-")
+    try:
+        compacting = fill(directory, args.rows, args.errors, args.days, args.batch)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        with history.History(directory) as store:
+            print(f"{len(store):,} rows, {len(store.errors):,} errors, {len(store.segments)} segment(s), "
+                  f"{size / 1e6:.1f} MB on disk ({size / len(store):.1f} B/row), compaction {compacting:.1f} s total")
+            now = store.segments[-1].last + 1
+            top_id = store.top(1)[0][0].fingerprint
+            cases = [
+                ("open", lambda: history.History(directory).close()),
+                ("top 10 (all time)", lambda: store.top(10)),
+                ("top 10 (last 7 days)", lambda: store.top(10, since=now - 7 * DAY)),
+                ("top 10 (last 30 days)", lambda: store.top(10, since=now - 30 * DAY)),
+                ("first occurrence", lambda: store.error(top_id[:8])),
+                (f"trend, {args.days} daily buckets", lambda: store.trend(now - args.days * DAY, now, args.days)),
+                ("trend of one error, daily", lambda: store.trend(now - args.days * DAY, now, args.days, top_id)),
+                ("recent 20", lambda: store.recent(20)),
+            ]
+            for name, func in cases:
+                print(f"  {name:<32}{best(func, args.repeat) * 1000:>10.2f} ms")
+            out = os.path.join(directory, "export.jsonl")
+            started = time.perf_counter()
+            count = history.export(store, out, since=now - DAY)
+            print(f"  {'export last day (' + format(count, ',') + ' rows)':<32}"
+                  f"{(time.perf_counter() - started) * 1000:>10.2f} ms")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
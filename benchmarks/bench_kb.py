@@ -0,0 +1,69 @@
+"""Open time and query latency of the offline knowledge base.
+
+Builds an index over a synthetic corpus of the given size (error titles
+and answers drawn from a Zipf-distributed vocabulary, so common terms
+have long posting lists) and reports the time to open it and p50/p99 query latency
+for error-shaped queries.
+
+    python benchmarks/bench_kb.py [--docs N] [--queries N]
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from stackback.kb import KnowledgeBase, build_index
+
+ERRORS = ["KeyError", "TypeError", "ValueError", "AttributeError", "ImportError", "ModuleNotFoundError",
+          "ConnectionResetError", "JSONDecodeError", "RecursionError", "IndexError", "FileNotFoundError"]
+COMMON = ("object has no attribute unsupported operand type int str NoneType list index out of range "
+          "invalid literal for with base expecting value line column connection reset by peer no module "
+          "named maximum recursion depth exceeded dict key missing config settings request response json "
+          "pandas numpy django flask requests sqlalchemy asyncio thread pool socket timeout encoding utf").split()
+# Identifiers follow a long-tailed distribution: a few are everywhere, most are rare
+WORDS = COMMON + [f"name{i}" for i in range(20_000)]
+CUMULATIVE = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(WORDS))))
+
+
+def corpus(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    for i in range(count):
+        title = f"{rng.choice(ERRORS)}: {' '.join(rng.choices(WORDS, cum_weights=CUMULATIVE, k=6))}"
+        body = " ".join(rng.choices(WORDS, cum_weights=CUMULATIVE, k=80))
+        yield {"title": title, "text": f"{title} {title} {body}", "excerpt": body[:200],
+               "url": f"https://stackoverflow.com/questions/{i}", "score": rng.randint(0, 100)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    queries = [f"{rng.choice(ERRORS)}: {' '.join(rng.choices(WORDS, cum_weights=CUMULATIVE, k=5))}"
+               for _ in range(args.queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "kb.idx")
+        started = time.perf_counter()
+        build_index(corpus(args.docs), path)
+        print(f"build   {time.perf_counter() - started:8.2f} s  ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+        started = time.perf_counter()
+        kb = KnowledgeBase(path)
+        print(f"open    {(time.perf_counter() - started) * 1000:8.2f} ms")
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            kb.search(query)
+            timings.append(time.perf_counter() - started)
+        kb.close()
+    timings.sort()
+    print(f"query   p50 {timings[len(timings) // 2] * 1000:.2f} ms  "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1000:.2f} ms  ({len(timings)} queries)")
+
+
+if __name__ == "__main__":
+    main()
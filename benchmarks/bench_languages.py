@@ -0,0 +1,95 @@
+"""Detection and parse cost per language, and how detection scales with parsers.
+
+Each sample error is appended to a tail of ordinary log output (the size of
+the runner's stderr tail by default) and timed through `parse_error`, which
+classifies the tail and runs the candidate parsers.  Then the classifier
+alone is timed on error-free output while synthetic parsers are added, next
+to a naive scan that searches for every signature in turn.
+
+    python benchmarks/bench_languages.py [--tail-kb N] [--repeat N]
+"""
+import argparse
+import random
+import time
+
+from stackback.languages import LanguageParser, Registry, registry
+from stackback.parser import parse_error
+
+SAMPLES = {
+    "python": 'Traceback (most recent call last):\n  File "/app/main.py", line 3, in <module>\n'
+              '    main()\nValueError: bad value\n',
+    "pytest": "===== FAILURES =====\n___ test_key ___\n\n    def test_key():\n>       d['k']\n"
+              "E       KeyError: 'k'\n\ntest_x.py:2: KeyError\n===== short test summary info =====\n"
+              "FAILED test_x.py::test_key - KeyError: 'k'\n",
+    "node": "TypeError: Cannot read properties of undefined (reading 'host')\n    at load (/app/a.js:1:36)\n"
+            "    at main (/app/a.js:2:26)\n    at Module._compile (node:internal/modules/cjs/loader:1521:14)\n",
+    "go": "panic: runtime error: index out of range [5] with length 3\n\ngoroutine 1 [running]:\n"
+          "main.get(...)\n\t/app/main.go:3\nmain.main()\n\t/app/main.go:7 +0x18\nexit status 2\n",
+    "rust": "thread 'main' panicked at r.rs:1:42:\nindex out of bounds: the len is 3 but the index is 5\n"
+            "note: run with `RUST_BACKTRACE=1` environment variable to display a backtrace\n",
+    "java": 'Exception in thread "main" java.lang.IllegalStateException: boom\n'
+            "\tat com.example.App.load(App.java:21)\n\tat com.example.App.main(App.java:9)\n",
+}
+
+WORDS = "request served user cache hit miss connection pool worker started stopped took ms GET POST".split()
+
+
+def noise(size: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    lines, total = [], 0
+    while total < size:
+        line = f"2024-05-01 12:00:{rng.randint(0, 59):02d} INFO {' '.join(rng.choices(WORDS, k=8))}"
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def best(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1e6
+
+
+class Synthetic(LanguageParser):
+    def __init__(self, index: int):
+        self.name = f"synthetic{index}"
+        self.signatures = (f"ERR{index:03d}: ".encode(), f"!{index:03d}".encode())
+
+    def parse(self, text):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tail-kb", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tail = noise(args.tail_kb * 1024)
+    print(f"{'language':<10}{'classify us':>13}{'parse_error us':>16}  result")
+    for language, sample in SAMPLES.items():
+        text = tail + sample
+        error = parse_error(text)
+        classify = best(lambda: registry.classify(text), args.repeat)
+        parse = best(lambda: parse_error(text), args.repeat)
+        print(f"{language:<10}{classify:>13.0f}{parse:>16.0f}  {error.language}: {error.error_type}")
+
+    data = tail.encode()
+    print(f"\n{'parsers':<10}{'signatures':>11}{'classify us':>13}{'naive us':>10}")
+    local = Registry()
+    for parser in registry.parsers:
+        local.register(parser)
+    for target in (len(local.parsers), 12, 24, 48):
+        while len(local.parsers) < target:
+            local.register(Synthetic(len(local.parsers)))
+        signatures = [s for p in local.parsers for s in p.signatures]
+        classify = best(lambda: local.classify(data), args.repeat)
+        naive = best(lambda: [s for s in signatures if data.startswith(s) or b"\n" + s in data], args.repeat)
+        print(f"{len(local.parsers):<10}{len(signatures):>11}{classify:>13.0f}{naive:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
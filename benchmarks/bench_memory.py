@@ -0,0 +1,54 @@
+"""Per-error memory footprint of parsed tracebacks.
+
+Parses a synthetic log holding many tracebacks that share file paths (the
+common case when aggregating a test run or worker log) and reports the
+retained bytes per `ParsedError`, with and without the raw traceback text.
+
+    python benchmarks/bench_memory.py [--errors N] [--depth D]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from stackback.parser import parse_all
+
+
+def make_log(errors: int, depth: int) -> bytes:
+    parts = []
+    for i in range(errors):
+        parts.append("INFO request %d handled\n" % i)
+        parts.append("Traceback (most recent call last):\n")
+        for d in range(depth):
+            parts.append('  File "/srv/app/handlers/module_%d.py", line %d, in handler_%d\n' % (d, 10 + d, d))
+            parts.append("    result = next_stage(request, context)\n")
+        parts.append("KeyError: 'user_%d'\n" % i)
+    return "".join(parts).encode()
+
+
+def measure(data: bytes, keep_raw: bool) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    errors = list(parse_all(data, keep_raw=keep_raw))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return retained / len(errors)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--errors", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_log(args.errors, args.depth)
+    print(f"{args.errors} errors, {args.depth} frames each, {len(data) / 1e6:.1f} MB of log")
+    raw = measure(data, keep_raw=True)
+    compact = measure(data, keep_raw=False)
+    print(f"  keep_raw=True : {raw:8.0f} bytes/error")
+    print(f"  keep_raw=False: {compact:8.0f} bytes/error ({raw / compact:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Import-time budget for the `sb` entry point.
+
+`sb` wraps every command, so its own startup is paid on every run.  This
+measures the cumulative `-X importtime` cost of everything a successful run
+imports (`stackback.main` and the runner, with bytecode caching on, after
+one warm-up run) and fails if it is over budget or if typer, rich or the
+LLM client were pulled in on the fast path.
+
+    python benchmarks/bench_startup.py [--runs N] [--budget-ms MS]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("typer", "click", "rich", "openai", "requests")
+
+FAST_PATH = "import stackback.main, stackback.runner"
+
+_CHECK = (
+    FAST_PATH + "; import sys; "
+    "print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+)
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def import_time_us(env: dict) -> int:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", FAST_PATH],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    total = 0
+    for line in proc.stderr.splitlines():
+        fields = line.split("|")
+        # Top-level stackback imports only; their children are included
+        if len(fields) == 3 and fields[2].startswith(" stackback"):
+            total += int(fields[1])
+    if not total:
+        raise RuntimeError("stackback missing from -X importtime output")
+    return total
+
+
+def heavy_imports(env: dict) -> list:
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHECK], env=env, capture_output=True, text=True, check=True,
+    )
+    return [name for name in proc.stdout.strip().split(",") if name]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=25.0)
+    args = parser.parse_args()
+
+    env = _env()
+    import_time_us(env)  # warm the bytecode cache
+    samples = [import_time_us(env) / 1000 for _ in range(args.runs)]
+    median = statistics.median(samples)
+    loaded = heavy_imports(env)
+
+    print(f"sb fast path imports: median {median:.1f} ms, min {min(samples):.1f} ms "
+          f"over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if loaded:
+        print(f"FAIL: fast path imported {', '.join(loaded)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: startup over budget by {median - args.budget_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Throughput of `sb triage` against the number of worker processes.
+
+Writes a synthetic log of the given size (mostly ordinary log lines, with
+tracebacks and exception chains mixed in) and reports MB/s for each job
+count, so scaling with cores can be checked on the machine at hand.
+
+    python benchmarks/bench_triage.py [--mb N] [--jobs 1,2,4,8]
+"""
+import argparse
+import os
+import tempfile
+
+from stackback.triage import triage
+
+BLOCK = (
+    "2024-05-01T12:00:00 INFO worker handled request id=%d in 12ms\n" * 40
+    + "Traceback (most recent call last):\n"
+    '  File "/srv/app/handlers/orders.py", line 88, in create\n'
+    "    total = compute_total(cart)\n"
+    '  File "/usr/lib/python3.11/site-packages/pricing/core.py", line 301, in compute_total\n'
+    "    return sum(item.price for item in cart.items)\n"
+    "TypeError: unsupported operand type(s) for +: 'int' and 'NoneType'\n"
+    + "2024-05-01T12:00:01 WARN retrying upstream call\n" * 20
+    + "Traceback (most recent call last):\n"
+    '  File "/srv/app/db.py", line 41, in query\n'
+    "    cursor.execute(sql)\n"
+    "ConnectionResetError: [Errno 104] Connection reset by peer\n"
+    "\nThe above exception was the direct cause of the following exception:\n\n"
+    "Traceback (most recent call last):\n"
+    '  File "/srv/app/api.py", line 17, in get_user\n'
+    "    raise UpstreamError('database unavailable') from exc\n"
+    "UpstreamError: database unavailable\n"
+)
+
+
+def write_log(path: str, megabytes: int) -> None:
+    block = BLOCK.replace("%d", "1234").encode()
+    repeats = megabytes * 1024 * 1024 // len(block) + 1
+    with open(path, "wb") as f:
+        for _ in range(repeats):
+            f.write(block)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=int, default=256)
+    cores = os.cpu_count() or 1
+    parser.add_argument("--jobs", default=",".join(str(j) for j in (1, 2, 4, 8, cores) if j <= cores))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.log")
+        write_log(path, args.mb)
+        triage([path], jobs=1, slice_size=1 << 20)  # warm the page cache
+        base = None
+        for jobs in sorted({int(j) for j in args.jobs.split(",")}):
+            report = triage([path], jobs=jobs)
+            base = base or report.mb_per_s
+            print(f"jobs={jobs:<3} {report.mb_per_s:8.1f} MB/s  x{report.mb_per_s / base:4.1f}  "
+                  f"({report.total} errors, {len(report.groups)} groups)")
+
+
+if __name__ == "__main__":
+    main()
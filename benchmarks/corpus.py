@@ -0,0 +1,110 @@
+"""Generated inputs for the benchmark suite.
+
+Every case is deterministic for a given seed, so two runs of the suite on
+different commits parse the same bytes:
+
+- small:     one short traceback, the everyday case
+- recursion: a RecursionError through `depth` distinct frames (10k by default)
+- chained:   `links` exceptions joined by "direct cause" / "during handling"
+- log:       a large log with a traceback every `every` bytes or so, written
+             in blocks so multi-GB files never sit in memory
+
+    python benchmarks/corpus.py OUT_DIR [--log-mb N] [--depth N]
+"""
+import argparse
+import os
+import random
+
+WORDS = "request served user cache hit miss connection pool worker started stopped took ms GET POST".split()
+TYPES = ["KeyError: 'user_id'", "TypeError: unsupported operand type(s) for +: 'int' and 'NoneType'",
+         "ValueError: invalid literal for int() with base 10: 'abc'", "AttributeError: 'NoneType' object has no "
+         "attribute 'get'", "ConnectionResetError: [Errno 104] Connection reset by peer"]
+
+
+def _frame(path: str, line: int, function: str, source: str) -> str:
+    return f'  File "{path}", line {line}, in {function}\n    {source}\n'
+
+
+def small() -> str:
+    return (
+        "Traceback (most recent call last):\n"
+        + _frame("/srv/app/main.py", 12, "<module>", "main()")
+        + _frame("/srv/app/main.py", 8, "main", "print(config['port'])")
+        + "KeyError: 'port'\n"
+    )
+
+
+def recursion(depth: int = 10_000) -> str:
+    parts = ["Traceback (most recent call last):\n"]
+    for i in range(depth):
+        parts.append(_frame(f"/srv/app/tree/node_{i % 97}.py", 10 + i % 400, f"visit_{i % 13}",
+                            "return self.visit(child, depth + 1)"))
+    parts.append("RecursionError: maximum recursion depth exceeded\n")
+    return "".join(parts)
+
+
+def chained(links: int = 5) -> str:
+    parts = []
+    for i in range(links):
+        if i:
+            parts.append("\nThe above exception was the direct cause of the following exception:\n\n"
+                         if i % 2 else
+                         "\nDuring handling of the above exception, another exception occurred:\n\n")
+        parts.append("Traceback (most recent call last):\n")
+        for d in range(4):
+            parts.append(_frame(f"/srv/app/layer_{i}.py", 20 + d, f"call_{d}", "return next_layer(request)"))
+        parts.append(TYPES[i % len(TYPES)] + "\n")
+    return "".join(parts)
+
+
+def log_block(rng: random.Random, size: int) -> str:
+    """`size` bytes or so of ordinary log lines followed by one traceback."""
+    lines, total = [], 0
+    while total < size:
+        line = f"2024-05-01T12:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} INFO {' '.join(rng.choices(WORDS, k=9))}\n"
+        lines.append(line)
+        total += len(line)
+    lines.append("Traceback (most recent call last):\n")
+    for d in range(rng.randint(2, 12)):
+        lines.append(_frame(f"/srv/app/handlers/module_{d}.py", 10 + d, f"handler_{d}", "result = stage(request)"))
+    lines.append(rng.choice(TYPES) + "\n")
+    return "".join(lines)
+
+
+def write_log(path: str, size: int, every: int = 1 << 20, seed: int = 1) -> int:
+    """Write a log of about `size` bytes with one traceback per `every` bytes; returns the error count."""
+    rng = random.Random(seed)
+    # A handful of distinct blocks, repeated: generating is then as fast as writing
+    blocks = [log_block(rng, every).encode() for _ in range(8)]
+    written = errors = 0
+    with open(path, "wb") as f:
+        while written < size:
+            block = blocks[errors % len(blocks)]
+            f.write(block)
+            written += len(block)
+            errors += 1
+    return errors
+
+
+def clean(size: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    return log_block(rng, size).split("Traceback", 1)[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out")
+    parser.add_argument("--log-mb", type=int, default=256)
+    parser.add_argument("--depth", type=int, default=10_000)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for name, text in (("small.txt", small()), ("recursion.txt", recursion(args.depth)), ("chained.txt", chained())):
+        with open(os.path.join(args.out, name), "w") as f:
+            f.write(text)
+    errors = write_log(os.path.join(args.out, "log.txt"), args.log_mb << 20)
+    print(f"wrote {args.out}: small, recursion ({args.depth} frames), chained, log ({args.log_mb} MB, {errors} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""A local OpenAI-compatible endpoint for offline end-to-end benchmarks.
+
+`MockLLM` serves `/v1/chat/completions` as a server-sent event stream:
+it waits `first_token_ms` before the first chunk and `token_ms` between
+chunks, like a real provider, and counts the requests it answered.
+Point the client at it with `OPENAI_BASE_URL=<mock.url>/v1`.
+
+    with MockLLM(first_token_ms=200) as mock:
+        os.environ["OPENAI_BASE_URL"] = mock.url + "/v1"
+        ...
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "EXPLANATION:\nThe dictionary has no 'port' key when this line runs.\n\n"
+    "FIX:\n```python\nprint(config.get('port', 8080))\n```"
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        mock = self.server.mock
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(mock.first_token_ms / 1000)
+        words = ANSWER.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(mock.token_ms / 1000)
+            delta = word if i == len(words) - 1 else word + " "
+            self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': delta}}]})}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        with mock.lock:
+            mock.requests += 1
+
+    def _chunk(self, text: str) -> None:
+        data = text.encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class MockLLM:
+    def __init__(self, first_token_ms: float = 0.0, token_ms: float = 0.0):
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._server = None
+
+    def __enter__(self) -> "MockLLM":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
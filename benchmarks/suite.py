@@ -0,0 +1,235 @@
+"""Benchmark suite: parser, runner, CLI startup and offline end-to-end latency.
+
+`run` measures everything on the generated corpus (see corpus.py) and
+writes one JSON file per run.  `compare` checks a run against a baseline
+and exits 1 if any metric got worse by more than the threshold, so it can
+gate a commit in CI:
+
+    python benchmarks/suite.py run --out base.json          # on the old commit
+    python benchmarks/suite.py run --out new.json --baseline base.json
+
+The end-to-end case talks to a local mock provider (mock_llm.py), so the
+suite needs no network and no API key.  Use --log-mb 2048 or more for the
+multi-GB log case; the default keeps a run under a minute.
+
+    python benchmarks/suite.py run [--out FILE] [--baseline FILE] [--log-mb N] [--repeat N]
+    python benchmarks/suite.py compare BASELINE NEW [--threshold 0.15]
+"""
+import argparse
+import datetime
+import json
+import mmap
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import corpus
+from mock_llm import MockLLM
+
+from stackback.parser import is_error_output, parse_all, parse_error
+
+FORMAT = 1
+THRESHOLD = 0.15
+TAIL_BYTES = 256 * 1024
+
+
+class Results:
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name: str, value: float, unit: str, better: str = "lower", floor: float = 0.0) -> None:
+        """`floor`: changes smaller than this (in `unit`) are noise, never regressions."""
+        self.metrics[name] = {"value": round(value, 4), "unit": unit, "better": better, "floor": floor}
+        print(f"  {name:<34}{value:>12.3f} {unit}")
+
+
+def best(func, repeat: int, number: int = 1) -> float:
+    """Seconds per call, fastest of `repeat` batches of `number` calls (CPU-bound work)."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) / number
+
+
+def median_wall(func, repeat: int) -> float:
+    """Median of `repeat` calls, in seconds (for work that waits on other processes)."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def bench_parser(results: Results, repeat: int) -> None:
+    small, deep, chain = corpus.small(), corpus.recursion(), corpus.chained()
+    tail = (corpus.clean(TAIL_BYTES) + small)[-TAIL_BYTES:]
+    clean = corpus.clean(TAIL_BYTES)
+    assert parse_error(deep).error_type == "RecursionError" and len(parse_error(deep).frames) == 10_000
+    assert parse_error(chain).cause is not None and parse_error(tail).error_type == "KeyError"
+
+    results.add("parse_error.small", best(lambda: parse_error(small), repeat, 200) * 1e6, "us")
+    results.add("parse_error.recursion_10k", best(lambda: parse_error(deep), repeat) * 1e3, "ms")
+    results.add("parse_error.chained", best(lambda: parse_error(chain), repeat, 50) * 1e6, "us")
+    results.add("parse_error.tail_256k", best(lambda: parse_error(tail), repeat) * 1e3, "ms")
+    results.add("is_error_output.small", best(lambda: is_error_output(small), repeat, 10_000) * 1e6, "us")
+    results.add("is_error_output.clean_256k", best(lambda: is_error_output(clean), repeat) * 1e3, "ms")
+    results.add("is_error_output.tail_256k", best(lambda: is_error_output(tail), repeat) * 1e3, "ms")
+
+
+def bench_log(results: Results, log_mb: int, tmp: str) -> None:
+    path = os.path.join(tmp, "log.txt")
+    expected = corpus.write_log(path, log_mb << 20)
+    size = os.path.getsize(path)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        started = time.perf_counter()
+        found = sum(1 for _ in parse_all(data, keep_raw=False))
+        elapsed = time.perf_counter() - started
+    os.remove(path)
+    if found != expected:
+        raise SystemExit(f"parse_all found {found} errors in the log, expected {expected}")
+    results.add(f"parse_all.log_{log_mb}mb", size / elapsed / 1e6, "MB/s", better="higher")
+
+
+def bench_runner(results: Results, repeat: int) -> None:
+    from stackback.runner import stream_command
+
+    # A child that writes 8 MB to stderr, run bare and through the runner
+    noisy = [sys.executable, "-c",
+             "import sys\nfor _ in range(8 * 1024): sys.stderr.buffer.write(b'log line ' * 113 + b'\\n')"]
+    quiet = [sys.executable, "-c", "pass"]
+    with open(os.devnull, "wb") as devnull:
+        for name, command in (("quiet", quiet), ("stderr_8mb", noisy)):
+            bare = median_wall(lambda: subprocess.run(command, stderr=devnull, check=True), repeat)
+            wrapped = median_wall(lambda: stream_command(command, stderr_sink=devnull), repeat)
+            results.add(f"runner.{name}.overhead", (wrapped - bare) * 1e3, "ms", floor=5.0)
+
+
+def bench_startup(results: Results, repeat: int) -> None:
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    python = [sys.executable, "-c", "pass"]
+    sb = [sys.executable, "-c", "from stackback.main import main; main(['true'])"]
+
+    def run(command):
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, check=True)
+
+    run(sb)  # warm the bytecode cache
+    bare = median_wall(lambda: run(python), repeat)
+    wrapped = median_wall(lambda: run(sb), repeat)
+    results.add("cli.sb_true", wrapped * 1e3, "ms")
+    results.add("cli.startup_overhead", (wrapped - bare) * 1e3, "ms", floor=5.0)
+
+
+def bench_end_to_end(results: Results, repeat: int) -> None:
+    from stackback.llm import LLMExplainer
+
+    with MockLLM() as mock:
+        os.environ["OPENAI_BASE_URL"] = mock.url + "/v1"
+        text = corpus.small()
+
+        def explain():
+            error = parse_error(text)
+            explanation, fix = LLMExplainer(api_key="bench", cache=False, rules=False, combined=True).explain_and_fix(error)
+            assert "port" in explanation and fix
+
+        explain()
+        elapsed = median_wall(explain, repeat * 5)
+        if mock.requests != repeat * 5 + 1:
+            raise SystemExit(f"mock provider answered {mock.requests} requests, expected {repeat * 5 + 1}")
+    results.add("e2e.parse_explain_fix", elapsed * 1e3, "ms")
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(args) -> int:
+    results = Results()
+    with tempfile.TemporaryDirectory() as tmp:
+        print("parser")
+        bench_parser(results, args.repeat)
+        bench_log(results, args.log_mb, tmp)
+        print("runner and CLI")
+        bench_runner(results, args.repeat)
+        bench_startup(results, args.repeat)
+        print("end to end (mock provider)")
+        bench_end_to_end(results, args.repeat)
+    report = {
+        "format": FORMAT,
+        "commit": _commit(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "options": {"log_mb": args.log_mb, "repeat": args.repeat},
+        "metrics": results.metrics,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"wrote {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            return compare(json.load(f), report, args.threshold)
+    return 0
+
+
+def compare(baseline: dict, current: dict, threshold: float = THRESHOLD) -> int:
+    """Print the change of every metric; 1 if any regressed by more than `threshold`."""
+    regressions = []
+    print(f"\n{'metric':<34}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, new in current["metrics"].items():
+        old = baseline["metrics"].get(name)
+        if old is None or not old["value"]:
+            print(f"{name:<34}{'-':>12}{new['value']:>12.3f}")
+            continue
+        change = (new["value"] - old["value"]) / abs(old["value"])
+        worse = change if new["better"] == "lower" else -change
+        flag = ""
+        if worse > threshold and abs(new["value"] - old["value"]) > new.get("floor", 0.0):
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<34}{old['value']:>12.3f}{new['value']:>12.3f}{change:>+9.1%}{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) worse than {baseline.get('commit') or 'the baseline'} "
+              f"by more than {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--out")
+    run_parser.add_argument("--baseline")
+    run_parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    run_parser.add_argument("--log-mb", type=int, default=256)
+    run_parser.add_argument("--repeat", type=int, default=5)
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        sys.exit(run(args))
+    with open(args.baseline) as f, open(args.current) as g:
+        sys.exit(compare(json.load(f), json.load(g), args.threshold))
+
+
+if __name__ == "__main__":
+    main()
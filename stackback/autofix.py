@@ -0,0 +1,322 @@
+"""Apply suggested fixes in isolation, re-run the command, keep what works.
+
+A suggestion (from the LLM or a rule) is a code snippet, not a patch.
+`candidate_patches` turns it into concrete edits of the failing file: the
+function it redefines, the lines around the failing line it most resembles,
+or the imports it adds.  Each candidate is applied in its own scratch copy
+of the working directory and the original command is re-run there;
+`try_fixes` runs the candidates in parallel and the first one whose run
+exits cleanly wins, while the others are killed.  Nothing outside the
+scratch copies is touched until `Patch.apply` is called on the winner,
+with one exception: environments (virtualenvs, `node_modules`) are too big
+to copy and are symlinked into every copy instead.  A command that
+installs packages therefore changes the real environment, and candidates
+running in parallel share it.  Version control directories are not copied
+at all, so hooks and commands writing to `.git` cannot reach the real one.
+"""
+import difflib
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional, Sequence
+
+from .parser import ParsedError, parse_error
+
+RUN_TIMEOUT = 60.0
+MAX_JOBS = 4
+MAX_COPY_BYTES = 256 * 1024 * 1024
+# Not copied into scratch copies: caches and version control are skipped,
+# environments are symlinked (shared with the real tree)
+SKIPPED_DIRS = frozenset(("__pycache__", ".mypy_cache", ".pytest_cache", ".ruff_cache", ".git", ".hg", ".svn"))
+LINKED_DIRS = frozenset((".venv", "venv", ".tox", ".nox", "node_modules"))
+
+_FENCE_RE = re.compile(r"```[\w+-]*\n(.*?)```", re.DOTALL)
+_DEF_RE = re.compile(r"(?:async\s+)?(?:def|class)\s+(\w+)")
+_IMPORT_RE = re.compile(r"(?:import\s+\w|from\s+[\w.]+\s+import\s)")
+
+
+class Patch:
+    """A replacement of lines `start`..`end` (0-based, end exclusive) of one file."""
+
+    __slots__ = ("path", "original", "start", "end", "replacement", "label")
+
+    def __init__(self, path: str, original: List[str], start: int, end: int, replacement: List[str], label: str):
+        self.path = path
+        self.original = original
+        self.start = start
+        self.end = end
+        self.replacement = replacement
+        self.label = label
+
+    @property
+    def lines(self) -> List[str]:
+        return self.original[:self.start] + self.replacement + self.original[self.end:]
+
+    @property
+    def text(self) -> str:
+        return "".join(self.lines)
+
+    def diff(self, root: Optional[str] = None) -> str:
+        name = os.path.relpath(self.path, root) if root else self.path
+        return "".join(difflib.unified_diff(self.original, self.lines, f"a/{name}", f"b/{name}"))
+
+    def apply(self, path: Optional[str] = None) -> None:
+        """Write the patched file to `path` (default: the real file), atomically.
+
+        Applying to the real file fails if it changed since it was read.
+        """
+        target = path or self.path
+        if path is None:
+            with open(target, encoding="utf-8", newline="") as f:
+                if f.read() != "".join(self.original):
+                    raise RuntimeError(f"{target} changed since the fix was computed")
+        tmp = f"{target}.stackback-{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(self.text)
+        try:
+            shutil.copymode(target, tmp)
+        except OSError:
+            pass
+        os.replace(tmp, target)
+
+    def __repr__(self) -> str:
+        return f"Patch({self.path!r}, {self.label!r})"
+
+
+class Attempt:
+    """The outcome of re-running the command with one patch applied."""
+
+    __slots__ = ("patch", "passed", "returncode", "error", "elapsed", "cancelled")
+
+    def __init__(self, patch: Patch, passed: bool, returncode: Optional[int], error: Optional[ParsedError],
+                 elapsed: float, cancelled: bool = False):
+        self.patch = patch
+        self.passed = passed
+        self.returncode = returncode
+        self.error = error
+        self.elapsed = elapsed
+        self.cancelled = cancelled
+
+
+class FixResult:
+    __slots__ = ("winner", "attempts", "elapsed")
+
+    def __init__(self, winner: Optional[Attempt], attempts: List[Attempt], elapsed: float):
+        self.winner = winner
+        self.attempts = attempts
+        self.elapsed = elapsed
+
+
+def extract_code(suggestion: str) -> List[str]:
+    """The code lines of a suggestion: the first fenced block if any, dedented."""
+    match = _FENCE_RE.search(suggestion)
+    code = match.group(1) if match else suggestion
+    return textwrap.dedent(code).strip("\n").splitlines()
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _reindent(code: List[str], indent: str, newline: str) -> List[str]:
+    return [(indent + line if line.strip() else "") + newline for line in code]
+
+
+def _block_end(lines: List[str], start: int) -> int:
+    """End (exclusive) of the indented block opened by lines[start]."""
+    base = len(_indent(lines[start]))
+    end = start + 1
+    for index in range(start + 1, len(lines)):
+        if lines[index].strip():
+            if len(_indent(lines[index])) <= base:
+                break
+            end = index + 1
+    return end
+
+
+def _target_frame(error: ParsedError):
+    for frame in reversed(error.frames):
+        if not frame.is_library and frame.line and os.path.isfile(frame.file):
+            return frame
+    return None
+
+
+def candidate_patches(error: ParsedError, suggestion: str) -> List[Patch]:
+    """Ways of applying `suggestion` to the file of the innermost user frame, best first."""
+    frame = _target_frame(error)
+    code = extract_code(suggestion)
+    if frame is None or not any(line.strip() and not line.lstrip().startswith("#") for line in code):
+        return []
+    path = os.path.abspath(frame.file)
+    with open(path, encoding="utf-8", newline="") as f:
+        original = f.read().splitlines(keepends=True)
+    if not original or frame.line > len(original):
+        return []
+    newline = "\r\n" if original[0].endswith("\r\n") else "\n"
+    failing = frame.line - 1
+
+    statements = [line for line in code if line.strip() and not line.lstrip().startswith("#")]
+    if all(_IMPORT_RE.match(line.strip()) for line in statements):
+        # Missing imports go after the module's last top-level import
+        at = 0
+        for index, line in enumerate(original):
+            if _IMPORT_RE.match(line) or (index == 0 and line.startswith("#!")):
+                at = index + 1
+        return [Patch(path, original, at, at, [line.strip() + newline for line in statements], "add import")]
+
+    patches = []
+    match = _DEF_RE.match(code[0].strip())
+    if match:
+        # A whole definition: replace the one with that name, nearest the failing line first
+        pattern = re.compile(rf"\s*(?:async\s+)?(?:def|class)\s+{re.escape(match.group(1))}\b")
+        starts = [i for i, line in enumerate(original) if pattern.match(line)]
+        for start in sorted(starts, key=lambda i: (i > failing, abs(failing - i))):
+            end = _block_end(original, start)
+            patches.append(Patch(path, original, start, end,
+                                 _reindent(code, _indent(original[start]), newline),
+                                 f"replace {match.group(1)} (lines {start + 1}-{end})"))
+
+    # The window around the failing line that the snippet most resembles
+    size = len(code)
+    wanted = [line.strip() for line in code]
+    best = None
+    for start in range(max(0, failing - size + 1), failing + 1):
+        end = min(len(original), start + size)
+        ratio = difflib.SequenceMatcher(None, [line.strip() for line in original[start:end]], wanted).ratio()
+        if best is None or ratio > best[0]:
+            best = (ratio, start, end)
+    _, start, end = best
+    label = f"replace line {start + 1}" if end - start == 1 else f"replace lines {start + 1}-{end}"
+    patches.append(Patch(path, original, start, end, _reindent(code, _indent(original[start]), newline), label))
+
+    unique, seen = [], {"".join(original)}
+    for patch in patches:
+        text = patch.text
+        if text not in seen:
+            seen.add(text)
+            unique.append(patch)
+    return unique
+
+
+def _copy_tree(root: str, dest: str) -> None:
+    """Copy `root` to `dest`, skipping caches and version control, symlinking environments."""
+    linked = []
+
+    def ignore(directory: str, names: List[str]) -> List[str]:
+        skipped = []
+        for name in names:
+            if name in SKIPPED_DIRS:
+                skipped.append(name)
+            elif name in LINKED_DIRS and os.path.isdir(os.path.join(directory, name)):
+                skipped.append(name)
+                linked.append(os.path.join(directory, name))
+        return skipped
+
+    shutil.copytree(root, dest, symlinks=True, ignore=ignore)
+    for path in linked:
+        os.symlink(path, os.path.join(dest, os.path.relpath(path, root)))
+
+
+def check_copy_size(root: str, limit: int = MAX_COPY_BYTES) -> int:
+    """Bytes a scratch copy of `root` takes; ValueError if over `limit`."""
+    total = 0
+    for directory, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIPPED_DIRS and d not in LINKED_DIRS]
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except OSError:
+                continue
+        if total > limit:
+            raise ValueError(f"{root} is over {limit // (1024 * 1024)} MB; run from the project directory")
+    return total
+
+
+def _kill(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, AttributeError):
+        proc.kill()
+
+
+def verify(
+    patch: Patch,
+    command: Sequence[str],
+    root: str,
+    timeout: float = RUN_TIMEOUT,
+    cancel: Optional[threading.Event] = None,
+) -> Attempt:
+    """Apply `patch` in a scratch copy of `root` and re-run `command` there."""
+    started = time.perf_counter()
+    scratch = tempfile.mkdtemp(prefix="stackback-fix-")
+    try:
+        work = os.path.join(scratch, os.path.basename(root.rstrip(os.sep)) or "work")
+        _copy_tree(root, work)
+        patch.apply(os.path.join(work, os.path.relpath(patch.path, root)))
+        # Arguments naming files in the project must name the copies instead
+        args = [work + arg[len(root):] if arg == root or arg.startswith(root + os.sep) else arg for arg in command]
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+        proc = subprocess.Popen(args, cwd=work, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, start_new_session=True)
+        deadline = started + timeout
+        while True:
+            try:
+                _, stderr = proc.communicate(timeout=0.05)
+                break
+            except subprocess.TimeoutExpired:
+                if (cancel is not None and cancel.is_set()) or time.perf_counter() > deadline:
+                    _kill(proc)
+                    proc.communicate()
+                    return Attempt(patch, False, None, None, time.perf_counter() - started,
+                                   cancelled=cancel is not None and cancel.is_set())
+        error = parse_error(stderr.decode("utf-8", "replace"))
+        passed = proc.returncode == 0 and error is None
+        return Attempt(patch, passed, proc.returncode, error, time.perf_counter() - started)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def try_fixes(
+    patches: Sequence[Patch],
+    command: Sequence[str],
+    root: Optional[str] = None,
+    jobs: Optional[int] = None,
+    timeout: float = RUN_TIMEOUT,
+    on_attempt: Optional[Callable[[Attempt], None]] = None,
+) -> FixResult:
+    """Verify `patches` in parallel; the first one that passes wins and the rest are stopped.
+
+    With jobs=1 the patches are tried in order.  Patches to files outside
+    `root` (default: the current directory) are not tried.  Raises
+    ValueError if `root` is too large to copy.
+    """
+    started = time.perf_counter()
+    root = os.path.abspath(root or os.getcwd())
+    check_copy_size(root)
+    patches = [p for p in patches if not os.path.relpath(os.path.abspath(p.path), root).startswith(os.pardir)]
+    attempts: List[Attempt] = []
+    winner = None
+    cancel = threading.Event()
+    jobs = max(1, min(jobs or min(MAX_JOBS, os.cpu_count() or 1), len(patches) or 1))
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="stackback-fix") as pool:
+        futures = [pool.submit(verify, patch, command, root, timeout, cancel) for patch in patches]
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            attempt = future.result()
+            attempts.append(attempt)
+            if on_attempt is not None:
+                on_attempt(attempt)
+            if attempt.passed and winner is None:
+                winner = attempt
+                cancel.set()
+                for other in futures:
+                    other.cancel()
+    return FixResult(winner, attempts, time.perf_counter() - started)
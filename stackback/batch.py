@@ -0,0 +1,122 @@
+"""Explaining many errors at once.
+
+`explain_many` collapses the errors to one request per fingerprint, answers
+what it can from the explainer's cache, and runs the remaining requests
+concurrently on asyncio (the blocking client runs in worker threads) under
+a concurrency limit and an optional requests-per-second rate limit.  Every
+duplicate gets the answer of its fingerprint.
+
+Ollama batches concurrent requests on the server (up to
+OLLAMA_NUM_PARALLEL at a time), so for that provider the concurrency
+defaults to the server's parallelism instead of a fixed number (the
+client admits no more than that at once anyway, see `stackback.client`).
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .fingerprint import fingerprint
+from .parser import ParsedError
+
+DEFAULT_CONCURRENCY = 4
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` requests per second, bursting to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def default_concurrency(explainer) -> int:
+    from .client import PROVIDERS
+
+    adapter = PROVIDERS.get(getattr(explainer, "provider", None))
+    parallel = adapter.parallel() if adapter is not None else None
+    return parallel or DEFAULT_CONCURRENCY
+
+
+async def aexplain_many(
+    errors: Sequence[ParsedError],
+    explainer,
+    kind: str = "explain",
+    concurrency: Optional[int] = None,
+    rate_limit: Optional[float] = None,
+    on_result: Optional[Callable[[ParsedError, str], None]] = None,
+) -> List[str]:
+    """Async form of `explain_many`."""
+    if kind not in ("explain", "fix"):
+        raise ValueError(f"unknown kind: {kind}")
+    unique: Dict[str, ParsedError] = {}
+    keys = []
+    for error in errors:
+        key = fingerprint(error)
+        keys.append(key)
+        unique.setdefault(key, error)
+
+    answers: Dict[str, str] = {}
+    pending = []
+    cached = getattr(explainer, "_cached", None)
+    for key, error in unique.items():
+        hit = cached(error, kind) if cached is not None else None
+        if hit is not None:
+            answers[key] = hit
+            if on_result is not None:
+                on_result(error, hit)
+        else:
+            pending.append(key)
+
+    if pending:
+        concurrency = concurrency or default_concurrency(explainer)
+        limiter = RateLimiter(rate_limit, burst=concurrency) if rate_limit else None
+        semaphore = asyncio.Semaphore(concurrency)
+        call = explainer.explain if kind == "explain" else explainer.suggest_fix
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="stackback-batch") as pool:
+            async def run(key: str) -> None:
+                async with semaphore:
+                    if limiter is not None:
+                        await limiter.acquire()
+                    text = await loop.run_in_executor(pool, call, unique[key])
+                answers[key] = text
+                if on_result is not None:
+                    on_result(unique[key], text)
+
+            await asyncio.gather(*(run(key) for key in pending))
+
+    return [answers[key] for key in keys]
+
+
+def explain_many(
+    errors: Sequence[ParsedError],
+    explainer,
+    kind: str = "explain",
+    concurrency: Optional[int] = None,
+    rate_limit: Optional[float] = None,
+    on_result: Optional[Callable[[ParsedError, str], None]] = None,
+) -> List[str]:
+    """Explain (or fix, with kind="fix") every error; results follow `errors`.
+
+    Errors with the same fingerprint share one request.  At most
+    `concurrency` requests run at once, started at no more than
+    `rate_limit` per second.  `on_result(error, text)` is called once per
+    distinct error as soon as its answer is ready.
+    """
+    return asyncio.run(aexplain_many(errors, explainer, kind, concurrency, rate_limit, on_result))
@@ -0,0 +1,132 @@
+"""Persistent explanation cache.
+
+LLM answers are stored in a small SQLite database under the user cache
+directory, keyed by error fingerprint and by what was asked (explanation or
+fix, provider, model).  Entries expire after a TTL and the table is trimmed
+to the most recently used `max_entries`.  WAL mode plus a busy timeout lets
+many `sb` processes read and write the same file concurrently.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+DB_NAME = "explanations.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key      TEXT NOT NULL,
+    kind     TEXT NOT NULL,
+    value    TEXT NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (key, kind)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def default_cache_dir() -> str:
+    """$STACKBACK_CACHE_DIR, else $XDG_CACHE_HOME/stackback, else ~/.cache/stackback."""
+    path = os.environ.get("STACKBACK_CACHE_DIR")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "stackback")
+
+
+class ExplanationCache:
+    """Fingerprint-keyed, TTL + LRU bounded store of LLM answers.
+
+    The cache is best effort: any SQLite or filesystem error is treated as a
+    miss so a broken cache never breaks `sb`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.path = path or os.path.join(default_cache_dir(), DB_NAME)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str, kind: str) -> Optional[str]:
+        """Cached value for (key, kind), or None if missing or expired."""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value FROM entries WHERE key = ? AND kind = ? AND created >= ?",
+                    (key, kind, now - self.ttl),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE entries SET accessed = ? WHERE key = ? AND kind = ?", (now, key, kind)
+                )
+                return row[0]
+        except (sqlite3.Error, OSError):
+            return None
+
+    def put(self, key: str, kind: str, value: str) -> None:
+        """Store a value, then drop expired and least recently used entries."""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, kind, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                        (key, kind, value, now, now),
+                    )
+                    conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM entries WHERE rowid IN "
+                        "(SELECT rowid FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+        except (sqlite3.Error, OSError):
+            pass
+
+    def clear(self) -> None:
+        try:
+            with self._lock:
+                self._connect().execute("DELETE FROM entries")
+        except (sqlite3.Error, OSError):
+            pass
+
+    def __len__(self) -> int:
+        try:
+            with self._lock:
+                return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except (sqlite3.Error, OSError):
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,512 @@
+"""Full command line interface (typer + rich).
+
+`stackback.main` only imports this module when it needs it: for
+subcommands such as `sb daemon`, or when the arguments need the full parser
+(--help, malformed options).  Keep heavy imports here, not in
+`stackback.main`.
+"""
+import json
+import os
+from typing import List, Optional
+
+import typer
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+
+from . import daemon
+from .main import PREFETCH_KINDS, execute
+
+app = typer.Typer(
+    help="AI-powered terminal error fixer. Run any command and fix errors with AI.",
+    add_completion=False,
+)
+console = Console()
+err_console = Console(stderr=True)
+
+
+@app.command(
+    context_settings={"allow_extra_args": True, "ignore_unknown_options": True},
+)
+def run(
+    command: list[str] = typer.Argument(..., help="Command to run (e.g. python app.py)"),
+    provider: str = typer.Option(
+        "openai", "--provider", "-p",
+        help="LLM provider: openai, claude, gemini, ollama, mock (comma-separated to route across several)",
+    ),
+    api_key: Optional[str] = typer.Option(
+        None, "--api-key", "-k",
+        help="API key (or set OPENAI_API_KEY, ANTHROPIC_API_KEY or GEMINI_API_KEY)",
+    ),
+    no_ai: bool = typer.Option(
+        False, "--no-ai",
+        help="Skip AI and just parse the error",
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache",
+        help="Always ask the LLM instead of reusing cached explanations",
+    ),
+    no_rules: bool = typer.Option(
+        False, "--no-rules",
+        help="Ask the LLM even when a built-in rule recognises the error",
+    ),
+    prefetch: str = typer.Option(
+        "explain", "--prefetch",
+        help="Answers to request while the menu is shown: none, explain, all",
+    ),
+    combined: bool = typer.Option(
+        True, "--combined/--separate",
+        help="Ask for explanation and fix in one LLM call, or in two",
+    ),
+    prompt_tokens: int = typer.Option(
+        500, "--prompt-tokens",
+        help="Token budget for the traceback sent to the LLM",
+    ),
+    verbose: bool = typer.Option(
+        False, "--verbose", "-v",
+        help="Print how long each stage took (the --profile breakdown, without a trace file)",
+    ),
+    profile: bool = typer.Option(
+        False, "--profile",
+        help="Time each stage, print a breakdown and write a Chrome trace",
+    ),
+    profile_out: Optional[str] = typer.Option(
+        None, "--profile-out",
+        help="Where --profile writes the trace (default: profile.json in the cache dir)",
+    ),
+) -> None:
+    """Run a command and fix errors with AI assistance.
+
+    Example:
+        sb python app.py
+        sb pytest tests/ --provider mock
+    """
+    if not command:
+        err_console.print("[red]Error:[/red] No command provided")
+        raise typer.Exit(code=1)
+    if prefetch not in PREFETCH_KINDS:
+        err_console.print(f"[red]Error:[/red] --prefetch must be one of: {', '.join(PREFETCH_KINDS)}")
+        raise typer.Exit(code=2)
+
+    execute(
+        command,
+        provider=provider,
+        api_key=api_key,
+        no_ai=no_ai,
+        no_cache=no_cache,
+        no_rules=no_rules,
+        prefetch=prefetch,
+        combined=combined,
+        prompt_tokens=prompt_tokens,
+        verbose=verbose,
+        profile=profile,
+        profile_out=profile_out,
+    )
+
+
+
+daemon_app = typer.Typer(
+    help="Long-lived background process that keeps parsers, caches and LLM connections warm.",
+    add_completion=False,
+    no_args_is_help=True,
+)
+
+
+@daemon_app.command("start")
+def daemon_start(
+    socket_path: Optional[str] = typer.Option(None, "--socket", help="Unix socket path"),
+    idle_timeout: float = typer.Option(
+        daemon.IDLE_TIMEOUT, "--idle-timeout",
+        help="Exit after this many seconds without requests (0 = never)",
+    ),
+    foreground: bool = typer.Option(False, "--foreground", help="Run in this terminal"),
+) -> None:
+    """Start the daemon."""
+    if daemon.connect(socket_path) is not None:
+        console.print("Daemon already running.")
+        return
+    if foreground:
+        daemon.main(["--socket", socket_path or daemon.default_socket_path(), "--idle-timeout", str(idle_timeout)])
+        return
+    try:
+        client = daemon.start(socket_path, idle_timeout)
+    except RuntimeError as exc:
+        err_console.print(f"[red]Error:[/red] {exc}")
+        raise typer.Exit(code=1)
+    console.print(f"Daemon started (pid {client.ping()['pid']}) on {client.path}")
+
+
+@daemon_app.command("stop")
+def daemon_stop(socket_path: Optional[str] = typer.Option(None, "--socket", help="Unix socket path")) -> None:
+    """Stop the running daemon."""
+    client = daemon.connect(socket_path)
+    if client is None:
+        console.print("Daemon not running.")
+        return
+    client.shutdown()
+    console.print("Daemon stopped.")
+
+
+@daemon_app.command("status")
+def daemon_status(socket_path: Optional[str] = typer.Option(None, "--socket", help="Unix socket path")) -> None:
+    """Show whether the daemon is running."""
+    client = daemon.connect(socket_path)
+    if client is None:
+        console.print("Daemon not running.")
+        raise typer.Exit(code=1)
+    info = client.ping()
+    console.print(
+        f"Daemon running (pid {info['pid']}) on {client.path}: "
+        f"{info['requests']} requests, {info['coalesced']} coalesced, {info['explainers']} explainers"
+    )
+
+
+triage_app = typer.Typer(add_completion=False)
+
+
+@triage_app.command()
+def triage(
+    paths: List[str] = typer.Argument(..., help="Log files or directories"),
+    jobs: Optional[int] = typer.Option(None, "--jobs", "-j", help="Worker processes (default: all cores)"),
+    top: int = typer.Option(10, "--top", "-n", help="Groups to show"),
+    show: int = typer.Option(3, "--show", help="Representative tracebacks to print"),
+    as_json: bool = typer.Option(False, "--json", help="Print the groups as JSON"),
+    explain: bool = typer.Option(False, "--explain", help="Explain the groups shown, concurrently"),
+    provider: str = typer.Option("openai", "--provider", "-p", help="LLM provider for --explain"),
+    concurrency: Optional[int] = typer.Option(None, "--concurrency", help="Parallel LLM requests"),
+    rate_limit: Optional[float] = typer.Option(None, "--rate-limit", help="Max LLM requests per second"),
+) -> None:
+    """Group the tracebacks in existing logs by fingerprint, most frequent first.
+
+    Example:
+        sb triage ci-logs/
+        sb triage crash.log --json
+    """
+    from .compact import compact_traceback
+    from .triage import triage as run_triage
+
+    try:
+        report = run_triage(paths, jobs=jobs)
+    except FileNotFoundError as exc:
+        err_console.print(f"[red]Error:[/red] No such file or directory: {exc}")
+        raise typer.Exit(code=2)
+
+    if as_json:
+        print(json.dumps([group.to_dict() for group in report.groups[:top]], indent=2))
+        return
+
+    table = Table(title=f"{report.total} errors, {len(report.groups)} distinct")
+    table.add_column("#", justify="right")
+    table.add_column("Count", justify="right")
+    table.add_column("Error")
+    table.add_column("First seen", overflow="fold")
+    table.add_column("Last seen", overflow="fold")
+    for rank, group in enumerate(report.groups[:top], 1):
+        error = group.error
+        table.add_row(
+            str(rank), str(group.count), f"{error.error_type}: {error.message[:60]}",
+            "%s:%d" % group.first, "%s:%d" % group.last,
+        )
+    console.print(table)
+    shown = report.groups[:show]
+    explanations: List[Optional[str]] = [None] * len(shown)
+    if explain and shown:
+        from .llm import make_explainer
+        with console.status(f"Explaining {len(shown)} errors..."):
+            explanations = make_explainer(provider=provider).explain_many(
+                [group.error for group in shown], concurrency=concurrency, rate_limit=rate_limit,
+            )
+    for rank, (group, explanation) in enumerate(zip(shown, explanations), 1):
+        console.print(f"\n[bold]#{rank}[/bold] ({group.count}x, {len(group.files)} file(s))")
+        console.print(compact_traceback(group.error, 200), markup=False, highlight=False)
+        if explanation:
+            console.print(f"[green]→[/green] {escape(explanation)}", highlight=False)
+    console.print(
+        f"\n[dim]{report.files} file(s), {report.bytes / 1e6:.1f} MB in {report.elapsed:.2f} s "
+        f"({report.mb_per_s:.0f} MB/s, {report.jobs} worker(s))[/dim]"
+    )
+
+
+kb_app = typer.Typer(
+    help="Offline knowledge base searched by the Stack Overflow menu option.",
+    add_completion=False,
+    no_args_is_help=True,
+)
+
+
+@kb_app.command("build")
+def kb_build(
+    sources: List[str] = typer.Argument(
+        ..., help="Stack Exchange Posts.xml dumps, JSONL notes, or directories of .md/.txt notes",
+    ),
+    out: Optional[str] = typer.Option(None, "--out", "-o", help="Index file (default: $STACKBACK_KB or the cache dir)"),
+    tag: Optional[str] = typer.Option("python", "--tag", help="Only questions with this tag from Posts.xml ('' for all)"),
+) -> None:
+    """Build the index from one or more sources, replacing any existing one.
+
+    Example:
+        sb kb build Posts.xml ~/notes/postmortems/
+    """
+    import itertools
+    import time
+
+    from . import kb
+
+    started = time.perf_counter()
+    try:
+        documents = itertools.chain.from_iterable(kb.read_source(path, tag or None) for path in sources)
+        with console.status("Indexing..."):
+            count = kb.build_index(documents, out)
+    except (OSError, ValueError) as exc:
+        err_console.print(f"[red]Error:[/red] {exc}")
+        raise typer.Exit(code=2)
+    path = out or kb.default_index_path()
+    console.print(
+        f"Indexed {count} documents into {path} "
+        f"({os.path.getsize(path) / 1e6:.1f} MB, {time.perf_counter() - started:.1f} s)"
+    )
+
+
+@kb_app.command("search")
+def kb_search(
+    query: str = typer.Argument(..., help="Error text to look up"),
+    limit: int = typer.Option(3, "--limit", "-n", help="Results to show"),
+    index: Optional[str] = typer.Option(None, "--index", help="Index file"),
+) -> None:
+    """Search the index."""
+    from .kb import KnowledgeBase
+
+    try:
+        kb = KnowledgeBase(index)
+    except (OSError, ValueError) as exc:
+        err_console.print(f"[red]Error:[/red] {exc}. Build one with `sb kb build`.")
+        raise typer.Exit(code=1)
+    try:
+        hits = kb.search(query, limit)
+    finally:
+        kb.close()
+    if not hits:
+        console.print("No matches.")
+        raise typer.Exit(code=1)
+    for rank, hit in enumerate(hits, 1):
+        console.print(f"[bold]{rank}. {escape(hit.title)}[/bold] [dim]({hit.score:.1f})[/dim]")
+        if hit.excerpt:
+            console.print(f"   {escape(hit.excerpt)}", highlight=False)
+        if hit.url:
+            console.print(f"   [blue]{escape(hit.url)}[/blue]")
+
+
+metrics_app = typer.Typer(add_completion=False)
+
+
+@metrics_app.command()
+def metrics(
+    path: Optional[str] = typer.Option(None, "--path", help="Metrics log (default: the one STACKBACK_METRICS enables)"),
+    last: Optional[int] = typer.Option(None, "--last", "-n", help="Only the most recent N runs"),
+    as_json: bool = typer.Option(False, "--json", help="Print the percentiles as JSON"),
+) -> None:
+    """Latency percentiles per stage from the local metrics log.
+
+    Enable the log with STACKBACK_METRICS=1 (or a file path); nothing in it
+    leaves this machine.
+
+    Example:
+        STACKBACK_METRICS=1 sb python app.py
+        sb metrics --last 100
+    """
+    from . import profile
+
+    path = path or profile.metrics_path()
+    if path is None:
+        err_console.print("Metrics are off. Set STACKBACK_METRICS=1 to record them, or pass --path.")
+        raise typer.Exit(code=1)
+    records = profile.read_metrics(path)
+    if last:
+        records = records[-last:]
+    if not records:
+        console.print(f"No runs recorded in {path} yet.")
+        raise typer.Exit(code=1)
+    summary = profile.summarize(records)
+    rules = profile.summarize_rules(records)
+    if as_json:
+        print(json.dumps(dict(summary, rules=rules) if rules else summary, indent=2))
+        return
+    table = Table(title=f"{len(records)} runs ({path})")
+    for column in ("Stage", "Runs", "p50 ms", "p95 ms", "p99 ms", "max ms"):
+        table.add_column(column, justify="left" if column == "Stage" else "right")
+    for name, stats in summary.items():
+        table.add_row(name, str(stats["count"]), *(f"{stats[key]:.1f}" for key in ("p50", "p95", "p99", "max")))
+    console.print(table)
+    if rules:
+        top = sorted(rules["by_rule"].items(), key=lambda item: -item[1])[:5]
+        console.print(
+            f"Rules: {rules['hits']}/{rules['lookups']} errors matched ({rules['hit_rate']:.0%}), "
+            f"{rules['confident']} answered without the LLM"
+            + (f"; top: {', '.join(f'{name} {count}' for name, count in top)}" if top else "")
+        )
+
+
+watch_app = typer.Typer(add_completion=False)
+
+
+@watch_app.command(
+    context_settings={"allow_extra_args": True, "ignore_unknown_options": True},
+)
+def watch(
+    command: List[str] = typer.Argument(..., help="Command to re-run (e.g. python app.py)"),
+    paths: Optional[List[str]] = typer.Option(None, "--path", help="Directory or file to watch (repeatable, default: .)"),
+    interval: float = typer.Option(0.3, "--interval", help="Seconds between polls of the tree"),
+    debounce: float = typer.Option(0.2, "--debounce", help="Quiet seconds after a change before re-running"),
+    provider: str = typer.Option("openai", "--provider", "-p", help="LLM provider: openai, claude, gemini, ollama, mock (comma-separated to route across several)"),
+    api_key: Optional[str] = typer.Option(None, "--api-key", "-k", help="API key for the provider"),
+    no_ai: bool = typer.Option(False, "--no-ai", help="Skip AI and just parse the error"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Ignore the on-disk explanation cache"),
+    no_rules: bool = typer.Option(False, "--no-rules", help="Ask the LLM even when a built-in rule recognises the error"),
+    clear: bool = typer.Option(False, "--clear", help="Clear the screen before each run"),
+) -> None:
+    """Re-run a command whenever files change, explaining only new errors.
+
+    Example:
+        sb watch python app.py
+        sb watch --path src pytest tests/
+    """
+    from .watch import watch as run_watch
+
+    explainer = None
+    if not no_ai:
+        from .llm import make_explainer
+        explainer = make_explainer(provider=provider, api_key=api_key, no_cache=no_cache, no_rules=no_rules)
+    try:
+        run_watch(command, paths or ["."], explainer, interval=interval, debounce=debounce, clear=clear)
+    except FileNotFoundError:
+        err_console.print(f"[red]Error:[/red] Command not found: {escape(command[0])}")
+        raise typer.Exit(code=127)
+    except KeyboardInterrupt:
+        console.print()
+
+
+def _when(ts: float) -> str:
+    import datetime
+
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+
+def _sparkline(counts: List[int]) -> str:
+    bars = "▁▂▃▄▅▆▇█"
+    peak = max(counts) or 1
+    return "".join(bars[count * 7 // peak] if count else " " for count in counts)
+
+
+history_app = typer.Typer(add_completion=False)
+
+
+@history_app.command()
+def history(
+    last: int = typer.Option(20, "--last", "-n", help="Runs to show"),
+    as_json: bool = typer.Option(False, "--json", help="Print the runs as JSON"),
+    export_path: Optional[str] = typer.Option(None, "--export", help="Write every run to a .jsonl, .csv or .parquet file"),
+    fmt: Optional[str] = typer.Option(None, "--format", help="Export format: jsonl, csv, parquet (default: from the extension)"),
+    days: Optional[float] = typer.Option(None, "--days", help="Export only the last N days"),
+    compact: bool = typer.Option(False, "--compact", help="Fold the log into a segment now"),
+    path: Optional[str] = typer.Option(None, "--path", help="History directory (default: STACKBACK_HISTORY or the cache dir)"),
+) -> None:
+    """The most recent failing runs, from the local error history.
+
+    Example:
+        sb history -n 50
+        sb history --export errors.csv --days 30
+    """
+    import time
+
+    from . import history as store
+
+    if compact:
+        console.print(f"Compacted {store.compact(path)} run(s).")
+    with store.History(path) as runs:
+        if export_path:
+            since = time.time() - days * 86400 if days else None
+            try:
+                count = store.export(runs, export_path, fmt, since=since)
+            except (ValueError, RuntimeError) as exc:
+                err_console.print(f"[red]Error:[/red] {exc}")
+                raise typer.Exit(code=2)
+            console.print(f"Wrote {count} run(s) to {export_path}")
+            return
+        recent = runs.recent(last)
+    if as_json:
+        print(json.dumps(recent, indent=2))
+        return
+    if not recent:
+        console.print("No errors recorded yet.")
+        return
+    table = Table(title=f"Last {len(recent)} failing run(s)")
+    for column in ("When", "Error", "Location", "Command", "Exit", "Id"):
+        table.add_column(column, justify="right" if column == "Exit" else "left", overflow="fold")
+    for row in recent:
+        table.add_row(
+            _when(row["ts"]), escape(f"{row['error_type']}: {row['message'][:60]}"), escape(row["location"] or ""),
+            escape(row["command"]), str(row["exit_code"]), row["fingerprint"][:8],
+        )
+    console.print(table)
+
+
+stats_app = typer.Typer(add_completion=False)
+
+
+@stats_app.command()
+def stats(
+    top: int = typer.Option(10, "--top", "-n", help="Errors to show"),
+    days: Optional[float] = typer.Option(None, "--days", help="Only count the last N days"),
+    error_id: Optional[str] = typer.Option(None, "--error", "-e", help="Details of one error (fingerprint or prefix)"),
+    as_json: bool = typer.Option(False, "--json", help="Print the result as JSON"),
+    path: Optional[str] = typer.Option(None, "--path", help="History directory (default: STACKBACK_HISTORY or the cache dir)"),
+) -> None:
+    """Recurring errors: most frequent first, with first occurrence and trend.
+
+    Example:
+        sb stats --days 7
+        sb stats --error 3fa2c1
+    """
+    import time
+
+    from . import history as store
+
+    now = time.time()
+    trend_days = int(min(days or 14, 60)) or 1
+    with store.History(path) as runs:
+        if error_id:
+            found = runs.error(error_id)
+            if found is None:
+                err_console.print(f"[red]Error:[/red] no recorded error matches {error_id}")
+                raise typer.Exit(code=1)
+            daily = runs.trend(now - trend_days * 86400, now, trend_days, found.fingerprint)
+            if as_json:
+                print(json.dumps(dict(found.to_dict(), daily=daily), indent=2))
+                return
+            console.print(f"[bold]{escape(found.error_type)}: {escape(found.message)}[/bold]  ({found.fingerprint[:8]})")
+            console.print(f"  seen {found.count} time(s), first {_when(found.first)} at {escape(found.location or '?')}")
+            console.print(f"  first command: {escape(found.first_command or '')}")
+            console.print(f"  last seen {_when(found.last)}")
+            console.print(f"  last {trend_days} days: {_sparkline(daily)}  ({sum(daily)})")
+            return
+        since = now - days * 86400 if days else None
+        ranked = runs.top(top, since=since)
+        trends = [runs.trend(now - trend_days * 86400, now, trend_days, entry.fingerprint) for entry, _ in ranked]
+        total = len(runs)
+    if as_json:
+        print(json.dumps([dict(entry.to_dict(), count=count, daily=daily)
+                          for (entry, count), daily in zip(ranked, trends)], indent=2))
+        return
+    if not ranked:
+        console.print("No errors recorded yet.")
+        return
+    window = f"last {days:g} days" if days else "all time"
+    table = Table(title=f"Top errors, {window} ({total} runs recorded)")
+    for column in ("#", "Count", "Error", "First seen", "Last seen", f"{trend_days}d trend", "Id"):
+        table.add_column(column, justify="right" if column in ("#", "Count") else "left", overflow="fold")
+    for rank, ((found, count), daily) in enumerate(zip(ranked, trends), 1):
+        table.add_row(
+            str(rank), str(count), escape(f"{found.error_type}: {found.message[:60]}"),
+            _when(found.first), _when(found.last), _sparkline(daily), found.fingerprint[:8],
+        )
+    console.print(table)
@@ -0,0 +1,437 @@
+"""Shared HTTP client layer for the LLM providers.
+
+Every explainer in a process talks to the providers through one pooled
+`requests.Session`, so the TCP/TLS connection set up for the first request
+is kept alive and reused by the next one (and by prefetch threads running
+at the same time).  Requests are retried with exponential backoff on
+connection errors, timeouts, 429 and 5xx responses, but only before any
+part of the answer has been streamed.
+
+Each provider is a small adapter that builds the request and pulls the text
+out of the streamed events (SSE for OpenAI, Claude and Gemini, NDJSON for
+Ollama).  Base URLs can be overridden through the environment, which is
+also how the tests point the client at a local stub server.
+
+A local Ollama server is the one provider where the model itself has to be
+warm: every request asks it to stay loaded (OLLAMA_KEEP_ALIVE, default 30
+minutes instead of the server's 5), `LLMClient.warm` loads it ahead of the
+first question, and simultaneous requests to one server are admitted as
+many at a time as it decodes in one batch (OLLAMA_NUM_PARALLEL).  The rest
+wait here rather than in the server's queue, where they would eat into the
+read timeout and, once the queue is full, come back as 503s.
+"""
+import json
+import os
+import random
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 60.0
+RETRIES = 2
+BACKOFF = 0.5
+MAX_RETRY_AFTER = 30.0
+POOL_SIZE = 16
+KEEP_ALIVE = "30m"
+OLLAMA_PARALLEL = 4
+
+RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504, 529))
+
+
+class LLMError(Exception):
+    """A provider request failed (after retries)."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """The process-wide pooled session, created on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+_gates: Dict[str, threading.BoundedSemaphore] = {}
+
+
+def _gate(base: str, size: int) -> threading.BoundedSemaphore:
+    """The semaphore admitting `size` simultaneous requests to the server at `base`."""
+    with _session_lock:
+        gate = _gates.get(base)
+        if gate is None:
+            gate = _gates[base] = threading.BoundedSemaphore(size)
+        return gate
+
+
+def close_session() -> None:
+    """Drop pooled connections (the next request opens a new session)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+class Provider:
+    """How to talk to one LLM API."""
+
+    name = ""
+    key_env: Tuple[str, ...] = ()
+    base_env = ""
+    default_base = ""
+    default_model = ""
+    needs_key = True
+    ndjson = False
+
+    def base_url(self) -> str:
+        return (os.environ.get(self.base_env) or self.default_base).rstrip("/")
+
+    def api_key(self) -> Optional[str]:
+        for name in self.key_env:
+            if os.environ.get(name):
+                return os.environ[name]
+        return None
+
+    def request(self, base: str, key: Optional[str], model: str, prompt: str,
+                max_tokens: int) -> Tuple[str, Dict[str, str], dict]:
+        """(url, headers, json body) of a streaming completion request."""
+        raise NotImplementedError
+
+    def text(self, event: dict) -> Optional[str]:
+        """Text delta carried by one decoded event, if any."""
+        raise NotImplementedError
+
+    def warm_request(self, base: str, model: str) -> Optional[Tuple[str, dict]]:
+        """(url, json body) of a request that loads the model, if it needs loading."""
+        return None
+
+    def parallel(self) -> Optional[int]:
+        """How many requests the server batches at once; None if it is not ours to limit."""
+        return None
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+    key_env = ("OPENAI_API_KEY",)
+    base_env = "OPENAI_BASE_URL"
+    default_base = "https://api.openai.com/v1"
+    default_model = "gpt-4o-mini"
+
+    def request(self, base, key, model, prompt, max_tokens):
+        body = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        return f"{base}/chat/completions", {"Authorization": f"Bearer {key}"}, body
+
+    def text(self, event):
+        choices = event.get("choices")
+        if choices:
+            return (choices[0].get("delta") or {}).get("content")
+        return None
+
+
+class ClaudeProvider(Provider):
+    name = "claude"
+    key_env = ("ANTHROPIC_API_KEY",)
+    base_env = "ANTHROPIC_BASE_URL"
+    default_base = "https://api.anthropic.com"
+    default_model = "claude-3-5-haiku-latest"
+
+    def request(self, base, key, model, prompt, max_tokens):
+        body = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        headers = {"x-api-key": key or "", "anthropic-version": "2023-06-01"}
+        return f"{base}/v1/messages", headers, body
+
+    def text(self, event):
+        kind = event.get("type")
+        if kind == "error":
+            raise LLMError((event.get("error") or {}).get("message", "stream error"), retryable=True)
+        if kind == "content_block_delta":
+            return (event.get("delta") or {}).get("text")
+        return None
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+    key_env = ("GEMINI_API_KEY", "GOOGLE_API_KEY")
+    base_env = "GEMINI_BASE_URL"
+    default_base = "https://generativelanguage.googleapis.com"
+    default_model = "gemini-1.5-flash"
+
+    def request(self, base, key, model, prompt, max_tokens):
+        body = {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {"maxOutputTokens": max_tokens},
+        }
+        url = f"{base}/v1beta/models/{model}:streamGenerateContent?alt=sse"
+        return url, {"x-goog-api-key": key or ""}, body
+
+    def text(self, event):
+        parts = []
+        for candidate in event.get("candidates") or ():
+            for part in (candidate.get("content") or {}).get("parts") or ():
+                parts.append(part.get("text") or "")
+        return "".join(parts) or None
+
+
+class OllamaProvider(Provider):
+    name = "ollama"
+    base_env = "OLLAMA_HOST"
+    default_base = "http://localhost:11434"
+    default_model = "llama3.2"
+    needs_key = False
+    ndjson = True
+
+    def base_url(self) -> str:
+        base = super().base_url()
+        return base if "://" in base else f"http://{base}"
+
+    def keep_alive(self):
+        """OLLAMA_KEEP_ALIVE as the API takes it: a duration string, or seconds (-1: forever)."""
+        value = os.environ.get("OLLAMA_KEEP_ALIVE") or KEEP_ALIVE
+        try:
+            return int(value)
+        except ValueError:
+            return value
+
+    def request(self, base, key, model, prompt, max_tokens):
+        body = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+            "keep_alive": self.keep_alive(),
+            "options": {"num_predict": max_tokens},
+        }
+        return f"{base}/api/chat", {}, body
+
+    def text(self, event):
+        if event.get("error"):
+            raise LLMError(str(event["error"]))
+        return (event.get("message") or {}).get("content")
+
+    def warm_request(self, base, model):
+        # A generate request without a prompt only loads the model
+        return f"{base}/api/generate", {"model": model, "keep_alive": self.keep_alive()}
+
+    def parallel(self):
+        try:
+            return max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL", OLLAMA_PARALLEL)))
+        except ValueError:
+            return OLLAMA_PARALLEL
+
+
+PROVIDERS: Dict[str, Provider] = {
+    "openai": OpenAIProvider(),
+    "claude": ClaudeProvider(),
+    "anthropic": ClaudeProvider(),
+    "gemini": GeminiProvider(),
+    "ollama": OllamaProvider(),
+}
+
+
+def _iter_sse(response: requests.Response) -> Iterator[dict]:
+    """Decoded `data:` payloads of a server-sent event stream."""
+    for line in response.iter_lines(decode_unicode=False):
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        if data:
+            yield json.loads(data)
+
+
+def _iter_ndjson(response: requests.Response) -> Iterator[dict]:
+    for line in response.iter_lines(decode_unicode=False):
+        if line.strip():
+            event = json.loads(line)
+            yield event
+            if event.get("done"):
+                return
+
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        body = response.json()
+    except ValueError:
+        return response.text[:200] or response.reason
+    error = body.get("error") if isinstance(body, dict) else None
+    if isinstance(error, dict):
+        return error.get("message") or str(error)
+    return str(error or body)[:200]
+
+
+class LLMClient:
+    """Streaming completions from one provider over the shared session."""
+
+    def __init__(
+        self,
+        provider: str = "openai",
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+    ):
+        if provider not in PROVIDERS:
+            raise ValueError(f"unknown provider: {provider}")
+        self.provider = PROVIDERS[provider]
+        self.api_key = api_key or self.provider.api_key()
+        self.model = model or self.provider.default_model
+        self.base_url = (base_url or self.provider.base_url()).rstrip("/")
+        self.timeout = timeout or (
+            _env_float("STACKBACK_CONNECT_TIMEOUT", CONNECT_TIMEOUT),
+            _env_float("STACKBACK_READ_TIMEOUT", READ_TIMEOUT),
+        )
+        self.retries = int(_env_float("STACKBACK_RETRIES", RETRIES)) if retries is None else retries
+        self.backoff = _env_float("STACKBACK_BACKOFF", BACKOFF) if backoff is None else backoff
+        self._session = session
+
+    @property
+    def session(self) -> requests.Session:
+        return self._session or get_session()
+
+    def _delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            except (TypeError, ValueError):
+                pass
+        return self.backoff * (2 ** attempt) * (1 + random.random() / 10)
+
+    def _open(self, prompt: str, max_tokens: int) -> requests.Response:
+        url, headers, body = self.provider.request(self.base_url, self.api_key, self.model, prompt, max_tokens)
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.post(url, headers=headers, json=body, stream=True, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = LLMError(f"{self.provider.name}: {exc}", retryable=True)
+            else:
+                if response.status_code < 400:
+                    return response
+                error = LLMError(
+                    f"{self.provider.name}: HTTP {response.status_code}: {_error_message(response)}",
+                    status=response.status_code,
+                    retryable=response.status_code in RETRY_STATUSES,
+                )
+                response.close()
+            if not error.retryable or attempt >= self.retries:
+                raise error
+            time.sleep(self._delay(attempt, response))
+            attempt += 1
+
+    def warm(self) -> bool:
+        """Load the model now so the first real request does not wait for it.
+
+        True once the server reports it loaded; False if the provider has
+        nothing to warm or the request failed (the real request will retry).
+        """
+        warm = self.provider.warm_request(self.base_url, self.model)
+        if warm is None:
+            return False
+        url, body = warm
+        try:
+            response = self.session.post(url, json=body, timeout=self.timeout)
+        except requests.RequestException:
+            return False
+        with response:
+            return response.status_code < 400
+
+    @staticmethod
+    def abort(response: requests.Response) -> None:
+        """Abort a streaming response from another thread.
+
+        `response.close()` would wait for the reading thread (the buffered
+        reader holds its lock while blocked), so shut the socket down
+        instead: the reader gets end of stream or an error at once.
+        """
+        sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+        if sock is None:
+            response.close()
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    @property
+    def can_warm(self) -> bool:
+        return self.provider.warm_request(self.base_url, self.model) is not None
+
+    def stream(self, prompt: str, max_tokens: int = 300,
+               on_open: Optional[Callable[[requests.Response], None]] = None) -> Iterator[str]:
+        """Yield text deltas; raises LLMError on failure.
+
+        `on_open(response)` is called once the response headers are in;
+        `abort(response)` from another thread stops the request.
+        """
+        parallel = self.provider.parallel()
+        if parallel is None:
+            yield from self._stream(prompt, max_tokens, on_open)
+            return
+        gate = _gate(self.base_url, parallel)
+        with gate:
+            yield from self._stream(prompt, max_tokens, on_open)
+
+    def _stream(self, prompt: str, max_tokens: int, on_open) -> Iterator[str]:
+        response = self._open(prompt, max_tokens)
+        if on_open is not None:
+            on_open(response)
+        events = _iter_ndjson(response) if self.provider.ndjson else _iter_sse(response)
+        try:
+            for event in events:
+                text = self.provider.text(event)
+                if text:
+                    yield text
+            # Read what is left of the body (the stream terminator) so the
+            # connection goes back to the pool instead of being closed
+            response.raw.drain_conn()
+            response.raw.release_conn()
+        except (requests.RequestException, ValueError) as exc:
+            raise LLMError(f"{self.provider.name}: stream interrupted: {exc}") from exc
+        finally:
+            response.close()
+
+    def complete(self, prompt: str, max_tokens: int = 300) -> str:
+        parts: List[str] = []
+        for text in self.stream(prompt, max_tokens):
+            parts.append(text)
+        return "".join(parts)
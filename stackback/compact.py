@@ -0,0 +1,214 @@
+"""Token-budgeted traceback compaction for LLM prompts.
+
+Cutting a traceback at a fixed character count keeps the outermost frames
+and drops the innermost frame and the exception line, which are the parts
+that matter.  `compact_traceback` works the other way round: the exception
+line and the innermost frames are always kept.  Repeated call cycles
+(recursion) and runs of stdlib/site-packages frames are collapsed into one
+note each.  Outer frames are then dropped until the text fits the budget.
+
+Other formats (Node, Go, Rust, Java, pytest) are not re-rendered as a
+Python traceback: their own lines are kept, nearest the exception lines
+first, and the gaps are marked.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+from .parser import Frame, ParsedError
+
+DEFAULT_BUDGET_TOKENS = 500
+CHARS_PER_TOKEN = 4
+MAX_CYCLE = 8
+MIN_REPEATS = 3
+MAX_LINE = 300
+
+_PACKAGE_ROOTS = ("site-packages/", "dist-packages/", "lib/python")
+_HEADER = "Traceback (most recent call last):"
+_CAUSE_LINES = {
+    "cause": "The above exception was the direct cause of the following exception:",
+    "context": "During handling of the above exception, another exception occurred:",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _key(frame: Frame) -> Tuple[str, int, Optional[str]]:
+    return frame.file, frame.line, frame.function
+
+
+def _cycle_at(keys: Sequence[tuple], i: int) -> Tuple[int, int]:
+    """(cycle length, repeat count) of the longest repetition starting at `i`."""
+    best = (1, 1)
+    for size in range(1, MAX_CYCLE + 1):
+        if i + size * MIN_REPEATS > len(keys):
+            break
+        pattern = keys[i:i + size]
+        repeats = 1
+        while keys[i + size * repeats:i + size * (repeats + 1)] == pattern:
+            repeats += 1
+        if repeats >= MIN_REPEATS and size * repeats > best[0] * best[1]:
+            best = (size, repeats)
+    return best
+
+
+def _package(path: str) -> str:
+    """Top-level package (or stdlib module) a library path belongs to."""
+    path = path.replace("\\", "/")
+    for root in _PACKAGE_ROOTS:
+        index = path.rfind(root)
+        if index >= 0:
+            rest = path[index + len(root):]
+            if root == "lib/python":
+                rest = rest.partition("/")[2]
+            return rest.split("/", 1)[0].rsplit(".py", 1)[0]
+    return ""
+
+
+def _library_note(frames: Sequence[Frame]) -> str:
+    packages: List[str] = []
+    for frame in frames:
+        package = _package(frame.file)
+        if package and package not in packages:
+            packages.append(package)
+    names = ", ".join(packages[:4]) + (", ..." if len(packages) > 4 else "")
+    noun = "frame" if len(frames) == 1 else "frames"
+    return f"  [{len(frames)} library {noun} omitted: {names}]"
+
+
+def compact_frames(frames: Sequence[Frame]) -> List[str]:
+    """Render `frames` with cycles and library runs collapsed, outermost first.
+
+    The innermost frame is always rendered in full, even for library code,
+    because it shows what actually raised.
+    """
+    keys = [_key(frame) for frame in frames]
+    lines: List[str] = []
+    library: List[Frame] = []
+
+    def flush() -> None:
+        if library:
+            lines.append(_library_note(library))
+            library.clear()
+
+    i, last = 0, len(frames) - 1
+    while i <= last:
+        size, repeats = _cycle_at(keys, i)
+        if repeats > 1:
+            flush()
+            lines.extend(frame.render() for frame in frames[i:i + size])
+            noun = "frame" if size == 1 else f"{size} frames"
+            lines.append(f"  [Previous {noun} repeated {repeats - 1} more times]")
+            i += size * repeats
+            continue
+        frame = frames[i]
+        if frame.is_library and i != last:
+            library.append(frame)
+        else:
+            flush()
+            lines.append(frame.render())
+        i += 1
+    flush()
+    return lines
+
+
+def _exception_line(error: ParsedError, budget_chars: int) -> str:
+    line = f"{error.error_type}: {error.message}" if error.message else error.error_type
+    if len(line) > budget_chars:
+        line = line[:max(budget_chars - 3, len(error.error_type) + 2)] + "..."
+    return line
+
+
+def _fit(error: ParsedError, budget_chars: int) -> str:
+    exc = _exception_line(error, budget_chars)
+    if not error.frames:
+        return exc
+    body = compact_frames(error.frames)
+    size = len(_HEADER) + len(exc) + sum(len(line) + 1 for line in body) + 1
+    dropped = 0
+    if size > budget_chars:
+        budget_chars -= 40  # room for the omission note
+    # Drop outer entries first; the innermost one always stays
+    while size > budget_chars and len(body) > 1:
+        size -= len(body.pop(0)) + 1
+        dropped += 1
+    if dropped:
+        body.insert(0, f"  [... {dropped} outer entries omitted ...]")
+    return "\n".join([_HEADER] + body + [exc])
+
+
+def _anchor(lines: Sequence[str], error: ParsedError) -> Optional[int]:
+    """Index of the line showing `error`'s exception, if one does."""
+    name = error.error_type.rsplit(".", 1)[-1]
+    needles = [(name, error.message), (error.message,)] if error.message else [(name,)]
+    for needle in needles:
+        for i, line in enumerate(lines):
+            if all(part in line for part in needle):
+                return i
+    return None
+
+
+def _trim_lines(error: ParsedError, raw: str, budget_chars: int) -> str:
+    """`raw` in its own format, cut to the lines nearest its exception lines.
+
+    The first line and the exception line of the error and of each cause
+    are kept; then the lines around them, nearest first (the line after
+    before the line before, as most formats list the innermost frame right
+    after), for as long as each run stays unbroken.
+    """
+    lines = raw.splitlines()
+    anchors = {0}
+    current: Optional[ParsedError] = error
+    while current is not None:
+        found = _anchor(lines, current)
+        if found is not None:
+            anchors.add(found)
+        current = current.cause
+    distance = {}
+    for i in range(len(lines)):
+        nearest = min(anchors, key=lambda a: abs(a - i))
+        distance[i] = (abs(nearest - i), nearest > i)
+    budget_chars -= 32 * (len(anchors) + 1)  # room for the omission notes
+    kept, size = set(), 0
+    for i in sorted(range(len(lines)), key=lambda i: (i not in anchors, distance[i], i)):
+        cost = min(len(lines[i]), MAX_LINE) + 1
+        if i not in anchors and (size + cost > budget_chars or not {i - 1, i + 1} & kept):
+            continue  # over budget, or cut off from its anchor by a skipped line
+        kept.add(i)
+        size += cost
+    out: List[str] = []
+    skipped = 0
+    for i, line in enumerate(lines):
+        if i not in kept:
+            skipped += 1
+            continue
+        if skipped:
+            out.append(f"  [... {skipped} lines omitted ...]")
+            skipped = 0
+        out.append(line if len(line) <= MAX_LINE else line[:MAX_LINE - 3] + "...")
+    if skipped:
+        out.append(f"  [... {skipped} lines omitted ...]")
+    return "\n".join(out)
+
+
+def compact_traceback(error: ParsedError, budget_tokens: int = DEFAULT_BUDGET_TOKENS) -> str:
+    """Traceback text for a prompt, within about `budget_tokens` tokens.
+
+    A traceback that already fits is returned unchanged, after its chained
+    causes (which `error.traceback` does not include for Python chains).
+    """
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    raw = error.traceback
+    cause = error.cause
+    prefix = ""
+    if cause is not None and cause.traceback not in raw:
+        # Chained causes go first, as in Python's own output, within a
+        # quarter of the budget
+        marker = _CAUSE_LINES.get(error.cause_kind or "", _CAUSE_LINES["context"])
+        prefix = compact_traceback(cause, budget_tokens // 4) + "\n\n" + marker + "\n\n"
+    if len(prefix) + len(raw) <= budget_chars:
+        return prefix + raw
+    if error.has_raw and not raw.lstrip().startswith(_HEADER):
+        return prefix + _trim_lines(error, raw, budget_chars - len(prefix))
+    return prefix + _fit(error, budget_chars - len(prefix))
@@ -0,0 +1,413 @@
+"""Optional long-lived `sb daemon` on a Unix domain socket.
+
+Every `sb` run is a cold process.  When a daemon is running, the front end
+becomes a thin client instead: it sends the captured error over the socket
+and streams back the explanation, while the daemon keeps the parser, the
+explainers (with their in-memory answers), the on-disk cache and the pooled
+LLM connections warm across runs and terminals.  Identical requests that
+arrive while one is in flight share that request, whichever terminal sent
+them.
+
+The protocol is JSON lines.  A request is one object with an "op"; the
+reply is one or more objects, the last of which has "done": true (and
+"failed": message on error).  Streams send {"kind", "token"} objects.
+
+The client side only needs the standard library, so `sb` can use it
+without importing the LLM stack.  When no daemon answers, `connect`
+returns None and `sb` works in-process as usual.
+
+The socket's directory must belong to this user and be closed to everyone
+else (and not be a symlink); otherwise neither side will use it, since
+whoever listens there sees every traceback.  API keys never cross the
+socket: the daemon reads them from its own environment.
+"""
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .parser import ParsedError
+
+VERSION = 1
+CONNECT_TIMEOUT = 0.2
+START_TIMEOUT = 5.0
+IDLE_TIMEOUT = 30 * 60
+
+
+def default_socket_path() -> str:
+    """STACKBACK_SOCKET, else a per-user path under XDG_RUNTIME_DIR or the temp dir."""
+    path = os.environ.get("STACKBACK_SOCKET")
+    if path:
+        return path
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "stackback.sock")
+    return os.path.join(tempfile.gettempdir(), f"stackback-{os.getuid()}", "daemon.sock")
+
+
+def private_dir(path: str) -> bool:
+    """True if the directory of socket `path` is a real directory only this user can use."""
+    try:
+        info = os.lstat(os.path.dirname(os.path.abspath(path)))
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+
+# -- client -----------------------------------------------------------------
+
+class DaemonClient:
+    """Talks to a running daemon; one connection per request."""
+
+    def __init__(self, path: Optional[str] = None, timeout: Optional[float] = None):
+        self.path = path or default_socket_path()
+        self.timeout = timeout
+
+    def request(self, op: str, **fields) -> Iterator[dict]:
+        """Send one request and yield its replies, up to and including the last."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            fields["op"] = op
+            sock.sendall(json.dumps(fields).encode() + b"\n")
+            with sock.makefile("rb") as replies:
+                for line in replies:
+                    reply = json.loads(line)
+                    yield reply
+                    if reply.get("done"):
+                        return
+            raise ConnectionError("daemon closed the connection")
+        finally:
+            sock.close()
+
+    def call(self, op: str, **fields) -> dict:
+        """Send a request with a single reply."""
+        for reply in self.request(op, **fields):
+            if reply.get("failed"):
+                raise RuntimeError(reply["failed"])
+            return reply
+        raise ConnectionError("no reply from daemon")
+
+    def ping(self) -> dict:
+        return self.call("ping")
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        data = self.call("parse", text=text).get("error")
+        return ParsedError.from_dict(data) if data else None
+
+    def stream(self, error: ParsedError, kind: str, options: dict) -> Iterator[Tuple[str, str]]:
+        """(kind, token) pairs for "explain", "fix" or "both".
+
+        The source context is read here: frame paths are relative to this
+        process's directory, not the daemon's.
+        """
+        if error.context is None:
+            from .source import attach_source_context
+            attach_source_context(error)
+        for reply in self.request("explain", error=error.to_dict(), kind=kind, options=options):
+            if reply.get("failed"):
+                raise RuntimeError(reply["failed"])
+            if "token" in reply:
+                yield reply["kind"], reply["token"]
+
+    def shutdown(self) -> None:
+        self.call("shutdown")
+
+
+def _answering(path: Optional[str], timeout: float = CONNECT_TIMEOUT) -> Optional[DaemonClient]:
+    client = DaemonClient(path, timeout)
+    if not os.path.exists(client.path) or not private_dir(client.path):
+        return None
+    try:
+        if client.ping().get("version") != VERSION:
+            return None
+    except (OSError, ValueError, RuntimeError):
+        return None
+    client.timeout = None
+    return client
+
+
+def connect(path: Optional[str] = None, timeout: float = CONNECT_TIMEOUT) -> Optional[DaemonClient]:
+    """A client for the running daemon, or None when none answers.
+
+    STACKBACK_DAEMON=0 disables the daemon for this run.
+    """
+    if os.environ.get("STACKBACK_DAEMON") == "0":
+        return None
+    return _answering(path, timeout)
+
+
+class RemoteExplainer:
+    """The explainer interface the TUI expects, served by the daemon.
+
+    Only the REMOTE_OPTIONS in `options` are sent (no API key).  The rules
+    run here rather than in the daemon, since they look at files relative
+    to this process's directory; a confident one answers without a request.
+    `rules` is as for LLMExplainer.
+    """
+
+    def __init__(self, client: DaemonClient, options: dict, rules=None):
+        self.client = client
+        self.options = {name: options[name] for name in REMOTE_OPTIONS if name in options}
+        self.options["no_rules"] = True
+        self.combined = bool(options.get("combined"))
+        if rules is None and not options.get("no_rules"):
+            from .rules import engine as rules
+        self.rules = rules or None
+        self._rule_answers: Dict[str, object] = {}
+
+    def _rule_answer(self, error: ParsedError):
+        if self.rules is None:
+            return None
+        from .fingerprint import fingerprint
+
+        key = fingerprint(error)
+        if key not in self._rule_answers:
+            self._rule_answers[key] = self.rules.answer(error)
+        return self._rule_answers[key]
+
+    def _confident_rule(self, error: ParsedError):
+        answer = self._rule_answer(error)
+        return answer if answer is not None and answer.confident else None
+
+    def _tokens(self, error: ParsedError, kind: str) -> Iterator[str]:
+        answer = self._confident_rule(error)
+        if answer is not None:
+            yield answer.explanation if kind == "explain" else answer.fix
+            return
+        for _, token in self.client.stream(error, kind, self.options):
+            yield token
+
+    def explain_stream(self, error: ParsedError) -> Iterator[str]:
+        return self._tokens(error, "explain")
+
+    def suggest_fix_stream(self, error: ParsedError) -> Iterator[str]:
+        return self._tokens(error, "fix")
+
+    def explain_and_fix_stream(self, error: ParsedError, want: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        answer = self._confident_rule(error)
+        if answer is not None:
+            return iter([("explain", answer.explanation), ("fix", answer.fix)])
+        return self.client.stream(error, "both", self.options)
+
+    def explain(self, error: ParsedError) -> str:
+        return "".join(self.explain_stream(error))
+
+    def suggest_fix(self, error: ParsedError) -> str:
+        return "".join(self.suggest_fix_stream(error))
+
+
+# -- server -----------------------------------------------------------------
+
+EXPLAINER_OPTIONS = ("provider", "api_key", "no_cache", "no_rules", "combined", "prompt_tokens")
+# The options a client may send; the daemon uses the keys in its own environment
+REMOTE_OPTIONS = tuple(name for name in EXPLAINER_OPTIONS if name != "api_key")
+
+
+class DaemonServer:
+    """Serves parse/explain requests, sharing in-flight work between clients."""
+
+    def __init__(self, path: Optional[str] = None, idle_timeout: float = IDLE_TIMEOUT,
+                 make_explainer: Optional[Callable] = None):
+        import socketserver
+
+        self.path = path or default_socket_path()
+        self.idle_timeout = idle_timeout
+        if make_explainer is None:
+            from .llm import make_explainer
+        self._make_explainer = make_explainer
+        self._explainers: Dict[tuple, object] = {}
+        self._inflight: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self.last_active = time.monotonic()
+        self.requests = 0
+        self.coalesced = 0
+
+        owner = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    owner.last_active = time.monotonic()
+                    try:
+                        owner.handle(json.loads(line), self._write)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    except Exception as exc:
+                        self._write({"done": True, "failed": f"{type(exc).__name__}: {exc}"})
+
+            def _write(self, reply) -> None:
+                # `reply` is a dict or an already encoded reply line
+                line = reply if isinstance(reply, str) else json.dumps(reply) + "\n"
+                self.wfile.write(line.encode())
+                self.wfile.flush()
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        _make_private_dir(self.path)
+        if os.path.exists(self.path):
+            if _answering(self.path) is not None:
+                raise RuntimeError(f"a daemon is already listening on {self.path}")
+            os.unlink(self.path)  # stale socket from a daemon that died
+        umask = os.umask(0o077)
+        try:
+            self.server = Server(self.path, Handler)
+        finally:
+            os.umask(umask)
+
+    def handle(self, request: dict, write: Callable[[dict], None]) -> None:
+        op = request.get("op")
+        self.requests += 1
+        if op == "ping":
+            write({"done": True, "version": VERSION, "pid": os.getpid(), "requests": self.requests,
+                   "coalesced": self.coalesced, "explainers": len(self._explainers)})
+        elif op == "parse":
+            from .parser import parse_error
+            error = parse_error(request.get("text") or "")
+            write({"done": True, "error": error.to_dict() if error else None})
+        elif op == "explain":
+            self._explain(request, write)
+        elif op == "shutdown":
+            write({"done": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            write({"done": True, "failed": f"unknown op: {op}"})
+
+    def _explainer(self, options: dict):
+        key = tuple(options.get(name) for name in REMOTE_OPTIONS)
+        with self._lock:
+            explainer = self._explainers.get(key)
+            if explainer is None:
+                kwargs = {name: options[name] for name in REMOTE_OPTIONS if name in options}
+                explainer = self._explainers[key] = self._make_explainer(**kwargs)
+            return key, explainer
+
+    def _explain(self, request: dict, write: Callable[[dict], None]) -> None:
+        from .fingerprint import fingerprint
+        from .prefetch import PrefetchTask
+
+        error = ParsedError.from_dict(request["error"])
+        kind = request.get("kind", "explain")
+        options_key, explainer = self._explainer(request.get("options") or {})
+        key = (fingerprint(error), kind, options_key)
+        with self._lock:
+            entry = self._inflight.get(key)
+            created = entry is None
+            if created:
+                task = PrefetchTask(lambda: _reply_lines(explainer, error, kind))
+                entry = self._inflight[key] = [task, 0]
+            else:
+                self.coalesced += 1
+            entry[1] += 1
+        task = entry[0]
+        if created:
+            # Outside the lock: runs at once if the task has already finished
+            task.future.add_done_callback(lambda _: self._forget(key, entry))
+        try:
+            for line in task.tokens():
+                write(line)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0 and not task.done:
+                    task.cancel()  # every reader is gone
+        exc = task.future.exception() if task.done else None
+        write({"done": True, "failed": str(exc)} if exc else {"done": True})
+
+    def _forget(self, key: tuple, entry: list) -> None:
+        with self._lock:
+            if self._inflight.get(key) is entry:
+                del self._inflight[key]
+
+    def _watch_idle(self) -> None:
+        while True:
+            time.sleep(min(self.idle_timeout, 30))
+            if not self._inflight and time.monotonic() - self.last_active > self.idle_timeout:
+                self.server.shutdown()
+                return
+
+    def serve_forever(self) -> None:
+        if self.idle_timeout:
+            threading.Thread(target=self._watch_idle, daemon=True).start()
+        try:
+            self.server.serve_forever(poll_interval=0.2)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.server.server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def _make_private_dir(path: str) -> None:
+    """Create the directory of socket `path` (mode 0700); refuse one that is not private."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not private_dir(path):
+        raise RuntimeError(f"refusing to use {directory}: it must be a directory owned by you "
+                           "with no access for others (chmod 700)")
+
+
+def _reply_lines(explainer, error: ParsedError, kind: str) -> Iterator[str]:
+    """Encoded token replies, so every reader of a shared task sends the same bytes."""
+    if kind == "both":
+        stream = explainer.explain_and_fix_stream(error)
+    elif kind == "explain":
+        stream = explainer.explain_stream(error)
+    else:
+        stream = explainer.suggest_fix_stream(error)
+    try:
+        for item in stream:
+            pair_kind, token = item if kind == "both" else (kind, item)
+            yield json.dumps({"kind": pair_kind, "token": token}) + "\n"
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+def start(path: Optional[str] = None, idle_timeout: float = IDLE_TIMEOUT) -> DaemonClient:
+    """Start a detached daemon and wait until it answers."""
+    import subprocess
+
+    path = path or default_socket_path()
+    _make_private_dir(path)
+    log_path = os.path.join(os.path.dirname(os.path.abspath(path)), "daemon.log")
+    with open(log_path, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", "stackback.daemon", "--socket", path, "--idle-timeout", str(idle_timeout)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True,
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        client = _answering(path)
+        if client is not None:
+            return client
+        time.sleep(0.05)
+    raise RuntimeError(f"daemon did not start; see {log_path}")
+
+
+def main(argv=None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m stackback.daemon", description="Run the stackback daemon.")
+    parser.add_argument("--socket", default=None)
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    args = parser.parse_args(argv)
+    server = DaemonServer(args.socket, idle_timeout=args.idle_timeout)
+    print(f"stackback daemon listening on {server.path} (pid {os.getpid()})", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Stable fingerprints for parsed errors.
+
+Two occurrences of "the same" error should hash alike even when they differ
+in memory addresses, ids, timestamps, temp paths or line numbers shifted by
+an unrelated edit.  The fingerprint covers the exception type, the message
+with such volatile values masked, and the (file, function) frame stack.
+"""
+import hashlib
+import re
+from typing import Optional
+
+from .parser import ParsedError
+
+MAX_FRAMES = 12
+
+_VOLATILE = (
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<addr>'),
+    (re.compile(r'\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?\b'), '<time>'),
+    (re.compile(r'(?:/tmp|/var/folders|/private/var)/[^\s\'",)]+'), '<tmp>'),
+    (re.compile(r'\b[0-9a-fA-F]{16,}\b'), '<hex>'),
+    (re.compile(r'(?<![\w.])\d+(?:\.\d+)?'), '<n>'),
+)
+_LIB_PATH_RE = re.compile(r'^.*?(?:site-packages|dist-packages|lib/python\d+(?:\.\d+)?)/')
+
+
+def normalize_message(message: str) -> str:
+    """Mask values that change between otherwise identical errors."""
+    for pattern, replacement in _VOLATILE:
+        message = pattern.sub(replacement, message)
+    return message.strip()
+
+
+def normalize_path(path: Optional[str]) -> str:
+    """Machine-independent form of a frame path."""
+    if not path:
+        return ""
+    path = path.replace("\\", "/")
+    lib = _LIB_PATH_RE.match(path)
+    if lib:
+        return path[lib.end():]
+    return "/".join(path.rsplit("/", 2)[-2:])
+
+
+def fingerprint(error: ParsedError) -> str:
+    """Hex digest identifying `error` across runs and machines."""
+    parts = [error.language, error.error_type, normalize_message(error.message)]
+    frames = error.frames[-MAX_FRAMES:]
+    if frames:
+        parts.extend(f"{normalize_path(f.file)}:{f.function or ''}" for f in frames)
+    elif error.filename:
+        parts.append(normalize_path(error.filename))
+    return hashlib.sha1("\n".join(parts).encode("utf-8", "replace")).hexdigest()
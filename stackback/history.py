@@ -0,0 +1,537 @@
+"""Local history of the errors `sb` has seen: `sb history` and `sb stats`.
+
+Every failing run appends one JSON line (fingerprint, time, command, host,
+exit code and the error's type, message and location) to `log.jsonl` in
+the history directory; that is a single O_APPEND write.  Once the log is
+COMPACT_BYTES long, or on `sb history --compact`, it is folded into an
+immutable, memory-mapped segment file holding one column per field:
+
+    header   magic, row count, first and last timestamp, section offsets
+    ts       float64 timestamps, sorted
+    error    uint32 ids into the error dictionary
+    command  uint32 ids into the command dictionary
+    host     uint32 ids into the host dictionary
+    exit     int32 exit codes
+
+The dictionaries live in `index.json` with running totals per error
+(count, first and last seen, first command), so top errors and first
+occurrences come from the index without reading any rows.  Time-windowed
+queries bisect the sorted `ts` columns and count ids over the slice with
+`array.count` / `Counter`, which run in C.  Compaction also merges the
+newest segments while the last is at least half the size of the one before
+it, which keeps their number logarithmic in the row count.
+
+Readers take a shared lock and compaction an exclusive one (where fcntl
+exists).  STACKBACK_HISTORY=0 turns recording off; any other value is the
+directory to use instead of `history` in the cache dir.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .cache import default_cache_dir
+from .parser import ParsedError
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking, compaction is still atomic per file
+    fcntl = None
+
+HISTORY_ENV = "STACKBACK_HISTORY"
+MAGIC = b"SBHS0001"
+LOG_FILE = "log.jsonl"
+INDEX_FILE = "index.json"
+# The log is folded into a segment once it grows past this (~4000 rows)
+COMPACT_BYTES = 1024 * 1024
+MAX_MESSAGE = 200
+MAX_COMMAND = 200
+EXPORT_FORMATS = ("jsonl", "csv", "parquet")
+
+# magic, rows, first ts, last ts, offsets of the ts/error/command/host/exit sections
+_HEADER = struct.Struct("<8sQdd5Q")
+_COLUMNS = (("ts", "d"), ("error", "I"), ("command", "I"), ("host", "I"), ("exit", "i"))
+FIELDS = ("ts", "fingerprint", "error_type", "message", "location", "language", "command", "host", "exit_code")
+
+
+def history_dir() -> Optional[str]:
+    """The history directory, or None when STACKBACK_HISTORY turns recording off."""
+    value = os.environ.get(HISTORY_ENV, "")
+    if value.lower() in ("0", "false", "no", "off"):
+        return None
+    return value or os.path.join(default_cache_dir(), "history")
+
+
+class _Lock:
+    """flock on `<dir>/lock`; a no-op without fcntl."""
+
+    def __init__(self, directory: str, exclusive: bool, blocking: bool = True):
+        self.path = os.path.join(directory, "lock")
+        self.mode = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) if fcntl else 0
+        if fcntl and not blocking:
+            self.mode |= fcntl.LOCK_NB
+        self.fd = -1
+
+    def __enter__(self) -> "_Lock":
+        if fcntl:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(self.fd, self.mode)
+            except OSError:
+                os.close(self.fd)
+                raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)  # releases the lock
+
+
+# -- recording --------------------------------------------------------------
+
+def _row(error: ParsedError, command: List[str], exit_code: int, ts: float, host: str) -> dict:
+    from .fingerprint import fingerprint
+
+    location = f"{error.filename}:{error.line_number}" if error.filename and error.line_number else (error.filename or "")
+    return {
+        "ts": round(ts, 3), "fingerprint": fingerprint(error), "error_type": error.error_type,
+        "message": error.message[:MAX_MESSAGE], "location": location, "language": error.language,
+        "command": " ".join(command)[:MAX_COMMAND], "host": host, "exit_code": exit_code,
+    }
+
+
+def record(error: ParsedError, command: List[str], exit_code: int, directory: Optional[str] = None,
+           ts: Optional[float] = None) -> bool:
+    """Append one failing run to the history; compacts the log when it is due.
+
+    Best effort: returns False instead of raising when the history is off
+    or cannot be written.
+    """
+    import socket
+
+    directory = directory or history_dir()
+    if directory is None:
+        return False
+    line = json.dumps(_row(error, command, exit_code, time.time() if ts is None else ts, socket.gethostname()),
+                      separators=(",", ":"))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with _Lock(directory, exclusive=False):
+            fd = os.open(os.path.join(directory, LOG_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line.encode() + b"\n")
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        if size >= COMPACT_BYTES:
+            try:
+                compact(directory, blocking=False)
+            except BlockingIOError:
+                pass  # another process is compacting
+    except OSError:
+        return False
+    return True
+
+
+# -- segments ---------------------------------------------------------------
+
+class Columns:
+    """Rows of one segment (or of the uncompacted log), one sequence per field, sorted by ts."""
+
+    def __init__(self, ts, error, command, host, exit_codes):
+        self.ts = ts
+        self.error = error
+        self.command = command
+        self.host = host
+        self.exit = exit_codes
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def first(self) -> float:
+        return self.ts[0] if len(self.ts) else 0.0
+
+    @property
+    def last(self) -> float:
+        return self.ts[-1] if len(self.ts) else 0.0
+
+    def window(self, since: Optional[float], until: Optional[float]) -> Tuple[int, int]:
+        """Row range [lo, hi) with since <= ts < until."""
+        lo = 0 if since is None else bisect.bisect_left(self.ts, since)
+        hi = len(self.ts) if until is None else bisect.bisect_left(self.ts, until)
+        return lo, max(lo, hi)
+
+    def errors(self, lo: int, hi: int) -> array:
+        ids = array("I")
+        ids.frombytes(memoryview(self.error).cast("B")[lo * ids.itemsize:hi * ids.itemsize])
+        return ids
+
+    def close(self) -> None:
+        pass
+
+
+class Segment(Columns):
+    """A segment file, memory-mapped read-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, rows, _, _, *starts = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a stackback history segment")
+        view = memoryview(self._mm)
+        columns = [view[start:start + rows * array(code).itemsize].cast(code)
+                   for start, (_, code) in zip(starts, _COLUMNS)]
+        super().__init__(*columns)
+
+    def close(self) -> None:
+        for name, _ in _COLUMNS:
+            getattr(self, name).release()
+        self._mm.close()
+
+
+def _write_segment(path: str, columns: Columns) -> None:
+    sections = [memoryview(getattr(columns, name)).cast("B") for name, _ in _COLUMNS]
+    starts, pos = [], _HEADER.size
+    for section in sections:
+        pos += -pos % 8  # keep every section 8-byte aligned
+        starts.append(pos)
+        pos += len(section)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(columns), columns.first, columns.last, *starts))
+        for start, section in zip(starts, sections):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(section)
+    os.replace(tmp, path)
+
+
+def _sorted_columns(parts: List[Columns]) -> Columns:
+    """Concatenate `parts` into one Columns sorted by ts (no sort when already in order)."""
+    merged = [array(code) for _, code in _COLUMNS]
+    for part in parts:
+        for column, (name, _) in zip(merged, _COLUMNS):
+            column.frombytes(memoryview(getattr(part, name)).cast("B"))
+    ts = merged[0]
+    if any(later.first < earlier.last for earlier, later in zip(parts, parts[1:]) if len(earlier) and len(later)):
+        order = sorted(range(len(ts)), key=ts.__getitem__)
+        merged = [array(code, (column[i] for i in order)) for column, (_, code) in zip(merged, _COLUMNS)]
+    return Columns(*merged)
+
+
+# -- the store --------------------------------------------------------------
+
+class ErrorStats:
+    """One distinct error (by fingerprint) and its totals."""
+
+    __slots__ = ("id", "fingerprint", "error_type", "message", "location", "language",
+                 "count", "first", "last", "first_command")
+
+    def __init__(self, id: int, info: dict):
+        self.id = id
+        for name in self.__slots__[1:]:
+            setattr(self, name, info.get(name))
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__[1:]}
+
+    def __repr__(self) -> str:
+        return f"ErrorStats({self.error_type}: {self.message!r}, count={self.count})"
+
+
+class History:
+    """A read view of the history: compacted segments plus the uncompacted log."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or history_dir() or os.path.join(default_cache_dir(), "history")
+        self.segments: List[Columns] = []
+        rows: List[dict] = []
+        if os.path.isdir(self.directory):
+            with _Lock(self.directory, exclusive=False):
+                self.index = _read_index(self.directory)
+                for name in self.index["segments"]:
+                    self.segments.append(Segment(os.path.join(self.directory, name)))
+                rows = list(_read_log(os.path.join(self.directory, LOG_FILE)))
+        else:
+            self.index = _read_index(self.directory)
+        self.errors = [ErrorStats(i, info) for i, info in enumerate(self.index["errors"])]
+        self._ids = {stats.fingerprint: stats.id for stats in self.errors}
+        if rows:
+            self.segments.append(_columns_from_rows(rows, self.index, self.errors, self._ids))
+        self.commands: List[str] = self.index["commands"]
+        self.hosts: List[str] = self.index["hosts"]
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    def __enter__(self) -> "History":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments)
+
+    def error(self, fingerprint: str) -> Optional[ErrorStats]:
+        """Totals of one error, including when and where it first happened."""
+        key = self._ids.get(fingerprint)
+        if key is None and len(fingerprint) >= 4:
+            # Accept an unambiguous prefix, like git does for hashes
+            matches = [fp for fp in self._ids if fp.startswith(fingerprint)]
+            key = self._ids[matches[0]] if len(matches) == 1 else None
+        return None if key is None else self.errors[key]
+
+    def top(self, n: int = 10, since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[ErrorStats, int]]:
+        """The `n` most frequent errors (in [since, until) if given), with their counts."""
+        if since is None and until is None:
+            ranked = sorted(self.errors, key=lambda stats: (-stats.count, stats.first))
+            return [(stats, stats.count) for stats in ranked[:n]]
+        counts: Counter = Counter()
+        for segment in self._overlapping(since, until):
+            counts.update(segment.errors(*segment.window(since, until)))
+        return [(self.errors[key], count) for key, count in counts.most_common(n)]
+
+    def trend(self, since: float, until: float, buckets: int, fingerprint: Optional[str] = None) -> List[int]:
+        """Occurrences per equal time bucket of [since, until), of one error or of all."""
+        stats = self.error(fingerprint) if fingerprint else None
+        if fingerprint and stats is None:
+            return [0] * buckets
+        width = (until - since) / buckets
+        edges = [since + i * width for i in range(buckets)] + [until]
+        counts = [0] * buckets
+        for segment in self._overlapping(since, until):
+            bounds = [bisect.bisect_left(segment.ts, edge) for edge in edges]
+            if stats is None:
+                for i in range(buckets):
+                    counts[i] += bounds[i + 1] - bounds[i]
+                continue
+            ids = segment.errors(bounds[0], bounds[-1])
+            for i in range(buckets):
+                lo, hi = bounds[i] - bounds[0], bounds[i + 1] - bounds[0]
+                if hi > lo:
+                    counts[i] += ids[lo:hi].count(stats.id)
+        return counts
+
+    def rows(self, since: Optional[float] = None, until: Optional[float] = None) -> Iterator[dict]:
+        """Every run in [since, until), oldest first, as dicts with FIELDS."""
+        segments = self._overlapping(since, until)
+        if any(later.first < earlier.last for earlier, later in zip(segments, segments[1:])):
+            segments = [_sorted_columns(segments)]
+        for segment in segments:
+            yield from self._rows(segment, *segment.window(since, until))
+
+    def recent(self, n: int = 20) -> List[dict]:
+        """The last `n` runs, oldest first."""
+        rows = [row for segment in self.segments for row in self._rows(segment, max(0, len(segment) - n), len(segment))]
+        rows.sort(key=lambda row: row["ts"])
+        return rows[-n:] if n else []
+
+    def _rows(self, segment: Columns, lo: int, hi: int) -> Iterator[dict]:
+        for i in range(lo, hi):
+            stats = self.errors[segment.error[i]]
+            yield {
+                "ts": segment.ts[i], "fingerprint": stats.fingerprint, "error_type": stats.error_type,
+                "message": stats.message, "location": stats.location, "language": stats.language,
+                "command": self.commands[segment.command[i]], "host": self.hosts[segment.host[i]],
+                "exit_code": segment.exit[i],
+            }
+
+    def _overlapping(self, since: Optional[float], until: Optional[float]) -> List[Columns]:
+        return [segment for segment in self.segments
+                if len(segment) and (since is None or segment.last >= since) and (until is None or segment.first < until)]
+
+
+def _read_index(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    for key in ("segments", "ingested", "errors", "commands", "hosts"):
+        index.setdefault(key, [])
+    index.setdefault("next_segment", 1)
+    return index
+
+
+def _read_log(path: str) -> Iterator[dict]:
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # a line still being written
+                if isinstance(row, dict) and "fingerprint" in row:
+                    yield row
+    except OSError:
+        return
+
+
+def _columns_from_rows(rows: List[dict], index: dict, errors: List[ErrorStats], ids: Dict[str, int]) -> Columns:
+    """Dictionary-encode log rows against `index`, updating the totals in `errors`."""
+    lookups = {name: {value: i for i, value in enumerate(index[name])} for name in ("commands", "hosts")}
+
+    def encode(name: str, value: str) -> int:
+        table = lookups[name]
+        key = table.get(value)
+        if key is None:
+            key = table[value] = len(index[name])
+            index[name].append(value)
+        return key
+
+    rows.sort(key=lambda row: row["ts"])
+    columns = Columns(array("d"), array("I"), array("I"), array("I"), array("i"))
+    for row in rows:
+        key = ids.get(row["fingerprint"])
+        if key is None:
+            key = ids[row["fingerprint"]] = len(errors)
+            errors.append(ErrorStats(key, {
+                "fingerprint": row["fingerprint"], "error_type": row.get("error_type"), "message": row.get("message"),
+                "location": row.get("location"), "language": row.get("language"), "count": 0,
+                "first": row["ts"], "last": row["ts"], "first_command": row.get("command"),
+            }))
+        stats = errors[key]
+        stats.count += 1
+        if row["ts"] < stats.first:
+            stats.first, stats.first_command = row["ts"], row.get("command")
+        stats.last = max(stats.last, row["ts"])
+        columns.ts.append(row["ts"])
+        columns.error.append(key)
+        columns.command.append(encode("commands", row.get("command") or ""))
+        columns.host.append(encode("hosts", row.get("host") or ""))
+        columns.exit.append(int(row.get("exit_code") or 0))
+    return columns
+
+
+def compact(directory: Optional[str] = None, blocking: bool = True) -> int:
+    """Fold the log into a new segment and merge small segments; returns the rows folded in.
+
+    With `blocking=False`, raises BlockingIOError if another process holds the lock.
+    """
+    directory = directory or history_dir()
+    if directory is None or not os.path.isdir(directory):
+        return 0
+    with _Lock(directory, exclusive=True, blocking=blocking):
+        index = _read_index(directory)
+        # Log parts a crashed compaction already folded in are just removed
+        for name in index["ingested"]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        index["ingested"] = []
+        parts = sorted(name for name in os.listdir(directory) if name.startswith(LOG_FILE + "."))
+        log = os.path.join(directory, LOG_FILE)
+        if os.path.exists(log):
+            part = f"{LOG_FILE}.{time.time_ns()}"
+            os.replace(log, os.path.join(directory, part))
+            parts.append(part)
+        rows = [row for name in parts for row in _read_log(os.path.join(directory, name))]
+
+        errors = [ErrorStats(i, info) for i, info in enumerate(index["errors"])]
+        ids = {stats.fingerprint: stats.id for stats in errors}
+        if rows:
+            columns = _columns_from_rows(rows, index, errors, ids)
+            name = f"segment-{index['next_segment']:06d}.sbh"
+            _write_segment(os.path.join(directory, name), columns)
+            index["segments"].append(name)
+            index["next_segment"] += 1
+        obsolete = _merge_segments(directory, index)
+        index["errors"] = [stats.to_dict() for stats in errors]
+        index["ingested"] = parts
+        _write_index(directory, index)
+        for name in parts + obsolete:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    return len(rows)
+
+
+def _merge_segments(directory: str, index: dict) -> List[str]:
+    """Merge the newest segments while the last is at least half the size of the one before.
+
+    Returns the files the merged segment replaces.
+    """
+    names = index["segments"]
+    sizes = []
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            sizes.append(_HEADER.unpack(f.read(_HEADER.size))[1])
+    take = 1
+    while take < len(names) and sum(sizes[-take:]) * 2 >= sizes[-take - 1]:
+        take += 1
+    if take == 1:
+        return []
+    merging = names[-take:]
+    segments = [Segment(os.path.join(directory, name)) for name in merging]
+    try:
+        columns = _sorted_columns(segments)
+    finally:
+        for segment in segments:
+            segment.close()
+    name = f"segment-{index['next_segment']:06d}.sbh"
+    _write_segment(os.path.join(directory, name), columns)
+    index["next_segment"] += 1
+    index["segments"] = names[:-take] + [name]
+    return merging
+
+
+def _write_index(directory: str, index: dict) -> None:
+    path = os.path.join(directory, INDEX_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+# -- export -----------------------------------------------------------------
+
+def export(history: History, path: str, fmt: Optional[str] = None,
+           since: Optional[float] = None, until: Optional[float] = None) -> int:
+    """Write the runs in [since, until) to `path` as JSONL, CSV or Parquet; returns the row count.
+
+    The format defaults to the file extension.  Parquet needs pyarrow.
+    """
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower() or "jsonl"
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format: {fmt} (use one of: {', '.join(EXPORT_FORMATS)})")
+    rows = history.rows(since, until)
+    count = 0
+    if fmt == "parquet":
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow") from None
+        data: Dict[str, list] = {name: [] for name in FIELDS}
+        for row in rows:
+            for name in FIELDS:
+                data[name].append(row[name])
+            count += 1
+        pyarrow.parquet.write_table(pyarrow.table(data), path)
+        return count
+    with open(path, "w", newline="") as f:
+        if fmt == "csv":
+            import csv
+
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+    return count
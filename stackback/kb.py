@@ -0,0 +1,355 @@
+"""Offline knowledge base: a memory-mapped BM25 index of past answers.
+
+Documents come from a Stack Exchange data dump (Posts.xml: each question
+with its accepted or best answer) or from our own notes and postmortems
+(JSONL records, or a directory of Markdown/text files).  They are indexed
+over identifier-aware tokens, so `KeyError`, `json.decoder` and
+`load_config` match across the error type, message and frame names.
+
+The index is one binary file, laid out so it can be used straight from an
+mmap without parsing:
+
+    header      magic, counts, average document length, section offsets
+    terms       sorted 64-bit term hashes, looked up by binary search
+    term info   postings offset and document frequency per term
+    postings    document ids, then term frequencies, per term
+    doc norms   BM25 length normalisation per document, as float32
+    doc store   offsets into a JSON-lines blob of titles, excerpts and URLs
+
+Opening an index only maps the file; a query touches the pages of its own
+terms' postings and of the documents it returns.
+"""
+import bisect
+import hashlib
+import heapq
+import html
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cache import default_cache_dir
+from .compact import _package
+from .fingerprint import normalize_message
+from .parser import ParsedError
+
+INDEX_NAME = "kb.idx"
+MAGIC = b"SBKB0001"
+K1 = 1.2
+B = 0.75
+EXCERPT_CHARS = 600
+
+# magic, docs, terms, avgdl, then byte offsets of the sections
+_HEADER = struct.Struct("<8sIId6Q")
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_TAG_RE = re.compile(r"<[^>]+>")
+_MASK_RE = re.compile(r"<\w+>")
+_STOP = frozenset(
+    "a an and are as at be but by for from has have i if in is it its my not of on or "
+    "so that the this to was we what when why with you your how do does can".split()
+)
+
+
+def default_index_path() -> str:
+    """$STACKBACK_KB, else kb.idx in the cache directory."""
+    return os.environ.get("STACKBACK_KB") or os.path.join(default_cache_dir(), INDEX_NAME)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase tokens; identifiers also yield their snake/camel-case parts."""
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        if lower not in _STOP and len(lower) > 1:
+            tokens.append(lower)
+        if "_" in word or not (word.islower() or word.isupper()):
+            for part in _CAMEL_RE.findall(word.replace("_", " ")):
+                part = part.lower()
+                if part != lower and part not in _STOP and len(part) > 1:
+                    tokens.append(part)
+    return tokens
+
+
+def query_terms(error: ParsedError) -> Dict[str, float]:
+    """Weighted query terms for an error: its type, message and innermost frames."""
+    weights: Dict[str, float] = {}
+
+    def add(tokens: Iterable[str], weight: float) -> None:
+        for token in tokens:
+            weights[token] = max(weights.get(token, 0.0), weight)
+
+    add(tokenize(_MASK_RE.sub(" ", normalize_message(error.message))), 1.0)
+    for frame in error.frames[-3:]:
+        if frame.function and not frame.function.startswith("<"):
+            add(tokenize(frame.function), 0.5)
+        package = _package(frame.file) if frame.is_library else None
+        if package:
+            add(tokenize(package), 0.7)
+    add(tokenize(error.error_type), 2.0)
+    return weights
+
+
+def _term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+
+
+def strip_html(text: str) -> str:
+    return html.unescape(_TAG_RE.sub(" ", text or ""))
+
+
+def _excerpt(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= EXCERPT_CHARS else text[:EXCERPT_CHARS - 3].rsplit(" ", 1)[0] + "..."
+
+
+# -- sources ----------------------------------------------------------------
+
+def read_stackexchange(path: str, site: str = "https://stackoverflow.com",
+                       tag: Optional[str] = None) -> Iterator[dict]:
+    """Questions from a Stack Exchange Posts.xml dump, each with its accepted or best answer."""
+    import xml.etree.ElementTree as ET
+
+    questions: Dict[str, dict] = {}
+    answers: Dict[str, Tuple[int, str]] = {}
+    for _, row in ET.iterparse(path):
+        if row.tag != "row":
+            continue
+        attrs = row.attrib
+        kind = attrs.get("PostTypeId")
+        if kind == "1":
+            tags = attrs.get("Tags", "")
+            if tag is None or f"<{tag}>" in tags or f"|{tag}|" in tags:
+                questions[attrs["Id"]] = {
+                    "title": attrs.get("Title", ""),
+                    "body": strip_html(attrs.get("Body", "")),
+                    "accepted": attrs.get("AcceptedAnswerId"),
+                    "score": int(attrs.get("Score", 0)),
+                    "tags": tags,
+                }
+        elif kind == "2":
+            parent = attrs.get("ParentId")
+            score = int(attrs.get("Score", 0))
+            # The accepted answer wins; otherwise the highest scored one
+            accepted = questions.get(parent, {}).get("accepted") == attrs.get("Id")
+            rank = (1 << 30) if accepted else score
+            if parent not in answers or rank > answers[parent][0]:
+                answers[parent] = (rank, strip_html(attrs.get("Body", "")))
+        row.clear()
+    for qid, question in questions.items():
+        answer = answers.get(qid, (0, ""))[1]
+        if not answer:
+            continue
+        yield {
+            "title": question["title"],
+            "text": " ".join((question["title"], question["title"], question["body"], answer)),
+            "excerpt": _excerpt(answer),
+            "url": f"{site}/questions/{qid}",
+            "score": question["score"],
+        }
+
+
+def read_notes(path: str) -> Iterator[dict]:
+    """Documents from a JSONL file ({"title", "body", "url"?}) or a directory of notes."""
+    if os.path.isdir(path):
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(names):
+                if name.endswith((".md", ".txt", ".rst")):
+                    full = os.path.join(root, name)
+                    with open(full, encoding="utf-8", errors="replace") as f:
+                        body = f.read()
+                    title = body.strip().splitlines()[0].lstrip("# ").strip() if body.strip() else name
+                    yield {"title": title, "text": f"{title} {title} {body}", "excerpt": _excerpt(body),
+                           "url": full, "score": 0}
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            title, body = record.get("title", ""), record.get("body", "")
+            yield {
+                "title": title,
+                "text": " ".join((title, title, body, " ".join(record.get("tags", ())))),
+                "excerpt": _excerpt(record.get("answer") or body),
+                "url": record.get("url", ""),
+                "score": record.get("score", 0),
+            }
+
+
+def read_source(path: str, tag: Optional[str] = None) -> Iterator[dict]:
+    if path.endswith(".xml"):
+        return read_stackexchange(path, tag=tag)
+    return read_notes(path)
+
+
+# -- building ---------------------------------------------------------------
+
+def build_index(documents: Iterable[dict], path: Optional[str] = None) -> int:
+    """Write the index for `documents` to `path` (atomically); returns the document count."""
+    path = path or default_index_path()
+    postings: Dict[int, Tuple[array, array]] = {}
+    lengths = array("I")
+    store = bytearray()
+    offsets = array("Q", [0])
+    for doc_id, doc in enumerate(documents):
+        counts = Counter(tokenize(doc["text"]))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            entry = postings.get(_term_hash(term))
+            if entry is None:
+                entry = postings[_term_hash(term)] = (array("I"), array("H"))
+            entry[0].append(doc_id)
+            entry[1].append(min(tf, 0xFFFF))
+        meta = {k: doc.get(k) for k in ("title", "excerpt", "url", "score")}
+        store += json.dumps(meta, ensure_ascii=False).encode() + b"\n"
+        offsets.append(len(store))
+
+    hashes = array("Q", sorted(postings))
+    info = array("Q")
+    blob = bytearray()
+    for term in hashes:
+        ids, tfs = postings[term]
+        info.extend((len(blob) // 4, len(ids)))
+        blob += ids.tobytes() + tfs.tobytes()
+        if len(blob) % 4:
+            blob += b"\0" * (4 - len(blob) % 4)
+
+    docs = len(lengths)
+    avgdl = sum(lengths) / docs if docs else 0.0
+    # Length normalisation is fixed once the corpus is, so store it ready to use
+    norms = array("f", (K1 * (1 - B + B * length / (avgdl or 1.0)) for length in lengths))
+    sections = [hashes.tobytes(), info.tobytes(), bytes(blob), norms.tobytes(), offsets.tobytes(), bytes(store)]
+    starts, pos = [], _HEADER.size
+    for section in sections:
+        pos += -pos % 8  # keep every section 8-byte aligned
+        starts.append(pos)
+        pos += len(section)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, docs, len(hashes), avgdl, *starts))
+        for start, section in zip(starts, sections):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(section)
+    os.replace(tmp, path)
+    return docs
+
+
+# -- querying ---------------------------------------------------------------
+
+class Hit:
+    __slots__ = ("doc_id", "score", "title", "excerpt", "url")
+
+    def __init__(self, doc_id: int, score: float, meta: dict):
+        self.doc_id = doc_id
+        self.score = score
+        self.title = meta.get("title") or ""
+        self.excerpt = meta.get("excerpt") or ""
+        self.url = meta.get("url") or ""
+
+    def __repr__(self) -> str:
+        return f"Hit({self.doc_id}, {self.score:.2f}, {self.title!r})"
+
+
+class KnowledgeBase:
+    """A built index, memory-mapped read-only."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_index_path()
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        magic, self.docs, terms, self.avgdl, *starts = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a stackback index")
+        h, i, p, l, o, s = starts
+        self._hashes = view[h:h + terms * 8].cast("Q")
+        self._info = view[i:i + terms * 16].cast("Q")
+        self._postings = view[p:l].cast("B")
+        self._norms = view[l:l + self.docs * 4].cast("f")
+        self._offsets = view[o:o + (self.docs + 1) * 8].cast("Q")
+        self._store = s
+
+    def __len__(self) -> int:
+        return self.docs
+
+    def _lookup(self, term: str) -> Optional[Tuple[memoryview, memoryview]]:
+        key = _term_hash(term)
+        index = bisect.bisect_left(self._hashes, key)
+        if index >= len(self._hashes) or self._hashes[index] != key:
+            return None
+        start, df = self._info[2 * index], self._info[2 * index + 1]
+        ids = self._postings[start * 4:start * 4 + df * 4].cast("I")
+        tfs = self._postings[start * 4 + df * 4:start * 4 + df * 6].cast("H")
+        return ids, tfs
+
+    def _meta(self, doc_id: int) -> dict:
+        start, end = self._offsets[doc_id], self._offsets[doc_id + 1]
+        return json.loads(self._mm[self._store + start:self._store + end])
+
+    def search_terms(self, terms: Dict[str, float], k: int = 3) -> List[Hit]:
+        """Top `k` documents for weighted query terms, by BM25.
+
+        Terms are scored rarest first.  A term's contribution to any one
+        document is at most idf * (k1 + 1), so once the k-th best score
+        beats everything the remaining terms could add to an unseen
+        document, the long posting lists of common terms are only probed
+        (by binary search) for the documents already in the running.
+        """
+        postings = []
+        for term, weight in terms.items():
+            found = self._lookup(term)
+            if found is not None:
+                df = len(found[0])
+                idf = math.log(1 + (self.docs - df + 0.5) / (df + 0.5)) * weight
+                postings.append((idf * (K1 + 1), found))
+        postings.sort(key=lambda item: -item[0])
+        remaining = sum(bound for bound, _ in postings)
+
+        scores: Dict[int, float] = {}
+        norms = self._norms
+        get = scores.get
+        for scale, (ids, tfs) in postings:
+            if len(scores) >= k and heapq.nlargest(k, scores.values())[-1] >= remaining:
+                df = len(ids)
+                for doc_id in scores:
+                    index = bisect.bisect_left(ids, doc_id)
+                    if index < df and ids[index] == doc_id:
+                        tf = tfs[index]
+                        scores[doc_id] += scale * tf / (tf + norms[doc_id])
+            else:
+                for doc_id, tf in zip(ids, tfs):
+                    scores[doc_id] = get(doc_id, 0.0) + scale * tf / (tf + norms[doc_id])
+            remaining -= scale
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [Hit(doc_id, score, self._meta(doc_id)) for doc_id, score in best]
+
+    def search(self, query, k: int = 3) -> List[Hit]:
+        """Top `k` documents for a ParsedError or a free-text query."""
+        if isinstance(query, ParsedError):
+            return self.search_terms(query_terms(query), k)
+        return self.search_terms({term: 1.0 for term in tokenize(query)}, k)
+
+    def close(self) -> None:
+        for name in ("_hashes", "_info", "_postings", "_norms", "_offsets"):
+            getattr(self, name).release()
+        self._mm.close()
+
+
+def open_default() -> Optional[KnowledgeBase]:
+    """The default index, or None if none has been built."""
+    try:
+        return KnowledgeBase()
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,380 @@
+"""Error parsers for the languages `sb` wraps, behind a literal prefilter.
+
+Every parser declares the literal line prefixes its output can start with
+("panic: ", "\\tat ", "thread '", ...).  `Registry.classify` finds which of
+them occur at the start of a line in one regex pass that only stops at
+newlines followed by a possible first byte, then resolves each hit with a
+dict lookup on the line's first four bytes (or fewer, for the few shorter
+signatures).  The cost of that pass hardly
+changes as parsers are added, and output is only handed to the parsers
+that could match.  The Python parser (`stackback.parser`) is the fallback:
+it runs last, on whatever no other parser claimed.
+
+Each parser returns the error of its output that matters most (the
+uncaught one, the first compiler error, the first failed test), as a
+`ParsedError` with its frames outermost first, like Python's.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .parser import Frame, ParsedError, _pick_location, parse_python_traceback
+
+PREFIX = 4
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+
+class LanguageParser:
+    """Base class: `signatures` are literal line prefixes."""
+
+    name = ""
+    signatures: Tuple[bytes, ...] = ()
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        raise NotImplementedError
+
+
+def _error(error_type: str, message: str, frames: List[Frame], raw: str, language: str) -> ParsedError:
+    frames = tuple(frames)
+    filename, line = _pick_location(frames)
+    return ParsedError(error_type, message, filename, line, raw, language, frames)
+
+
+class NodeParser(LanguageParser):
+    """Uncaught exceptions from Node.js (V8 stack traces)."""
+
+    name = "node"
+    signatures = (b"    at ",)
+
+    _HEADER_RE = re.compile(r"^(?:Uncaught )?([A-Za-z_$][\w$.]*?(?:Error|Exception)|Error)(?: \[(\w+)\])?: (.*)$")
+    _FRAME_RE = re.compile(r"^\s+at (?:(?:async )?(.+?) \()?(.+?):(\d+):\d+\)?(?: \{)?$")
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        lines = text.splitlines()
+        found = None
+        index = 0
+        while index < len(lines):
+            header = self._HEADER_RE.match(lines[index])
+            if header is None:
+                index += 1
+                continue
+            start, index = index, index + 1
+            frames: List[Frame] = []
+            skipped = 0
+            while index < len(lines):
+                frame = self._FRAME_RE.match(lines[index])
+                if frame is not None:
+                    function, path, line = frame.groups()
+                    frames.append(Frame(path, int(line), function))
+                elif frames or skipped >= 10:
+                    break
+                else:
+                    skipped += 1  # e.g. "Require stack:" before the frames
+                index += 1
+            if frames:
+                error_type, code, message = header.groups()
+                if code:
+                    message = f"{message} [{code}]"
+                frames.reverse()
+                found = _error(error_type, message, frames, "\n".join(lines[start:index]), self.name)
+        return found
+
+
+class GoParser(LanguageParser):
+    """Go panics and fatal errors with their goroutine trace, and build errors."""
+
+    name = "go"
+    signatures = (b"panic: ", b"fatal error: ", b"goroutine ", b"# ")
+
+    _PANIC_RE = re.compile(r"^(panic|fatal error): (.*)$")
+    _LOCATION_RE = re.compile(r"^\t(.+?\.\w+):(\d+)(?: \+0x[0-9a-f]+)?$")
+    _BUILD_RE = re.compile(r"^(\S+\.go):(\d+)(?::\d+)?: (.*)$")
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        lines = text.splitlines()
+        for index, line in enumerate(lines):
+            panic = self._PANIC_RE.match(line)
+            if panic is not None:
+                return self._panic(lines, index, *panic.groups())
+        for index, line in enumerate(lines):
+            if line.startswith("# "):
+                build = self._BUILD_RE.match(lines[index + 1]) if index + 1 < len(lines) else None
+                if build is not None:
+                    path, number, message = build.groups()
+                    end = index + 1
+                    while end < len(lines) and self._BUILD_RE.match(lines[end]):
+                        end += 1
+                    return _error("build error", message, [Frame(path, int(number))],
+                                  "\n".join(lines[index:end]), self.name)
+        return None
+
+    def _panic(self, lines: List[str], start: int, kind: str, message: str) -> ParsedError:
+        frames: List[Frame] = []
+        index = start + 1
+        # The first goroutine is the one that panicked
+        while index < len(lines) and not lines[index].startswith("goroutine "):
+            index += 1
+        index += 1
+        while index + 1 < len(lines) and lines[index].strip():
+            location = self._LOCATION_RE.match(lines[index + 1])
+            if location is None:
+                break
+            function = lines[index].rsplit("(", 1)[0]
+            frames.append(Frame(location.group(1), int(location.group(2)), function))
+            index += 2
+        frames.reverse()
+        return _error(kind, message, frames, "\n".join(lines[start:index]), self.name)
+
+
+class RustParser(LanguageParser):
+    """Rust panics (with the backtrace, if enabled) and compiler errors."""
+
+    name = "rust"
+    signatures = (b"thread '", b"error[E", b"error: ")
+
+    _PANIC_RE = re.compile(r"^thread '(.*?)' panicked at (?:'(.*)', )?(.+?):(\d+):\d+:?$")
+    _FRAME_RE = re.compile(r"^\s+\d+: (.+)$")
+    _AT_RE = re.compile(r"^\s+at (.+?):(\d+):\d+$")
+    _COMPILE_RE = re.compile(r"^error(?:\[(E\d+)\])?: (.*)$")
+    _ARROW_RE = re.compile(r"^\s*--> (.+?):(\d+):\d+$")
+    _SNIPPET_RE = re.compile(r"^\s*(\d+) \| (.*)$")
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        lines = text.splitlines()
+        for index, line in enumerate(lines):
+            panic = self._PANIC_RE.match(line)
+            if panic is not None:
+                return self._panic(lines, index, panic)
+        for index, line in enumerate(lines):
+            compile_error = self._COMPILE_RE.match(line)
+            if compile_error is None or index + 1 >= len(lines):
+                continue
+            arrow = self._ARROW_RE.match(lines[index + 1])
+            if arrow is None:
+                continue  # a summary such as "error: aborting due to ..."
+            end, source = index + 2, None
+            while end < len(lines) and lines[end].strip() and not self._COMPILE_RE.match(lines[end]):
+                snippet = self._SNIPPET_RE.match(lines[end])
+                if snippet is not None and source is None and snippet.group(1) == arrow.group(2):
+                    source = snippet.group(2).strip()
+                end += 1
+            code, message = compile_error.groups()
+            frame = Frame(arrow.group(1), int(arrow.group(2)), None, source)
+            return _error(code or "error", message, [frame], "\n".join(lines[index:end]), self.name)
+        return None
+
+    def _panic(self, lines: List[str], start: int, panic) -> ParsedError:
+        _, old_message, path, number = panic.groups()
+        index = start + 1
+        message = old_message
+        if message is None:
+            body = []
+            while index < len(lines) and lines[index] and not lines[index].startswith(("note:", "stack backtrace:")):
+                body.append(lines[index])
+                index += 1
+            message = "\n".join(body)
+        frames: List[Frame] = []
+        if index < len(lines) and lines[index].startswith("stack backtrace:"):
+            index += 1
+            while index < len(lines):
+                frame = self._FRAME_RE.match(lines[index])
+                if frame is None:
+                    break
+                at = self._AT_RE.match(lines[index + 1]) if index + 1 < len(lines) else None
+                if at is not None:
+                    frames.append(Frame(at.group(1), int(at.group(2)), frame.group(1)))
+                    index += 1
+                index += 1
+        if not frames:
+            frames = [Frame(path, int(number))]
+        frames.reverse()
+        return _error("panic", message, frames, "\n".join(lines[start:index]), self.name)
+
+
+class JavaParser(LanguageParser):
+    """JVM stack traces, with their "Caused by:" chain."""
+
+    name = "java"
+    signatures = (b"Exception in thread", b"\tat ", b"Caused by: ")
+
+    _HEADER_RE = re.compile(
+        r"^(?:Exception in thread \".*?\" |Caused by: )?((?:[a-zA-Z_$][\w$]*\.)+[A-Z][\w$]*)(?:: (.*))?$"
+    )
+    _FRAME_RE = re.compile(r"^\s+at (?:([\w.$-]+)/)?([\w$.<>]+)\.([\w$<>]+)\((?:([^:()]+):(\d+)|[^()]*)\)$")
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        lines = text.splitlines()
+        blocks: List[Tuple[str, str, List[Frame], int, int]] = []
+        index = 0
+        while index < len(lines):
+            header = self._HEADER_RE.match(lines[index])
+            if header is None or index + 1 >= len(lines) or not self._FRAME_RE.match(lines[index + 1]):
+                index += 1
+                continue
+            start, index = index, index + 1
+            frames: List[Frame] = []
+            while index < len(lines):
+                frame = self._FRAME_RE.match(lines[index])
+                if frame is not None:
+                    module, cls, method, filename, number = frame.groups()
+                    package = cls.rsplit(".", 1)[0].replace(".", "/") if "." in cls else ""
+                    path = "/".join(p for p in (module, package, filename or f"{cls.rsplit('.', 1)[-1]}.java") if p)
+                    frames.append(Frame(path, int(number or 0), f"{cls}.{method}"))
+                elif not lines[index].strip().startswith("..."):
+                    break
+                index += 1
+            frames.reverse()
+            if not lines[start].startswith("Caused by: "):
+                blocks = []  # a new, unrelated trace
+            blocks.append((header.group(1), header.group(2) or "", frames, start, index))
+        if not blocks:
+            return None
+        raw = "\n".join(lines[blocks[0][3]:blocks[-1][4]])
+        error = None
+        # Java prints the outermost exception first; each "Caused by" is the
+        # cause of the one above it
+        for error_type, message, frames, start, end in reversed(blocks):
+            outer = _error(error_type, message, frames, "\n".join(lines[start:end]), self.name)
+            if error is not None:
+                outer.cause, outer.cause_kind = error, "cause"
+            error = outer
+        error.traceback = raw
+        return error
+
+
+class PytestParser(LanguageParser):
+    """The first failure in a pytest report (long or short tracebacks)."""
+
+    name = "pytest"
+    signatures = (b"====", b"FAILED ", b"____", b"\x1b[31mFAILED")
+
+    _SECTION_RE = re.compile(r"^_{3,} (.+?) _{3,}$")
+    _SHORT_RE = re.compile(r"^(\S.*?\.py):(\d+): in (\S+)$")
+    _LONG_RE = re.compile(r"^(\S.*?\.py):(\d+): ?([\w.]*)$")
+    _DEF_RE = re.compile(r"^\s*(?:async )?def (\w+)\(")
+    _EXC_RE = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Warning|Exit|Interrupt|Failed)|Failed)(?:: (.*))?$")
+    _SUMMARY_RE = re.compile(r"^(?:FAILED|ERROR) (\S+?)(?:::\S+)? - (.*)$")
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        lines = _ANSI_RE.sub("", text).splitlines()
+        # The first test section, after the FAILURES header if it is still in the tail
+        start = next((i for i, line in enumerate(lines) if re.match(r"^=+ (FAILURES|ERRORS) =+$", line)), -1)
+        index = start + 1
+        while index < len(lines) and not self._SECTION_RE.match(lines[index]):
+            index += 1
+        if index >= len(lines):
+            return self._summary(lines)
+        end = index + 1
+        while end < len(lines) and not self._SECTION_RE.match(lines[end]) and not lines[end].startswith("===="):
+            end += 1
+        section = lines[index + 1:end]
+        frames: List[Frame] = []
+        function = source = exc_name = None
+        e_lines: List[str] = []
+        for number, line in enumerate(section):
+            short = self._SHORT_RE.match(line)
+            long = None if short else self._LONG_RE.match(line)
+            if short is not None:
+                following = section[number + 1].strip() if number + 1 < len(section) else None
+                frames.append(Frame(short.group(1), int(short.group(2)), short.group(3), following))
+            elif long is not None:
+                frames.append(Frame(long.group(1), int(long.group(2)), function, source))
+                exc_name = long.group(3) or exc_name
+                function = source = None
+            elif line.startswith("E   ") or line == "E":
+                e_lines.append(line[1:].strip())
+            else:
+                definition = self._DEF_RE.match(line)
+                if definition is not None:
+                    function = definition.group(1)
+                elif line.startswith(">"):
+                    source = line[1:].strip()
+        if not frames and not e_lines:
+            return self._summary(lines)
+        first = e_lines[0] if e_lines else ""
+        exc = self._EXC_RE.match(first)
+        if exc is not None:
+            error_type, message = exc.group(1), exc.group(2) or ""
+        else:
+            # Rewritten asserts: "E   assert 3 == 4", type from the location line
+            error_type, message = exc_name or "AssertionError", " ".join(e_lines[:3])
+        return _error(error_type, message, frames, "\n".join(lines[index:end]), "python")
+
+    def _summary(self, lines: List[str]) -> Optional[ParsedError]:
+        for line in lines:
+            summary = self._SUMMARY_RE.match(line)
+            if summary is not None:
+                exc = self._EXC_RE.match(summary.group(2))
+                error_type, message = (exc.group(1), exc.group(2) or "") if exc else ("AssertionError", summary.group(2))
+                return ParsedError(error_type, message, summary.group(1), None, line, "python")
+        return None
+
+
+class PythonParser(LanguageParser):
+    name = "python"
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        return parse_python_traceback(text)
+
+
+class Registry:
+    """Parsers in priority order, plus the fallback tried after all of them."""
+
+    def __init__(self, fallback: Optional[LanguageParser] = None):
+        self.parsers: List[LanguageParser] = []
+        self.fallback = fallback
+        self._compiled: Dict[type, tuple] = {}
+
+    def register(self, parser: LanguageParser) -> LanguageParser:
+        if not all(parser.signatures):
+            raise ValueError(f"{parser.name}: empty signature")
+        self.parsers.append(parser)
+        self._compiled.clear()
+        return parser
+
+    def _tables(self, kind: type) -> tuple:
+        compiled = self._compiled.get(kind)
+        if compiled is None:
+            table: Dict = {}
+            for rank, parser in enumerate(self.parsers):
+                for signature in parser.signatures:
+                    if kind is str:
+                        signature = signature.decode()
+                    table.setdefault(signature[:PREFIX], []).append((signature, rank))
+            first = "".join(sorted({key[0] if kind is str else chr(key[0]) for key in table}))
+            pattern = "\n[" + re.escape(first) + "]" if first else "(?!)"
+            regex = re.compile(pattern if kind is str else pattern.encode("latin-1"))
+            lengths = tuple(sorted({len(key) for key in table}, reverse=True))
+            compiled = self._compiled[kind] = (regex, table, lengths)
+        return compiled
+
+    def classify(self, data) -> List[LanguageParser]:
+        """Parsers whose signatures start a line of `data` (str or bytes), in priority order."""
+        regex, table, lengths = self._tables(str if isinstance(data, str) else bytes)
+        hits = set()
+        get = table.get
+        positions = [0]
+        positions.extend(match.end() - 1 for match in regex.finditer(data))
+        for position in positions:
+            for length in lengths:
+                candidates = get(data[position:position + length])
+                if candidates:
+                    for signature, rank in candidates:
+                        if rank not in hits and data.startswith(signature, position):
+                            hits.add(rank)
+            if len(hits) == len(self.parsers):
+                break
+        return [self.parsers[rank] for rank in sorted(hits)]
+
+    def parse(self, text: str) -> Optional[ParsedError]:
+        """The error in `text`, from the first candidate parser that finds one."""
+        for parser in self.classify(text):
+            error = parser.parse(text)
+            if error is not None:
+                return error
+        return self.fallback.parse(text) if self.fallback is not None else None
+
+
+registry = Registry(fallback=PythonParser())
+for _parser in (PytestParser(), NodeParser(), GoParser(), RustParser(), JavaParser()):
+    registry.register(_parser)
@@ -1,8 +1,22 @@
-import os
-from typing import Optional
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from .cache import ExplanationCache
+from .client import PROVIDERS, LLMClient
+from .compact import DEFAULT_BUDGET_TOKENS, compact_traceback, estimate_tokens
+from .fingerprint import fingerprint
 from .parser import ParsedError
+from .profile import profiler
+from .rules import Answer, RuleEngine, engine as default_rules
+from .source import attach_source_context, render_context
 
-EXPLAIN_PROMPT = """You are a helpful Python debugging assistant. A developer ran their Python script and got this error:
+MODEL = "gpt-4o-mini"
+PROMPT_CONTEXT_FRAMES = 2
+# ParsedError.language -> the name used in prompts
+LANGUAGE_NAMES = {"python": "Python", "node": "JavaScript (Node.js)", "go": "Go", "rust": "Rust", "java": "Java"}
+
+EXPLAIN_PROMPT = """You are a helpful {language} debugging assistant. A developer ran their {language} program and got this error:
 
 Error Type: {error_type}
 Message: {message}
@@ -12,89 +26,483 @@ Full traceback:
 ```
 {traceback}
 ```
-
+{source}
 Please:
 1. Explain what caused this error in 2-3 sentences (plain English, no jargon)
 2. Suggest a concrete fix with a code example
 
 Be concise and practical."""
 
-FIX_PROMPT = """Python error: {error_type}: {message}
+FIX_PROMPT = """{language} error: {error_type}: {message}
 Traceback:
 {traceback}
-
+{source}
 Provide ONLY the fixed code snippet (no explanation, just the corrected code)."""
 
+COMBINED_PROMPT = """You are a helpful {language} debugging assistant. A developer ran their {language} program and got this error:
+
+Error Type: {error_type}
+Message: {message}
+File: {filename} (line {line_number})
+
+Full traceback:
+```
+{traceback}
+```
+{source}
+Answer in exactly two sections, in this order and with these headers:
+
+EXPLANATION:
+What caused this error, in 2-3 sentences of plain English.
+
+FIX:
+ONLY the fixed code snippet, no explanation."""
+
 MOCK_EXPLANATIONS = {
     "TypeError": "A TypeError occurs when an operation is applied to an object of inappropriate type. For example, trying to use a string where an integer is expected. Check the variable types at the line shown in the traceback.",
     "ValueError": "A ValueError occurs when a function receives an argument of the correct type but an inappropriate value. Check the input being passed to the function.",
-    "FileNotFoundError": "The file or directory you're trying to open doesn't exist at the specified path. Check if the path is correct and the file exists.",
-    "ImportError": "Python can't find the module you're trying to import. Make sure it's installed (pip install <module>) and the name is correct.",
-    "AttributeError": "You're trying to access an attribute or method that doesn't exist on this object. Check the object type and available methods.",
-    "KeyError": "You're trying to access a dictionary key that doesn't exist. Check if the key is present before accessing it, or use .get() with a default.",
-    "IndexError": "You're trying to access a list index that's out of range. The list is shorter than expected. Check the list length before indexing.",
-    "NameError": "You're using a variable name that hasn't been defined yet. Check for typos or make sure the variable is defined before use.",
+    "FileNotFoundError": "A FileNotFoundError means the file or directory you're trying to open doesn't exist at the specified path. Check if the path is correct and the file exists.",
+    "ImportError": "An ImportError means Python can't find the module you're trying to import. Make sure it's installed (pip install <module>) and the name is correct.",
+    "AttributeError": "An AttributeError means you're trying to access an attribute or method that doesn't exist on this object. Check the object type and available methods.",
+    "KeyError": "A KeyError means you're trying to access a dictionary key that doesn't exist. Check if the key is present before accessing it, or use .get() with a default.",
+    "IndexError": "An IndexError means you're trying to access a list index that's out of range. The list is shorter than expected. Check the list length before indexing.",
+    "NameError": "A NameError means you're using a variable name that hasn't been defined yet. Check for typos or make sure the variable is defined before use.",
 }
 
+# Words with their trailing whitespace, so joined tokens rebuild the text exactly
+_TOKEN_RE = re.compile(r'\S+\s*|\s+')
+
 class LLMExplainer:
-    def __init__(self, api_key: Optional[str] = None, provider: str = "openai"):
-        self.api_key = api_key or os.environ.get("OPENAI_API_KEY") or os.environ.get("ANTHROPIC_API_KEY")
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        provider: str = "openai",
+        cache=None,
+        combined: bool = False,
+        budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+        model: Optional[str] = None,
+        rules=None,
+        source_context: bool = True,
+        client=None,
+    ):
+        """`cache` is an ExplanationCache, None for the default on-disk cache, or False to disable.
+
+        With `combined=True` the explanation and the fix are requested together
+        in one call, and whichever is not asked for yet is kept for later.
+        `budget_tokens` bounds the traceback part of each prompt.  `rules` is a
+        RuleEngine, None for the built-in rules, or False to always ask the LLM;
+        a confident rule answers without any request.  With `source_context`
+        the code around the failing lines is read from disk and sent too.
+        `client` replaces the one built for `provider` (e.g. a Router).
+        """
+        adapter = PROVIDERS.get(provider)
+        self.api_key = api_key or (adapter.api_key() if adapter else None)
         self.provider = provider
-        self._client = None
+        self.model = model or (adapter.default_model if adapter else MODEL)
+        self.combined = combined
+        self.budget_tokens = budget_tokens
+        self._client = client
+        self._cache = cache
+        self._memo: Dict[Tuple[str, str], str] = {}
+        self.rules: Optional[RuleEngine] = default_rules if rules is None else (rules or None)
+        self._rule_answers: Dict[str, Optional[Answer]] = {}
+        self.source_context = source_context
+        self.last_error: Optional[Exception] = None
     
-    def _get_client(self):
+    def _get_client(self) -> Optional[LLMClient]:
         if self._client:
             return self._client
-        if self.provider == "openai" and self.api_key:
-            try:
-                import openai
-                self._client = openai.OpenAI(api_key=self.api_key)
-                return self._client
-            except ImportError:
-                pass
-        return None
-    
-    def explain(self, error: ParsedError) -> str:
-        """Returns plain-English explanation. Falls back to built-in explanations."""
+        adapter = PROVIDERS.get(self.provider)
+        if adapter is not None and (self.api_key or not adapter.needs_key):
+            self._client = LLMClient(self.provider, api_key=self.api_key, model=self.model)
+        return self._client
+
+    def warm(self) -> Optional["threading.Thread"]:
+        """Start loading a local model in the background (see `LLMClient.warm`)."""
         client = self._get_client()
-        if client:
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": EXPLAIN_PROMPT.format(
-                        error_type=error.error_type,
-                        message=error.message,
-                        filename=error.filename or "unknown",
-                        line_number=error.line_number or "unknown",
-                        traceback=error.traceback[:2000]
-                    )}],
-                    max_tokens=300
-                )
-                return response.choices[0].message.content
-            except Exception:
-                pass
-        
-        # Fallback: built-in explanations
+        if client is None or not client.can_warm:
+            return None
+        thread = threading.Thread(target=client.warm, name="stackback-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def _get_cache(self) -> Optional[ExplanationCache]:
+        if self._cache is False:
+            return None
+        if self._cache is None:
+            self._cache = ExplanationCache()
+        return self._cache
+
+    def _cache_kind(self, kind: str) -> str:
+        return f"{kind}:{self.provider}:{self.model}"
+
+    def _cached(self, error: ParsedError, kind: str) -> Optional[str]:
+        key = (fingerprint(error), self._cache_kind(kind))
+        value = self._memo.get(key)
+        if value is not None:
+            return value
+        cache = self._get_cache()
+        if cache is None:
+            return None
+        value = cache.get(*key)
+        if value is not None:
+            self._memo[key] = value
+        return value
+
+    def _store(self, error: ParsedError, kind: str, value: str) -> None:
+        if not value:
+            return
+        key = (fingerprint(error), self._cache_kind(kind))
+        self._memo[key] = value
+        cache = self._get_cache()
+        if cache is not None:
+            cache.put(*key, value)
+
+    def _rule_answer(self, error: ParsedError) -> Optional[Answer]:
+        if self.rules is None:
+            return None
+        key = fingerprint(error)
+        if key not in self._rule_answers:
+            self._rule_answers[key] = self.rules.answer(error)
+        return self._rule_answers[key]
+
+    def _confident_rule(self, error: ParsedError) -> Optional[Answer]:
+        answer = self._rule_answer(error)
+        return answer if answer is not None and answer.confident else None
+
+    def _source_section(self, error: ParsedError) -> str:
+        """The code around the innermost user frames, within half the token budget."""
+        if not self.source_context:
+            return ""
+        if error.context is None:
+            attach_source_context(error)
+        for frames in range(PROMPT_CONTEXT_FRAMES, 0, -1):
+            listing = render_context(error, frames)
+            if estimate_tokens(listing) <= self.budget_tokens // 2:
+                break
+        else:
+            return ""
+        return f"\nSource around the failing lines (innermost first):\n```\n{listing}\n```\n" if listing else ""
+
+    def _build_prompt(self, error: ParsedError) -> str:
+        return EXPLAIN_PROMPT.format(
+            language=LANGUAGE_NAMES.get(error.language, error.language.capitalize()),
+            error_type=error.error_type,
+            message=error.message,
+            filename=error.filename or "unknown",
+            line_number=error.line_number or "unknown",
+            traceback=compact_traceback(error, self.budget_tokens),
+            source=self._source_section(error),
+        )
+
+    def _build_combined_prompt(self, error: ParsedError) -> str:
+        return COMBINED_PROMPT.format(
+            language=LANGUAGE_NAMES.get(error.language, error.language.capitalize()),
+            error_type=error.error_type,
+            message=error.message,
+            filename=error.filename or "unknown",
+            line_number=error.line_number or "unknown",
+            traceback=compact_traceback(error, self.budget_tokens),
+            source=self._source_section(error),
+        )
+
+    def _build_fix_prompt(self, error: ParsedError) -> str:
+        return FIX_PROMPT.format(
+            language=LANGUAGE_NAMES.get(error.language, error.language.capitalize()),
+            error_type=error.error_type,
+            message=error.message,
+            traceback=compact_traceback(error, self.budget_tokens * 3 // 4),
+            source=self._source_section(error),
+        )
+
+    def _fallback_explanation(self, error: ParsedError) -> str:
+        answer = self._rule_answer(error)
+        if answer is not None:
+            return answer.explanation
         for key, explanation in MOCK_EXPLANATIONS.items():
             if key in error.error_type:
                 return explanation
         return f"A {error.error_type} occurred: {error.message}. Check the traceback above for the exact location."
-    
-    def suggest_fix(self, error: ParsedError) -> str:
-        """Returns a fix suggestion."""
+
+    def _fallback_fix(self, error: ParsedError) -> str:
+        answer = self._rule_answer(error)
+        if answer is not None:
+            return answer.fix
+        return f"# Fix for {error.error_type}\n# Check: {error.message}"
+
+    def _stream(self, error: ParsedError, kind: str, prompt: str, max_tokens: int, fallback) -> Iterator[str]:
+        """Yield completion tokens, from a rule, the cache, the API, or the fallback text."""
+        if self._confident_rule(error) is not None:
+            yield from _TOKEN_RE.findall(fallback(error))
+            return
         client = self._get_client()
         if client:
+            cached = self._cached(error, kind)
+            if cached is not None:
+                yield cached
+                return
+            parts: List[str] = []
             try:
-                response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": FIX_PROMPT.format(
-                        error_type=error.error_type,
-                        message=error.message,
-                        traceback=error.traceback[:1500]
-                    )}],
-                    max_tokens=200
-                )
-                return response.choices[0].message.content
-            except Exception:
-                pass
-        return f"# Fix for {error.error_type}\n# Check: {error.message}"
\ No newline at end of file
+                for delta in self._request_stream(client, prompt, max_tokens):
+                    parts.append(delta)
+                    yield delta
+            except Exception as exc:  # a malformed provider event too (KeyError, ...)
+                self.last_error = exc
+                if parts:
+                    # Part of the answer is already on screen; stop there.
+                    return
+            else:
+                if parts:
+                    self._store(error, kind, "".join(parts))
+                    return
+
+        # Fallback: built-in text, streamed the same way
+        yield from _TOKEN_RE.findall(fallback(error))
+
+    def _request_stream(self, client: LLMClient, prompt: str, max_tokens: int) -> Iterator[str]:
+        if not profiler.enabled:
+            return client.stream(prompt, max_tokens)
+        return self._timed_stream(client, prompt, max_tokens)
+
+    def _timed_stream(self, client: LLMClient, prompt: str, max_tokens: int) -> Iterator[str]:
+        """`client.stream`, recorded as an "llm" span with time to first token and token count."""
+        tokens = 0
+        with profiler.span("llm", provider=self.provider, model=self.model,
+                           prompt_tokens=estimate_tokens(prompt)) as span:
+            try:
+                for delta in client.stream(prompt, max_tokens):
+                    if not tokens:
+                        span.args["ttft_ms"] = round((time.perf_counter() - span.start) * 1000, 1)
+                    tokens += 1
+                    yield delta
+            finally:
+                span.args["tokens"] = tokens
+                route = getattr(client, "last_route", None)
+                if route:
+                    span.args.update(route=route["provider"], hedged=route["hedged"])
+
+    def explain_and_fix_stream(self, error: ParsedError, want: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """Stream ("explain" | "fix", token) pairs from a single combined request.
+
+        Both sections are stored in memory and in the cache once the answer is
+        complete.  With `want` set, an already cached section is returned
+        without any request.
+        """
+        client = None if self._confident_rule(error) is not None else self._get_client()
+        if client:
+            cached = {kind: self._cached(error, kind) for kind in ("explain", "fix")}
+            if want and cached[want] is not None:
+                yield want, cached[want]
+                return
+            if cached["explain"] is not None and cached["fix"] is not None:
+                yield "explain", cached["explain"]
+                yield "fix", cached["fix"]
+                return
+            splitter = _SectionSplitter()
+            started = False
+            try:
+                for delta in self._request_stream(client, self._build_combined_prompt(error), 500):
+                    for pair in splitter.feed(delta):
+                        started = True
+                        yield pair
+            except Exception as exc:  # a malformed provider event too (KeyError, ...)
+                self.last_error = exc
+                if started:
+                    return
+            else:
+                for pair in splitter.close():
+                    started = True
+                    yield pair
+                if started:
+                    explanation, fix = splitter.sections()
+                    self._store(error, "explain", explanation)
+                    self._store(error, "fix", fix)
+                    return
+
+        # Fallback: built-in texts, streamed the same way
+        for token in _TOKEN_RE.findall(self._fallback_explanation(error)):
+            yield "explain", token
+        for token in _TOKEN_RE.findall(self._fallback_fix(error)):
+            yield "fix", token
+
+    def explain_and_fix(self, error: ParsedError) -> Tuple[str, str]:
+        """Explanation and fix from one request (or the cache)."""
+        parts: Dict[str, List[str]] = {"explain": [], "fix": []}
+        for kind, token in self.explain_and_fix_stream(error):
+            parts[kind].append(token)
+        return "".join(parts["explain"]), "".join(parts["fix"])
+
+    def _section(self, error: ParsedError, kind: str) -> Iterator[str]:
+        for section, token in self.explain_and_fix_stream(error, want=kind):
+            if section == kind:
+                yield token
+
+    def explain_stream(self, error: ParsedError) -> "TokenStream":
+        """Stream the explanation token by token."""
+        if self.combined:
+            return TokenStream(self._section(error, "explain"))
+        return TokenStream(self._stream(error, "explain", self._build_prompt(error), 300, self._fallback_explanation))
+
+    def suggest_fix_stream(self, error: ParsedError) -> "TokenStream":
+        """Stream the fix suggestion token by token."""
+        if self.combined:
+            return TokenStream(self._section(error, "fix"))
+        return TokenStream(self._stream(error, "fix", self._build_fix_prompt(error), 200, self._fallback_fix))
+
+    def explain(self, error: ParsedError) -> str:
+        """Returns plain-English explanation. Falls back to built-in explanations."""
+        return self.explain_stream(error).read()
+
+    def suggest_fix(self, error: ParsedError) -> str:
+        """Returns a fix suggestion."""
+        return self.suggest_fix_stream(error).read()
+
+    def explain_many(self, errors, kind: str = "explain", **options) -> List[str]:
+        """Answers for many errors, one concurrent request per fingerprint (see `stackback.batch`)."""
+        from .batch import explain_many
+        return explain_many(errors, self, kind, **options)
+
+
+class _SectionSplitter:
+    """Routes the streamed text of a combined answer into its two sections.
+
+    The "FIX:" header must start a line; a line tail that could still grow
+    into it is held back until the next token decides.
+    """
+
+    _START_RE = re.compile(r'^\s*EXPLANATION:[ \t]*\n?')
+    _FIX_RE = re.compile(r'^[ \t]*FIX:[ \t]*\n?', re.MULTILINE)
+
+    def __init__(self):
+        self.text = ""
+        self._sent = {"explain": 0, "fix": 0}
+
+    def feed(self, token: str) -> List[Tuple[str, str]]:
+        self.text += token
+        return self._drain(final=False)
+
+    def close(self) -> List[Tuple[str, str]]:
+        return self._drain(final=True)
+
+    def _bounds(self, final: bool):
+        text = self.text
+        start = self._START_RE.match(text)
+        if start:
+            begin = start.end()
+        elif not final and "EXPLANATION:".startswith(text.lstrip()):
+            return None
+        else:
+            begin = 0
+        fix = self._FIX_RE.search(text, begin)
+        return begin, fix
+
+    def _drain(self, final: bool) -> List[Tuple[str, str]]:
+        bounds = self._bounds(final)
+        if bounds is None:
+            return []
+        begin, fix = bounds
+        text = self.text
+        if fix is not None:
+            limit = fix.start()
+        else:
+            limit = len(text)
+            tail = text[text.rfind("\n") + 1:]
+            if not final and tail.strip() and "FIX:".startswith(tail.strip()):
+                limit -= len(tail)
+        out = []
+        begin = max(begin, self._sent["explain"])
+        if limit > begin:
+            out.append(("explain", text[begin:limit]))
+            self._sent["explain"] = limit
+        if fix is not None:
+            begin = max(fix.end(), self._sent["fix"])
+            if len(text) > begin:
+                out.append(("fix", text[begin:]))
+                self._sent["fix"] = len(text)
+        return out
+
+    def sections(self) -> Tuple[str, str]:
+        bounds = self._bounds(final=True)
+        begin, fix = bounds
+        if fix is None:
+            return self.text[begin:].strip(), ""
+        return self.text[begin:fix.start()].strip(), self.text[fix.end():].strip()
+
+
+class TokenStream:
+    """Iterator over completion tokens that records time-to-first-token.
+
+    `ttft` is the number of seconds between creating the stream and the
+    first token arriving, or None until then.
+    """
+
+    def __init__(self, tokens: Iterator[str]):
+        self._tokens = tokens
+        self._parts: List[str] = []
+        self.started = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.elapsed: Optional[float] = None
+
+    def __iter__(self) -> "TokenStream":
+        return self
+
+    def __next__(self) -> str:
+        try:
+            token = next(self._tokens)
+        except StopIteration:
+            if self.elapsed is None:
+                self.elapsed = time.perf_counter() - self.started
+            raise
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+        self._parts.append(token)
+        return token
+
+    @property
+    def text(self) -> str:
+        """Everything received so far."""
+        return "".join(self._parts)
+
+    def close(self) -> None:
+        """Stop the underlying request early."""
+        close = getattr(self._tokens, "close", None)
+        if close is not None:
+            close()
+
+    def read(self) -> str:
+        """Drain the stream and return the full text."""
+        for _ in self:
+            pass
+        return self.text
+
+
+def make_explainer(
+    provider: str = "openai",
+    api_key: Optional[str] = None,
+    no_cache: bool = False,
+    combined: bool = True,
+    prompt_tokens: int = DEFAULT_BUDGET_TOKENS,
+    no_rules: bool = False,
+) -> LLMExplainer:
+    """Explainer for the CLI options; built-in answers when no key is configured.
+
+    Several providers separated by commas are routed between (see `stackback.router`).
+    """
+    if "," in provider:
+        from .router import make_router
+
+        router = make_router([name.strip() for name in provider.split(",") if name.strip()], api_key)
+        if router is None:
+            return LLMExplainer(api_key="", provider="mock", rules=False if no_rules else None)
+        return LLMExplainer(
+            provider=provider, model=router.model, client=router, cache=False if no_cache else None,
+            combined=combined, budget_tokens=prompt_tokens, rules=False if no_rules else None,
+        )
+    adapter = PROVIDERS.get(provider)
+    key = api_key or (adapter.api_key() if adapter else None)
+    if provider != "mock" and (adapter is None or (adapter.needs_key and not key)):
+        return LLMExplainer(api_key="", provider="mock", rules=False if no_rules else None)
+    return LLMExplainer(
+        api_key=key, provider=provider, cache=False if no_cache else None,
+        combined=combined, budget_tokens=prompt_tokens, rules=False if no_rules else None,
+    )
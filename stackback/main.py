@@ -4,127 +4,278 @@ Usage:
     sb python app.py
     sb pytest tests/
     stackback python app.py --provider claude
+
+`sb` wraps every command, so this entry point is kept import-light: the
+common case (the command succeeds) only needs the streaming runner.  typer,
+rich and the LLM stack live in `stackback.cli` and are imported once an
+error is detected, or when the arguments need the full parser.
 """
-import subprocess
-import sys
 import os
-from typing import Optional
+import sys
+from typing import Dict, List, Optional, Tuple
 
-import typer
-from rich.console import Console
+VERSION = "0.0.4"
 
-from .parser import parse_error, is_error_output
-from .llm import LLMExplainer
-from .tui import show_menu
+PREFETCH_KINDS = {"none": (), "explain": ("explain",), "all": ("explain", "fix")}
 
-app = typer.Typer(
-    help="AI-powered terminal error fixer. Run any command and fix errors with AI.",
-    add_completion=False,
-)
-console = Console()
-err_console = Console(stderr=True)
+DEFAULT_OPTIONS = {
+    "provider": "openai",
+    "api_key": None,
+    "no_ai": False,
+    "no_cache": False,
+    "no_rules": False,
+    "prefetch": "explain",
+    "combined": True,
+    "prompt_tokens": 500,
+    "verbose": False,
+    "profile": False,
+    "profile_out": None,
+}
+
+# `sb <name> ...` runs these typer apps from stackback.cli instead of a
+# command (use `sb -- <name>` to run a program with the same name)
+SUBCOMMANDS = {
+    "daemon": "daemon_app", "triage": "triage_app", "kb": "kb_app", "metrics": "metrics_app",
+    "watch": "watch_app", "history": "history_app", "stats": "stats_app",
+}
+
+# flag -> (option name, value for flags / None when the flag takes a value)
+_FAST_OPTIONS = {
+    "--provider": ("provider", None),
+    "-p": ("provider", None),
+    "--api-key": ("api_key", None),
+    "-k": ("api_key", None),
+    "--prefetch": ("prefetch", None),
+    "--prompt-tokens": ("prompt_tokens", None),
+    "--no-ai": ("no_ai", True),
+    "--no-cache": ("no_cache", True),
+    "--no-rules": ("no_rules", True),
+    "--combined": ("combined", True),
+    "--separate": ("combined", False),
+    "--verbose": ("verbose", True),
+    "-v": ("verbose", True),
+    "--profile": ("profile", True),
+    "--profile-out": ("profile_out", None),
+}
+
+_STYLES = {"bold": "1", "dim": "2", "red": "31", "green": "32"}
+
+
+def _style(text: str, style: str, stream=None) -> str:
+    stream = stream or sys.stdout
+    if os.environ.get("NO_COLOR") or not stream.isatty():
+        return text
+    return f"\033[{_STYLES[style]}m{text}\033[0m"
 
-VERSION = "0.0.4"
 
+def parse_fast_args(argv: List[str]) -> Optional[Tuple[List[str], Dict]]:
+    """Split `argv` into (command, options) the way the full CLI does.
 
-@app.command(
-    context_settings={"allow_extra_args": True, "ignore_unknown_options": True},
-)
-def run(
-    command: list[str] = typer.Argument(..., help="Command to run (e.g. python app.py)"),
-    provider: str = typer.Option(
-        "openai", "--provider", "-p",
-        help="LLM provider: openai, claude, gemini, mock",
-    ),
-    api_key: Optional[str] = typer.Option(
-        None, "--api-key", "-k",
-        help="API key (or set OPENAI_API_KEY env var)",
-        envvar="OPENAI_API_KEY",
-    ),
-    no_ai: bool = typer.Option(
-        False, "--no-ai",
-        help="Skip AI and just parse the error",
-    ),
-    verbose: bool = typer.Option(
-        False, "--verbose", "-v",
-        help="Show full output even without errors",
-    ),
+    Known options are taken from anywhere before `--`; everything else is
+    the command.  Returns None when the full CLI is needed instead (help,
+    a missing or invalid value, no command at all).
+    """
+    command: List[str] = []
+    options = dict(DEFAULT_OPTIONS)
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        i += 1
+        if arg == "--":
+            command.extend(argv[i:])
+            break
+        if arg == "--help":
+            return None
+        name, _, inline = arg.partition("=") if arg.startswith("--") else (arg, "", "")
+        spec = _FAST_OPTIONS.get(name)
+        if spec is None:
+            command.append(arg)
+            continue
+        key, flag_value = spec
+        if flag_value is not None:
+            if inline:
+                return None
+            options[key] = flag_value
+        elif inline:
+            options[key] = inline
+        elif i < len(argv):
+            options[key] = argv[i]
+            i += 1
+        else:
+            return None
+        if type(DEFAULT_OPTIONS[key]) is int and flag_value is None:
+            if not options[key].isdigit():
+                return None
+            options[key] = int(options[key])
+    if not command or options["prefetch"] not in PREFETCH_KINDS:
+        return None
+    return command, options
+
+
+def _reports_on_stdout(command: List[str]) -> bool:
+    """True for commands that print their failures on stdout (pytest)."""
+    names = [os.path.basename(arg) for arg in command[:3]]
+    return any(name in ("pytest", "py.test") for name in names) or ("-m" in names[:2] and "pytest" in names)
+
+
+def execute(
+    command: List[str], profile: bool = False, profile_out: Optional[str] = None, verbose: bool = False, **options
 ) -> None:
-    """Run a command and fix errors with AI assistance.
+    """Run `command`; on failure hand over to the full diagnosis path.
 
-    Example:
-        sb python app.py
-        sb pytest tests/ --provider mock
+    With `profile`, `verbose` or the metrics log enabled, the stages of the
+    run are timed (see `stackback.profile`) and reported when it ends;
+    `verbose` only prints the breakdown, without writing a trace.
     """
-    if not command:
-        err_console.print("[red]Error:[/red] No command provided")
-        raise typer.Exit(code=1)
+    from .profile import metrics_path, profiler
+
+    metrics = metrics_path()
+    profiler.enabled = profile or verbose or metrics is not None
+    try:
+        _execute(command, **options)
+    finally:
+        if profiler.enabled:
+            _finish_profile(command, profile, profile_out, metrics, verbose)
+
+
+def _finish_profile(
+    command: List[str], profile: bool, profile_out: Optional[str], metrics: Optional[str], verbose: bool = False
+) -> None:
+    from .profile import append_metrics, default_trace_path, profiler
+
+    try:
+        if metrics is not None:
+            fields = {"command": os.path.basename(command[0])}
+            rules = sys.modules.get("stackback.rules")  # only loaded if an error was explained
+            if rules is not None and rules.engine.lookups:
+                fields["rules"] = rules.engine.stats()
+            append_metrics(profiler.metrics_record(**fields), metrics)
+        if profile:
+            path = profiler.write_trace(profile_out or default_trace_path())
+            print("\n" + profiler.breakdown(), file=sys.stderr)
+            print(f"  trace: {path} (open in https://ui.perfetto.dev or chrome://tracing)", file=sys.stderr)
+        elif verbose:
+            print("\n" + profiler.breakdown(), file=sys.stderr)
+    except OSError as exc:
+        print(_style("Error:", "red", sys.stderr) + f" could not write the profile: {exc}", file=sys.stderr)
+
+
+def _execute(command: List[str], **options) -> None:
+    from .runner import stream_command
 
-    console.print(f"[dim]stackback v{VERSION} | Running:[/dim] [bold]{' '.join(command)}[/bold]\n")
+    print(_style(f"stackback v{VERSION} | Running:", "dim") + " " + _style(" ".join(command), "bold") + "\n", flush=True)
 
-    # Run the command and capture output
+    # Run the command, streaming its output live
     try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-        )
+        result = stream_command(command, capture_stdout=_reports_on_stdout(command))
     except FileNotFoundError:
-        err_console.print(f"[red]Error:[/red] Command not found: {command[0]}")
-        raise typer.Exit(code=127)
-
-    # Combine stdout and stderr for error detection
-    combined_output = result.stderr
-    if result.returncode == 0 and not combined_output:
-        console.print(result.stdout)
-        console.print("[green]Command completed successfully.[/green]")
-        return
+        print(_style("Error:", "red", sys.stderr) + f" Command not found: {command[0]}", file=sys.stderr)
+        sys.exit(127)
 
-    # Show stdout always
-    if result.stdout:
-        console.print(result.stdout, end="")
+    if result.returncode == 0 and not result.stderr_bytes:
+        print(_style("Command completed successfully.", "green"))
+        return
 
     # Check for errors
-    if not is_error_output(combined_output) and result.returncode == 0:
-        if verbose:
-            console.print(result.stderr)
-        console.print("[green]No errors detected.[/green]")
+    if not result.error_detected and result.returncode == 0:
+        print(_style("No errors detected.", "green"))
         return
 
-    # Parse the error
-    error = parse_error(combined_output)
+    report_error(result, command=command, **options)
+
+
+def report_error(
+    result, no_ai: bool = False, command: Optional[List[str]] = None, **options
+) -> None:
+    """Diagnose a failed run, show the menu and exit like the child did.
+
+    A running `sb daemon` parses and explains the error when it answers;
+    otherwise everything happens in this process.
+    """
+    from .profile import profiler
+
+    with profiler.span("import"):
+        from .daemon import EXPLAINER_OPTIONS, RemoteExplainer, connect
+        from .languages import registry
+        from .runner import exit_like
+        from .tui import run_interactive, show_error_header
+
+    with profiler.span("connect") as span:
+        remote = connect()
+    if span is not None:
+        span.args["daemon"] = remote is not None
+    # The scanner already parsed stderr as it streamed, but it only knows
+    # Python; re-parse the tails if another language's error may be there
+    error = result.error
+    text = result.output_text
+    if error is None or registry.classify(text):
+        with profiler.span("parse", bytes=len(text), remote=remote is not None):
+            if remote is not None:
+                error = remote.parse(text) or error
+            else:
+                from .parser import parse_error
+                error = parse_error(text) or error
 
     if not error:
-        # No parseable error, just show the output and exit
-        if combined_output:
-            console.print(combined_output, end="")
-        sys.exit(result.returncode)
+        # No parseable error; the output has already been shown
+        exit_like(result.returncode)
         return
 
-    # Setup LLM explainer
-    explainer: Optional[LLMExplainer] = None
+    profiler.fields.update(error_type=error.error_type, language=error.language)
+    if command:
+        with profiler.span("history"):
+            from .history import record
+            record(error, command, result.returncode)
+    explainer = None
     if not no_ai:
-        key = api_key or os.environ.get("OPENAI_API_KEY", "")
-        if key or provider == "mock":
-            explainer = LLMExplainer(api_key=key or "", provider=provider)
-        else:
-            # Use mock mode for demo
-            explainer = LLMExplainer(api_key="", provider="mock")
+        with profiler.span("client", provider=options.get("provider"), remote=remote is not None):
+            if remote is not None and not options.get("api_key"):
+                # The daemon uses its own keys; one given on the command line stays here
+                explainer = RemoteExplainer(remote, options)
+            else:
+                from .llm import make_explainer
+                explainer = make_explainer(**{k: options[k] for k in EXPLAINER_OPTIONS if k in options})
+                if options.get("prefetch") == "none":
+                    # Nothing is requested while the menu is up: load a local model meanwhile
+                    explainer.warm()
 
     # Show interactive menu
     try:
-        action = show_menu(error, explainer, interactive=sys.stdin.isatty())
+        if sys.stdin.isatty():
+            run_interactive(
+                error, explainer, prefetch=PREFETCH_KINDS[options.get("prefetch", "explain")], command=command,
+            )
+        else:
+            show_error_header(error)
     except Exception:
-        action = "skip"
+        pass
 
-    # Exit with the original return code
-    if result.returncode != 0:
-        raise typer.Exit(code=result.returncode)
+    # Exit with the original return code (or signal)
+    exit_like(result.returncode)
 
 
-def main() -> None:
+def main(argv: Optional[List[str]] = None) -> None:
     """Entry point for 'sb' and 'stackback' commands."""
-    app()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in SUBCOMMANDS:
+        from . import cli
+        getattr(cli, SUBCOMMANDS[argv[0]])(args=argv[1:], prog_name=f"sb {argv[0]}")
+        return
+    parsed = parse_fast_args(argv)
+    if parsed is None:
+        from .cli import app
+        app(args=argv)
+        return
+    command, options = parsed
+    execute(command, **options)
+
+
+def __getattr__(name: str):
+    # `app` and `run` moved to stackback.cli; import them on first access.
+    if name in ("app", "run"):
+        from . import cli
+        return getattr(cli, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
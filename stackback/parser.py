@@ -1,73 +1,604 @@
+import mmap
 import re
 import subprocess
 import sys
-from dataclasses import dataclass
-from typing import Optional, List
+from typing import Dict, Iterator, List, Optional, Tuple
+
+class Frame:
+    """One `File "...", line N, in func` entry of a traceback."""
+
+    __slots__ = ("file", "line", "function", "source")
+
+    def __init__(self, file: str, line: int, function: Optional[str] = None, source: Optional[str] = None):
+        self.file = file
+        self.line = line
+        self.function = function
+        self.source = source
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Frame):
+            return NotImplemented
+        return (self.file, self.line, self.function, self.source) == (
+            other.file, other.line, other.function, other.source)
+
+    def __hash__(self) -> int:
+        return hash((self.file, self.line, self.function))
+
+    def __repr__(self) -> str:
+        return f"Frame({self.file!r}, {self.line}, {self.function!r}, {self.source!r})"
+
+    @property
+    def is_library(self) -> bool:
+        """True for standard library and third-party frames, in any supported language."""
+        return any(marker in self.file for marker in LIBRARY_MARKERS)
+
+    def render(self) -> str:
+        text = f'  File "{self.file}", line {self.line}'
+        if self.function:
+            text += f", in {self.function}"
+        if self.source:
+            text += f"\n    {self.source}"
+        return text
+
 
-@dataclass
 class ParsedError:
-    error_type: str
-    message: str
-    filename: Optional[str]
-    line_number: Optional[int]
-    traceback: str
-    language: str = "python"
+    """A parsed error.
 
-def parse_python_traceback(output: str) -> Optional[ParsedError]:
-    """Parse Python traceback from stderr output."""
-    if 'Traceback (most recent call last):' not in output and not _has_error_line(output):
+    `frames` is a compact tuple of `Frame` objects, outermost first.  The raw
+    `traceback` text is optional: when it was not kept, it is rebuilt from
+    the frames on access.  `context` maps frame indexes to (first line
+    number, source lines) once `stackback.source.attach_source_context` has
+    read them; it is None until then.
+    """
+
+    __slots__ = (
+        "error_type", "message", "filename", "line_number", "_traceback", "language",
+        "frames", "start", "end", "cause", "cause_kind", "exceptions", "context",
+    )
+
+    def __init__(
+        self,
+        error_type: str,
+        message: str,
+        filename: Optional[str] = None,
+        line_number: Optional[int] = None,
+        traceback: Optional[str] = None,
+        language: str = "python",
+        frames: Tuple[Frame, ...] = (),
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        cause: Optional["ParsedError"] = None,
+        cause_kind: Optional[str] = None,
+        exceptions: Optional[List["ParsedError"]] = None,
+    ):
+        self.error_type = error_type
+        self.message = message
+        self.filename = filename
+        self.line_number = line_number
+        self._traceback = traceback
+        self.language = language
+        self.frames = frames
+        self.start = start
+        self.end = end
+        self.cause = cause
+        self.cause_kind = cause_kind
+        self.exceptions = exceptions if exceptions is not None else []
+        self.context: Optional[Dict[int, Tuple[int, Tuple[str, ...]]]] = None
+
+    @property
+    def traceback(self) -> str:
+        if self._traceback is None:
+            return self.render()
+        return self._traceback
+
+    @traceback.setter
+    def traceback(self, value: Optional[str]) -> None:
+        self._traceback = value
+
+    @property
+    def has_raw(self) -> bool:
+        """True if the original traceback text was kept."""
+        return self._traceback is not None
+
+    def render(self) -> str:
+        """Rebuild a standard traceback from the frames."""
+        lines = []
+        if self.frames:
+            lines.append("Traceback (most recent call last):")
+            lines.extend(frame.render() for frame in self.frames)
+        lines.append(f"{self.error_type}: {self.message}" if self.message else self.error_type)
+        return "\n".join(lines)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ParsedError):
+            return NotImplemented
+        return (
+            self.error_type, self.message, self.filename, self.line_number, self.language, self.frames,
+        ) == (
+            other.error_type, other.message, other.filename, other.line_number, other.language, other.frames,
+        )
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (
+            f"ParsedError(error_type={self.error_type!r}, message={self.message!r}, "
+            f"filename={self.filename!r}, line_number={self.line_number!r}, "
+            f"language={self.language!r}, frames={len(self.frames)})"
+        )
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form (see `from_dict`)."""
+        data = {
+            "error_type": self.error_type,
+            "message": self.message,
+            "filename": self.filename,
+            "line_number": self.line_number,
+            "language": self.language,
+            "frames": [[f.file, f.line, f.function, f.source] for f in self.frames],
+        }
+        if self._traceback is not None:
+            data["traceback"] = self._traceback
+        if self.start is not None:
+            data["start"], data["end"] = self.start, self.end
+        if self.cause is not None:
+            data["cause"], data["cause_kind"] = self.cause.to_dict(), self.cause_kind
+        if self.exceptions:
+            data["exceptions"] = [e.to_dict() for e in self.exceptions]
+        if self.context is not None:
+            data["context"] = [[index, first, list(lines)] for index, (first, lines) in self.context.items()]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ParsedError":
+        cause = data.get("cause")
+        error = cls(
+            data["error_type"],
+            data.get("message", ""),
+            data.get("filename"),
+            data.get("line_number"),
+            data.get("traceback"),
+            data.get("language", "python"),
+            tuple(Frame(*f) for f in data.get("frames", ())),
+            data.get("start"),
+            data.get("end"),
+            cls.from_dict(cause) if cause else None,
+            data.get("cause_kind"),
+            [cls.from_dict(e) for e in data.get("exceptions", ())],
+        )
+        if "context" in data:
+            error.context = {index: (first, tuple(lines)) for index, first, lines in data["context"]}
+        return error
+
+    @property
+    def file(self) -> Optional[str]:
+        """Legacy alias for `filename`."""
+        return self.filename
+
+    @property
+    def line(self) -> Optional[int]:
+        """Legacy alias for `line_number`."""
+        return self.line_number
+
+    @property
+    def raw(self) -> str:
+        """Legacy alias for `traceback`."""
+        return self.traceback
+
+# Precompiled, bytes-level patterns used by the scanner.  Everything is
+# anchored at the start of a line so each line is tested at most once.
+_HEADER = b"Traceback (most recent call last):"
+_GROUP_HEADER = b"Exception Group Traceback (most recent call last):"
+_CAUSE_MARKER = b"The above exception was the direct cause of the following exception:"
+_CONTEXT_MARKER = b"During handling of the above exception, another exception occurred:"
+_FILE_LINE_RE = re.compile(rb'^[ \t]+File "([^"]+)", line (\d+)(?:, in (.+))?')
+_MARKER_LINE_RE = re.compile(rb'^[ \t]*[~^]+[ \t]*$')
+_EXC_LINE_RE = re.compile(rb'^([A-Za-z_][\w.]*)(?::[ \t]*(.*))?$')
+_BARE_ERROR_RE = re.compile(rb'^(\w+(?:\.\w+)*(?:Error|Exception|Warning)|\w*ExceptionGroup|KeyboardInterrupt):[ \t]*(.*)$')
+_GROUP_START_RE = re.compile(rb'^[ \t]*\+ Exception Group Traceback \(most recent call last\):')
+_GROUP_LINE_RE = re.compile(rb'[ \t]*[|+]')
+_CANDIDATE_RE = re.compile(
+    rb'^(?:Traceback \(most recent call last\):|[ \t]+File "|\w+(?:\.\w+)*(?:Error|Exception|Warning):|\w*ExceptionGroup:'
+    rb'|KeyboardInterrupt:|(?:[ \t]*\+ )?Exception Group Traceback|The above exception|During handling)',
+    re.MULTILINE,
+)
+_MARKERS = (
+    b"Traceback (", b'File "', b"Error:", b"Exception", b"Warning:", b"KeyboardInterrupt:",
+    b"above exception",
+)
+_ERROR_LINE_RE = re.compile(r'^\w+(?:Error|Exception|Warning):', re.MULTILINE)
+
+MAX_LINE_BYTES = 64 * 1024
+PARSE_CHUNK_SIZE = 1024 * 1024
+LIBRARY_MARKERS = (
+    'lib/python', 'site-packages',
+    'node_modules/', 'node:', '/go/pkg/mod/', '/usr/local/go/src/', '/rustc/', '.cargo/registry/', 'java.base/',
+)
+
+_IDLE, _HEADED, _HEADLESS, _GROUP = 0, 1, 2, 3
+
+
+class TracebackScanner:
+    """Incremental, chunk-fed Python traceback detector.
+
+    Feed it bytes or str chunks of any size; each `ParsedError` is returned
+    from `feed()` as soon as its final exception line arrives (an exception
+    group as soon as its last margin line has passed).  Outside a traceback,
+    lines are skipped by searching for a handful of marker literals, and only
+    the current partial line plus the traceback being built are kept in
+    memory.
+
+    Chained exceptions are linked through `ParsedError.cause`, and every error
+    carries the absolute byte offsets of its printed chain in `start`/`end`.
+    """
+
+    def __init__(self, keep_raw: bool = True):
+        self.keep_raw = keep_raw
+        self.errors_seen = 0
+        self._pending = b""
+        self._base = 0          # absolute offset of self._pending[0]
+        self._dropped = 0       # bytes cut from an overlong pending line
+        self._overlong = False
+        self._last: Optional[ParsedError] = None   # just emitted, only blanks since
+        self._link: Optional[tuple] = None         # (cause, kind) after a chain marker
+        self._reset()
+
+    def _reset(self) -> None:
+        self._state = _IDLE
+        self._block: List[bytes] = []
+        self._frames: List[tuple] = []
+        self._start = 0
+
+    @property
+    def in_traceback(self) -> bool:
+        """True while a traceback has started but not finished."""
+        return self._state != _IDLE
+
+    def feed(self, chunk) -> List[ParsedError]:
+        """Consume a chunk and return the errors it completed."""
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8", "surrogateescape")
+        if self._overlong:
+            nl = chunk.find(b"\n")
+            if nl < 0:
+                self._dropped += len(chunk)
+                return []
+            self._dropped += nl
+            chunk = chunk[nl:]
+            self._overlong = False
+        data = self._pending + chunk if self._pending else chunk
+        end = data.rfind(b"\n")
+        if end < 0:
+            if len(data) > MAX_LINE_BYTES:
+                self._dropped += len(data) - MAX_LINE_BYTES
+                data = data[:MAX_LINE_BYTES]
+                self._overlong = True
+            self._pending = data
+            return []
+        self._pending = data[end + 1:]
+        found = self._scan(data, end + 1)
+        self._base += end + 1 + self._dropped
+        self._dropped = 0
+        return found
+
+    def close(self) -> List[ParsedError]:
+        """Flush the final unterminated line and any unfinished traceback."""
+        found = []
+        if self._pending:
+            data = self._pending + b"\n"
+            self._pending = b""
+            found = self._scan(data, len(data))
+            self._base += len(data) - 1 + self._dropped
+            for error in found:
+                error.end = min(error.end, self._base)
+        if self._state == _GROUP:
+            found.append(self._emit_group(self._base))
+        elif self._state == _HEADED and len(self._block) > 1:
+            found.append(self._emit("UnknownError", _decode(self._block[-1]).strip(), self._base))
+        self._reset()
+        self._overlong = False
+        self._dropped = 0
+        self._last = self._link = None
+        return found
+
+    def _scan(self, data: bytes, stop: int) -> List[ParsedError]:
+        found = []
+        pos = 0
+        # Next occurrence of each marker literal; bytes.find is far cheaper
+        # than a line-anchored regex over text that is mostly not tracebacks.
+        nexts = [stop] * len(_MARKERS)
+        searched = -1
+        while pos < stop:
+            if self._state == _IDLE:
+                if searched < pos:
+                    for i, marker in enumerate(_MARKERS):
+                        if nexts[i] < pos or searched < 0:
+                            at = data.find(marker, pos, stop)
+                            nexts[i] = stop if at < 0 else at
+                    searched = pos
+                hit = min(nexts)
+                start = data.rfind(b"\n", pos, hit) + 1 if hit < stop else stop
+                if start < pos:
+                    start = pos
+                if (self._last or self._link) and data[pos:start].strip():
+                    self._last = self._link = None
+                if hit >= stop:
+                    break
+                if not _CANDIDATE_RE.match(data, start):
+                    self._last = self._link = None
+                    pos = data.index(b"\n", hit, stop) + 1
+                    continue
+                pos = start
+            nl = data.index(b"\n", pos, stop)
+            offset = self._base + pos + (self._dropped if pos else 0)
+            if self._state == _GROUP and not _GROUP_LINE_RE.match(data, pos, nl):
+                # First line past the margin: the group is complete.
+                found.append(self._emit_group(offset))
+            error = self._line(data[pos:nl], offset, self._base + nl + 1 + self._dropped)
+            pos = nl + 1
+            if error is not None:
+                found.append(error)
+        return found
+
+    def _line(self, line: bytes, start: int, end: int) -> Optional[ParsedError]:
+        if line.endswith(b"\r"):
+            line = line[:-1]
+        state = self._state
+        if state == _GROUP:
+            self._block.append(line)
+            return None
+        if line.startswith(_HEADER) or line.startswith(_GROUP_HEADER):
+            self._begin(_HEADED, line, start)
+            return None
+        if state == _IDLE:
+            return self._idle_line(line, start, end)
+        if not line or line[:1] in (b" ", b"\t"):
+            self._block.append(line)
+            frame = _FILE_LINE_RE.match(line)
+            if frame:
+                self._frames.append(list(frame.groups()) + [None])
+            elif self._frames and self._frames[-1][3] is None and _is_source_line(line):
+                self._frames[-1][3] = line.strip()
+            return None
+        match = (_EXC_LINE_RE if state == _HEADED else _BARE_ERROR_RE).match(line.rstrip())
+        if match is None:
+            # Not part of a traceback after all: drop it and rescan the line.
+            self._reset()
+            return self._line(line, start, end)
+        self._block.append(line)
+        return self._emit(_decode(match.group(1)), _decode(match.group(2) or b"").strip(), end)
+
+    def _idle_line(self, line: bytes, start: int, end: int) -> Optional[ParsedError]:
+        stripped = line.strip()
+        if not stripped:
+            return None
+        if stripped in (_CAUSE_MARKER, _CONTEXT_MARKER):
+            if self._last is not None:
+                kind = "cause" if stripped == _CAUSE_MARKER else "context"
+                self._link = (self._last, kind)
+            self._last = None
+            return None
+        if _GROUP_START_RE.match(line):
+            self._begin(_GROUP, line, start)
+            return None
+        frame = _FILE_LINE_RE.match(line)
+        if frame:
+            self._begin(_HEADLESS, line, start)
+            self._frames.append(list(frame.groups()) + [None])
+            return None
+        bare = _BARE_ERROR_RE.match(line.rstrip())
+        if bare:
+            self._start = start
+            self._block.append(line)
+            return self._emit(_decode(bare.group(1)), _decode(bare.group(2)).strip(), end)
+        self._last = self._link = None
         return None
-    
-    # Extract error type and message from last line
-    lines = output.strip().splitlines()
-    error_line = None
-    for line in reversed(lines):
-        match = re.match(r'^(\w+(?:\.\w+)*Error|\w+Exception|SyntaxError|KeyboardInterrupt):\s*(.*)', line.strip())
-        if match:
-            error_line = match
-            break
-    
-    if not error_line:
-        # Try simple error without "Error" suffix
-        for line in reversed(lines):
-            match = re.match(r'^(\w+):\s+(.+)', line.strip())
-            if match and len(match.group(1)) > 2:
-                error_line = match
-                break
-    
-    error_type = error_line.group(1) if error_line else "UnknownError"
-    message = error_line.group(2) if error_line else output.split('\n')[-1]
-    
-    # Extract filename and line number from traceback
-    filename = None
-    line_number = None
-    file_matches = re.findall(r'File "([^"]+)", line (\d+)', output)
-    if file_matches:
-        # Last occurrence = innermost frame = where error happened
-        last_file, last_line = file_matches[-1]
-        # Skip stdlib files
-        if not ('lib/python' in last_file or 'site-packages' in last_file):
-            filename = last_file
-            line_number = int(last_line)
-        elif file_matches:
-            filename = file_matches[-1][0]
-            line_number = int(file_matches[-1][1])
-    
-    return ParsedError(
-        error_type=error_type,
-        message=message,
-        filename=filename,
-        line_number=line_number,
-        traceback=output
+
+    def _begin(self, state: int, line: bytes, start: int) -> None:
+        link = self._link
+        self._reset()
+        self._link = link
+        self._last = None
+        self._state = state
+        self._start = start
+        self._block.append(line)
+
+    def _emit(self, error_type: str, message: str, end: int) -> ParsedError:
+        frames = _make_frames(self._frames)
+        filename, line_number = _pick_location(frames)
+        error = ParsedError(
+            error_type=_intern(error_type),
+            message=message,
+            filename=filename,
+            line_number=line_number,
+            traceback="\n".join(_decode(line) for line in self._block) if self.keep_raw else None,
+            frames=frames,
+        )
+        return self._finish(error, end)
+
+    def _emit_group(self, end: int) -> ParsedError:
+        error = _parse_group(self._block, self._block[0].index(b"+"), self.keep_raw)
+        if error is None:
+            error = ParsedError("ExceptionGroup", "")
+        if self.keep_raw:
+            error.traceback = "\n".join(_decode(line) for line in self._block)
+        return self._finish(error, end)
+
+    def _finish(self, error: ParsedError, end: int) -> ParsedError:
+        error.start = self._start
+        error.end = end
+        if self._link is not None:
+            error.cause, error.cause_kind = self._link
+            error.start = error.cause.start
+        self.errors_seen += 1
+        self._reset()
+        self._link = None
+        self._last = error
+        return error
+
+
+def _parse_group(lines: List[bytes], col: int, keep_raw: bool = True) -> Optional[ParsedError]:
+    """Rebuild one exception-group node whose margin sits at column `col`.
+
+    The node's own traceback is printed behind a `| ` margin at `col`;
+    its sub-exceptions follow a `+-+---- 1 ----` opener and are separated
+    by `+---- N ----` lines one level (two columns) deeper.
+    """
+    own: List[bytes] = []
+    subs: List[List[bytes]] = []
+    inner = col + 2
+    current: Optional[List[bytes]] = None
+    for line in lines:
+        if current is None:
+            if line[col:col + 3] == b"+-+":
+                current = []
+                subs.append(current)
+            else:
+                own.append(line[inner:])
+            continue
+        if line[inner:inner + 2] == b"+-" and line[inner:inner + 3] != b"+-+":
+            if line.rstrip().endswith(b"-") and line.strip(b" +-"):
+                current = []
+                subs.append(current)
+            else:
+                current = []      # closing rule; nothing follows at this level
+            continue
+        current.append(line)
+
+    scanner = TracebackScanner(keep_raw)
+    found = scanner.feed(b"\n".join(own))
+    found.extend(scanner.close())
+    if not found:
+        return None
+    error = found[-1]
+    for sub_lines in subs:
+        if sub_lines:
+            sub = _parse_group(sub_lines, inner, keep_raw)
+            if sub is not None:
+                error.exceptions.append(sub)
+    _clear_offsets(error)
+    return error
+
+
+def _clear_offsets(error: ParsedError) -> None:
+    while error is not None:
+        error.start = error.end = None
+        error = error.cause
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode("utf-8", errors="replace")
+
+
+def _is_source_line(line: bytes) -> bool:
+    """Indented code under a frame, not a caret marker or repeat notice."""
+    stripped = line.strip()
+    return bool(stripped) and not stripped.startswith(b"[Previous line") and not _MARKER_LINE_RE.match(line)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Share one copy of strings that repeat across many errors."""
+    return sys.intern(value) if value else value
+
+
+def _make_frames(raw: List[list]) -> Tuple[Frame, ...]:
+    return tuple(
+        Frame(
+            _intern(_decode(path)),
+            int(line),
+            _intern(_decode(function)) if function else None,
+            _intern(_decode(source)) if source else None,
+        )
+        for path, line, function, source in raw
     )
 
+
+def _pick_location(frames: Tuple[Frame, ...]):
+    """Innermost frame outside stdlib/site-packages, else the innermost frame."""
+    if not frames:
+        return None, None
+    for frame in reversed(frames):
+        if not frame.is_library:
+            return frame.file, frame.line
+    return frames[-1].file, frames[-1].line
+
+
+def scan_errors(output: str) -> List[ParsedError]:
+    """Return every error found in `output`, in order, chain members included."""
+    scanner = TracebackScanner()
+    found = scanner.feed(output)
+    found.extend(scanner.close())
+    return found
+
+
+def _chunks(output, size: int = PARSE_CHUNK_SIZE) -> Iterator:
+    if isinstance(output, (str, bytes, bytearray, memoryview, mmap.mmap)):
+        for i in range(0, len(output), size):
+            yield output[i:i + size]
+    elif hasattr(output, "read"):
+        while True:
+            chunk = output.read(size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from output
+
+
+def parse_all(output, keep_raw: bool = True) -> Iterator[ParsedError]:
+    """Yield every traceback in `output` with its byte offsets.
+
+    `output` may be a str, bytes, an mmap, a binary file object or any
+    iterable of chunks; it is scanned once, in fixed-size slices.  A chain
+    of exceptions is yielded once, as its final exception, with the earlier
+    ones reachable through `cause` and `start`/`end` spanning the whole chain.
+    Pass `keep_raw=False` to drop the raw text and keep only the frames.
+    """
+    scanner = TracebackScanner(keep_raw)
+    held: Optional[ParsedError] = None
+    for chunk in _chunks(output):
+        for error in scanner.feed(chunk):
+            if held is not None and error.cause is not held:
+                yield held
+            held = error
+    for error in scanner.close():
+        if held is not None and error.cause is not held:
+            yield held
+        held = error
+    if held is not None:
+        yield held
+
+
+def parse_python_traceback(output: str) -> Optional[ParsedError]:
+    """Parse the last Python traceback from stderr output."""
+    found = scan_errors(output)
+    return found[-1] if found else None
+
 def _has_error_line(output: str) -> bool:
     """Check if output has a Python error line."""
-    return bool(re.search(r'^\w+(?:Error|Exception|Warning):', output, re.MULTILINE))
+    return bool(_ERROR_LINE_RE.search(output))
 
 def is_error_output(output: str) -> bool:
-    """Returns True if output contains a Python error/traceback."""
-    return 'Traceback (most recent call last):' in output or _has_error_line(output)
+    """Returns True if output contains an error/traceback, in any supported language."""
+    if 'Traceback (most recent call last):' in output or _has_error_line(output):
+        return True
+    from .languages import registry
+    # classify() is only the literal prefilter; a parser must find an error too
+    return any(parser.parse(output) is not None for parser in registry.classify(output))
+
+def parse_error(output: Optional[str]) -> Optional[ParsedError]:
+    """Parse the error in `output`, or return None if there is none.
+
+    Output is dispatched through `stackback.languages.registry`, so Node,
+    Go, Rust, Java and pytest errors are found as well as Python ones.
+    """
+    if not output:
+        return None
+    from .languages import registry
+    return registry.parse(output)
+
+# Legacy name kept for older callers.
+parse_output = parse_error
 
 def run_and_capture(command: List[str]) -> tuple[str, str, int]:
     """Run command and capture stdout, stderr, exit code."""
@@ -0,0 +1,194 @@
+"""Speculative prefetch of LLM answers while the menu is on screen.
+
+As soon as an error is parsed, the explanation (and optionally the fix) is
+requested on a background thread.  Tokens are buffered as they arrive, so
+when the user picks a menu entry the answer is either complete already or
+still streaming, and is replayed from the start either way.  Streams the
+user never asks for are cancelled on "Skip".
+"""
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .parser import ParsedError
+
+class PrefetchTask:
+    """One background token stream that late readers can replay.
+
+    Without `open_stream` no thread is started; tokens are pushed in by
+    whoever owns the task (see `Prefetcher` in combined mode).
+    """
+
+    def __init__(self, open_stream: Optional[Callable[[], Iterator[str]]] = None):
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.future: Future = Future()
+        self._parts: List[str] = []
+        self._done = False
+        self._cancelled = threading.Event()
+        self._cond = threading.Condition()
+        self.future.set_running_or_notify_cancel()
+        if open_stream is not None:
+            thread = threading.Thread(target=self._run, args=(open_stream,), daemon=True)
+            thread.start()
+
+    def _run(self, open_stream: Callable[[], Iterator[str]]) -> None:
+        try:
+            stream = open_stream()
+            for token in stream:
+                if self._cancelled.is_set():
+                    # Release the connection instead of reading the rest.
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+                    break
+                self.push(token)
+        except Exception as exc:
+            self.finish(exc)
+        else:
+            self.finish()
+
+    def push(self, token: str) -> None:
+        with self._cond:
+            if self.first_token is None:
+                self.first_token = time.perf_counter()
+            self._parts.append(token)
+            self._cond.notify_all()
+
+    def finish(self, exc: Optional[BaseException] = None) -> None:
+        with self._cond:
+            if self._done:
+                return
+            self._done = True
+            self.finished = time.perf_counter()
+            self._cond.notify_all()
+        if exc is not None:
+            self.future.set_exception(exc)
+        else:
+            self.future.set_result("".join(self._parts))
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Time from the request being sent to its first token."""
+        return None if self.first_token is None else self.first_token - self.started
+
+    def cancel(self) -> None:
+        """Stop consuming the stream; tokens already buffered are kept."""
+        self._cancelled.set()
+
+    def tokens(self) -> Iterator[str]:
+        """Replay buffered tokens, then follow the live stream until it ends."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._parts) and not self._done:
+                    self._cond.wait()
+                if index >= len(self._parts):
+                    return
+                pending = self._parts[index:]
+            index += len(pending)
+            yield from pending
+
+
+class PrefetchStream:
+    """What the TUI reads: a task's tokens plus the latency it perceived."""
+
+    def __init__(self, task: PrefetchTask):
+        self.task = task
+        self.requested = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self._parts: List[str] = []
+        self._tokens = task.tokens()
+
+    def __iter__(self) -> "PrefetchStream":
+        return self
+
+    def __next__(self) -> str:
+        token = next(self._tokens)
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.requested
+        self._parts.append(token)
+        return token
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def saved(self) -> Optional[float]:
+        """Seconds of waiting the prefetch removed (vs. asking on demand)."""
+        if self.task.ttft is None or self.ttft is None:
+            return None
+        return max(0.0, self.task.ttft - self.ttft)
+
+
+class Prefetcher:
+    """Starts explanation/fix requests for one error in the background."""
+
+    def __init__(self, explainer, error: ParsedError, kinds=("explain",)):
+        self.explainer = explainer
+        self.error = error
+        self.kinds = tuple(kinds)
+        self.tasks: Dict[str, PrefetchTask] = {}
+
+    def start(self) -> "Prefetcher":
+        if set(self.kinds) == {"explain", "fix"} and getattr(self.explainer, "combined", False):
+            self._start_combined()
+        for kind in self.kinds:
+            self._task(kind)
+        return self
+
+    def _start_combined(self) -> None:
+        """Feed both tasks from a single explain-and-fix request."""
+        tasks = {kind: PrefetchTask() for kind in ("explain", "fix")}
+        self.tasks.update(tasks)
+
+        def run() -> None:
+            error = None
+            pairs = self.explainer.explain_and_fix_stream(self.error)
+            try:
+                for kind, token in pairs:
+                    if all(task.cancelled for task in tasks.values()):
+                        close = getattr(pairs, "close", None)  # not every stream is a generator
+                        if close is not None:
+                            close()
+                        break
+                    tasks[kind].push(token)
+            except Exception as exc:
+                error = exc
+            for task in tasks.values():
+                task.finish(error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _task(self, kind: str) -> PrefetchTask:
+        task = self.tasks.get(kind)
+        if task is None:
+            if kind == "explain":
+                opener = lambda: self.explainer.explain_stream(self.error)
+            elif kind == "fix":
+                opener = lambda: self.explainer.suggest_fix_stream(self.error)
+            else:
+                raise ValueError(f"unknown prefetch kind: {kind}")
+            task = self.tasks[kind] = PrefetchTask(opener)
+        return task
+
+    def stream(self, kind: str) -> PrefetchStream:
+        """Stream for `kind`, started now if it was not prefetched."""
+        return PrefetchStream(self._task(kind))
+
+    def cancel(self, keep=()) -> None:
+        """Cancel every in-flight request except those in `keep`."""
+        for kind, task in self.tasks.items():
+            if kind not in keep and not task.done:
+                task.cancel()
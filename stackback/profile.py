@@ -0,0 +1,274 @@
+"""Timing spans for the stages of an `sb` run.
+
+The pipeline records spans (spawn, capture, detect, parse, client, llm,
+render, ...) on the module-level `profiler`.  It is off unless `--profile`
+is given or the metrics log is enabled, and a disabled profiler hands out
+one shared no-op context manager, so the calls cost next to nothing.
+
+With `--profile` the run ends with a per-stage breakdown on stderr and a
+Chrome trace (open it in Perfetto or chrome://tracing).  With
+STACKBACK_METRICS=1 (or a file path) every run appends one JSON line of
+stage durations to a local log; `sb metrics` reports percentiles from it.
+Nothing is ever sent anywhere.
+
+This module is imported on the `sb` fast path: keep it to the stdlib
+modules that are loaded anyway.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+METRICS_ENV = "STACKBACK_METRICS"
+METRICS_FILE = "metrics.jsonl"
+TRACE_FILE = "profile.json"
+# The log is trimmed to its newest half once it grows past this
+MAX_METRICS_BYTES = 8 * 1024 * 1024
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "thread", "args")
+
+    def __init__(self, name: str, start: float, end: Optional[float] = None, args: Optional[dict] = None):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.thread = threading.current_thread().name
+        self.args = args or {}
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, {self.duration * 1000:.2f} ms)"
+
+
+class _Timer:
+    __slots__ = ("profiler", "span")
+
+    def __init__(self, profiler: "Profiler", name: str, args: dict):
+        self.profiler = profiler
+        self.span = Span(name, 0.0, args=args)
+
+    def __enter__(self) -> Span:
+        self.span.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.span.end = time.perf_counter()
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.span.args.setdefault("error", exc_type.__name__)
+        self.profiler.record(self.span)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NULL = _NullTimer()
+
+
+class Profiler:
+    """Collects spans from any thread."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.wall_origin = time.time()
+        self.spans: List[Span] = []
+        # Facts about the run for the metrics log (error type, menu choice, ...)
+        self.fields: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **args):
+        """Context manager timing a stage; `args` end up in the trace and the log."""
+        return _Timer(self, name, args) if self.enabled else _NULL
+
+    def add(self, name: str, start: float, end: float, **args) -> None:
+        """Record a stage timed by the caller (perf_counter values)."""
+        if self.enabled:
+            span = Span(name, start, end, args)
+            self.record(span)
+
+    def mark(self, name: str, **args) -> None:
+        """Record an instant event."""
+        if self.enabled:
+            now = time.perf_counter()
+            self.record(Span(name, now, now, args))
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def wall(self) -> float:
+        ends = [span.end for span in self.spans if span.end is not None]
+        return (max(ends) if ends else time.perf_counter()) - self.origin
+
+    def totals(self) -> Dict[str, dict]:
+        """Per stage, in order of first appearance: calls, total seconds and merged args."""
+        stages: Dict[str, dict] = {}
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        for span in spans:
+            stage = stages.setdefault(span.name, {"calls": 0, "seconds": 0.0, "args": {}})
+            stage["calls"] += 1
+            stage["seconds"] += span.duration
+            stage["args"].update(span.args)
+        return stages
+
+    def breakdown(self) -> str:
+        """A table of the stages, for the end of a --profile run."""
+        wall = self.wall()
+        lines = [f"sb profile: {wall * 1000:.1f} ms wall", f"  {'stage':<10}{'calls':>6}{'ms':>10}{'%':>6}  details"]
+        for name, stage in self.totals().items():
+            details = ", ".join(f"{key}={value}" for key, value in stage["args"].items())
+            share = stage["seconds"] / wall * 100 if wall else 0.0
+            lines.append(f"  {name:<10}{stage['calls']:>6}{stage['seconds'] * 1000:>10.1f}{share:>6.0f}  {details}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        """The spans in the Chrome trace event format (complete and instant events)."""
+        pid = os.getpid()
+        threads: Dict[str, int] = {}
+        events = []
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            event = {"name": span.name, "cat": "sb", "pid": pid, "tid": tid,
+                     "ts": round((span.start - self.origin) * 1e6, 1), "args": span.args}
+            if span.end == span.start:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=round(span.duration * 1e6, 1))
+            events.append(event)
+        for name, tid in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"start": self.wall_origin}}
+
+    def write_trace(self, path: str) -> str:
+        import json
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+    def metrics_record(self, **fields) -> dict:
+        """One metrics log line: `fields` and `self.fields`, plus the milliseconds spent in each stage."""
+        record = dict(self.fields, **fields)
+        record.update(ts=round(self.wall_origin, 3), wall_ms=round(self.wall() * 1000, 2))
+        totals = self.totals()
+        llm = totals.get("llm")
+        if llm is not None:
+            record.update((key, llm["args"][key]) for key in ("ttft_ms", "tokens") if key in llm["args"])
+        record["stages"] = {name: round(stage["seconds"] * 1000, 2) for name, stage in totals.items()}
+        return record
+
+
+profiler = Profiler()
+
+
+def metrics_path() -> Optional[str]:
+    """The metrics log path if STACKBACK_METRICS opts in: 1 for the default, or a path."""
+    value = os.environ.get(METRICS_ENV, "")
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return None
+    if value.lower() in ("1", "true", "yes", "on"):
+        from .cache import default_cache_dir
+        return os.path.join(default_cache_dir(), METRICS_FILE)
+    return value
+
+
+def default_trace_path() -> str:
+    from .cache import default_cache_dir
+    return os.path.join(default_cache_dir(), TRACE_FILE)
+
+
+def append_metrics(record: dict, path: str) -> None:
+    """Append one line to the metrics log, trimming it when it gets large."""
+    import json
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with open(path, "a") as f:
+        f.write(line)
+        size = f.tell()
+    if size > MAX_METRICS_BYTES:
+        with open(path, "rb") as f:
+            f.seek(size // 2)
+            f.readline()
+            kept = f.read()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(kept)
+        os.replace(tmp, path)
+
+
+def read_metrics(path: str) -> List[dict]:
+    import json
+
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # a line cut short by a concurrent trim
+    except OSError:
+        pass
+    return records
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize_rules(records: List[dict]) -> Optional[dict]:
+    """The runs' rule counters added up (the shape of `RuleEngine.stats`), or None if no run asked the rules."""
+    total = {"lookups": 0, "hits": 0, "confident": 0, "by_rule": {}}
+    for record in records:
+        rules = record.get("rules")
+        if not isinstance(rules, dict):
+            continue
+        for key in ("lookups", "hits", "confident"):
+            total[key] += rules.get(key, 0)
+        for name, count in (rules.get("by_rule") or {}).items():
+            total["by_rule"][name] = total["by_rule"].get(name, 0) + count
+    if not total["lookups"]:
+        return None
+    total["hit_rate"] = round(total["hits"] / total["lookups"], 3)
+    return total
+
+
+def summarize(records: List[dict]) -> Dict[str, dict]:
+    """Per stage (plus wall_ms and ttft_ms): count, p50, p95, p99 and max in ms."""
+    samples: Dict[str, List[float]] = {}
+    for record in records:
+        for key in ("wall_ms", "ttft_ms"):
+            if isinstance(record.get(key), (int, float)):
+                samples.setdefault(key, []).append(record[key])
+        for name, value in (record.get("stages") or {}).items():
+            samples.setdefault(name, []).append(value)
+    return {
+        name: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+               "p99": percentile(values, 99), "max": max(values)}
+        for name, values in samples.items()
+    }
@@ -0,0 +1,360 @@
+"""Routing LLM requests across several providers, with hedging.
+
+`--provider openai,claude,ollama` gives the explainer a `Router` instead of
+a single client.  The router keeps a rolling window of time-to-first-token
+samples and outcomes per provider and sends each request to the fastest
+healthy one (by median TTFT; providers with no samples yet keep the order
+they were given in).  A provider is unhealthy while more than half of its
+recent requests failed, or for COOLDOWN seconds after consecutive failures.
+
+If the first token has not arrived by the primary's p95 TTFT, the same
+request is sent to the next provider as a hedge.  Whichever produces a
+token first wins and the other request is aborted.  A request that fails
+before its first token falls through to the next provider at once.  Once
+a provider has started answering, the router sticks with it.
+
+The statistics are saved to `router.json` in the cache dir after every
+request, so separate `sb` runs learn from each other.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from .client import LLMError
+from .profile import percentile
+
+WINDOW = 50
+MIN_SAMPLES = 5
+# Hedge delay before a provider has MIN_SAMPLES, and the bounds of the p95 deadline
+DEFAULT_HEDGE_AFTER = 3.0
+MIN_HEDGE_AFTER = 0.25
+MAX_HEDGE_AFTER = 15.0
+MAX_ERROR_RATE = 0.5
+FAILURES_FOR_COOLDOWN = 2
+COOLDOWN = 30.0
+STATS_FILE = "router.json"
+
+_DONE = object()
+
+
+class ProviderStats:
+    """Rolling TTFT samples and outcomes of one provider."""
+
+    def __init__(self, ttft: Sequence[float] = (), outcomes: Sequence[int] = (),
+                 failures: int = 0, failed_at: float = 0.0):
+        self.ttft = deque(ttft, maxlen=WINDOW)
+        self.outcomes = deque(outcomes, maxlen=WINDOW)
+        self.failures = failures  # consecutive
+        self.failed_at = failed_at
+
+    def success(self, ttft: float) -> None:
+        self.ttft.append(ttft)
+        self.outcomes.append(1)
+        self.failures = 0
+
+    def failure(self) -> None:
+        self.outcomes.append(0)
+        self.failures += 1
+        self.failed_at = time.time()
+
+    def slow(self, waited: float) -> None:
+        """A request abandoned after `waited` seconds without a token (a lower bound on its TTFT)."""
+        self.ttft.append(waited)
+
+    def error_rate(self) -> float:
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def healthy(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        if self.failures >= FAILURES_FOR_COOLDOWN and now - self.failed_at < COOLDOWN:
+            return False
+        return len(self.outcomes) < 3 or self.error_rate() <= MAX_ERROR_RATE
+
+    def p50(self) -> Optional[float]:
+        return percentile(list(self.ttft), 50) if len(self.ttft) >= MIN_SAMPLES else None
+
+    def p95(self) -> Optional[float]:
+        return percentile(list(self.ttft), 95) if len(self.ttft) >= MIN_SAMPLES else None
+
+    def to_dict(self) -> dict:
+        return {"ttft": [round(value, 4) for value in self.ttft], "outcomes": list(self.outcomes),
+                "failures": self.failures, "failed_at": self.failed_at}
+
+
+class Route:
+    """One provider the router can use: a name and a client with `stream`."""
+
+    __slots__ = ("name", "client", "stats")
+
+    def __init__(self, name: str, client, stats: Optional[ProviderStats] = None):
+        self.name = name
+        self.client = client
+        self.stats = stats or ProviderStats()
+
+    def __repr__(self) -> str:
+        return f"Route({self.name!r})"
+
+
+class _Attempt:
+    """One request on a background thread, feeding tokens into a shared queue."""
+
+    def __init__(self, route: Route, prompt: str, max_tokens: int, events: queue.Queue):
+        self.route = route
+        self.started = time.perf_counter()
+        self.cancelled = False
+        self._response = None
+        self._lock = threading.Lock()
+        self._events = events
+        thread = threading.Thread(target=self._run, args=(prompt, max_tokens),
+                                  name=f"stackback-route-{route.name}", daemon=True)
+        thread.start()
+
+    def _run(self, prompt: str, max_tokens: int) -> None:
+        try:
+            stream = self.route.client.stream(prompt, max_tokens, on_open=self._opened)
+            try:
+                for token in stream:
+                    if self.cancelled:
+                        return
+                    self._events.put((self, token))
+            finally:
+                stream.close()
+        except Exception as exc:
+            if not self.cancelled:
+                self._events.put((self, exc))
+            return
+        self._events.put((self, _DONE))
+
+    def _opened(self, response) -> None:
+        with self._lock:
+            self._response = response
+            cancelled = self.cancelled
+        if cancelled:
+            self._abort(response)
+
+    def cancel(self) -> None:
+        """Stop the request, even while it is blocked waiting for data."""
+        with self._lock:
+            self.cancelled = True
+            response = self._response
+        if response is not None:
+            self._abort(response)
+
+    def _abort(self, response) -> None:
+        abort = getattr(self.route.client, "abort", None)
+        try:
+            if abort is not None:
+                abort(response)
+            else:
+                response.close()
+        except Exception:
+            pass
+
+
+class Router:
+    """A client over several providers: fastest healthy first, hedged after its p95."""
+
+    def __init__(self, routes: Sequence[Route], hedge_after: Optional[float] = None,
+                 stats_path: Optional[str] = None):
+        if not routes:
+            raise ValueError("a router needs at least one provider")
+        self.routes = list(routes)
+        self.hedge_after = hedge_after
+        self.stats_path = stats_path
+        self.model = "+".join(getattr(route.client, "model", route.name) for route in self.routes)
+        self.last_route: Optional[dict] = None
+        self._lock = threading.Lock()
+        if stats_path:
+            for name, stats in load_stats(stats_path).items():
+                for route in self.routes:
+                    if route.name == name:
+                        route.stats = stats
+
+    @property
+    def can_warm(self) -> bool:
+        return any(getattr(route.client, "can_warm", False) for route in self.routes)
+
+    def warm(self) -> bool:
+        warmed = False
+        for route in self.routes:
+            if getattr(route.client, "can_warm", False):
+                warmed = route.client.warm() or warmed
+        return warmed
+
+    def ranked(self) -> List[Route]:
+        """Healthy routes by median TTFT (unmeasured ones after, in the given order), then the rest."""
+        now = time.time()
+        order = {id(route): i for i, route in enumerate(self.routes)}
+
+        def key(route: Route):
+            p50 = route.stats.p50()
+            return (not route.stats.healthy(now), p50 is None, p50 or 0.0, order[id(route)])
+
+        with self._lock:
+            return sorted(self.routes, key=key)
+
+    def deadline(self, route: Route) -> float:
+        """Seconds to wait for `route`'s first token before hedging."""
+        if self.hedge_after is not None:
+            return self.hedge_after
+        p95 = route.stats.p95()
+        if p95 is None:
+            return DEFAULT_HEDGE_AFTER
+        return min(MAX_HEDGE_AFTER, max(MIN_HEDGE_AFTER, p95))
+
+    def stream(self, prompt: str, max_tokens: int = 300) -> Iterator[str]:
+        """Yield text deltas from whichever provider answers first; raises LLMError if all fail."""
+        events: queue.Queue = queue.Queue()
+        pending = self.ranked()
+        live: List[_Attempt] = []
+        winner: Optional[_Attempt] = None
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch() -> float:
+            attempt = _Attempt(pending.pop(0), prompt, max_tokens, events)
+            live.append(attempt)
+            return attempt.started + self.deadline(attempt.route)
+
+        try:
+            hedge_at: Optional[float] = launch()
+            while winner is None:
+                if not live:
+                    if not pending:
+                        raise LLMError(f"every provider failed; last error: {last_error}")
+                    hedge_at = launch()
+                    continue
+                timeout = None
+                if hedge_at is not None and pending:
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+                try:
+                    attempt, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedged = True
+                    launch()
+                    hedge_at = None  # one hedge at a time
+                    continue
+                if attempt not in live:
+                    continue
+                if item is _DONE or isinstance(item, BaseException):
+                    live.remove(attempt)
+                    last_error = item if item is not _DONE else LLMError(f"{attempt.route.name}: empty answer")
+                    self._record(attempt.route, failed=True)
+                    continue
+                winner = attempt
+                self._record(attempt.route, ttft=time.perf_counter() - attempt.started)
+                for other in live:
+                    if other is not attempt:
+                        other.cancel()
+                        self._record(other.route, waited=time.perf_counter() - other.started)
+                live = [attempt]
+                self.last_route = {"provider": attempt.route.name, "hedged": hedged}
+                yield item
+
+            while True:
+                attempt, item = events.get()
+                if attempt is not winner:
+                    continue
+                if item is _DONE:
+                    live.remove(winner)
+                    return
+                if isinstance(item, BaseException):
+                    live.remove(winner)
+                    self._record(winner.route, failed=True)
+                    if isinstance(item, LLMError):
+                        raise item
+                    raise LLMError(f"{winner.route.name}: {item}") from item
+                yield item
+        finally:
+            for attempt in live:
+                attempt.cancel()
+            self.save()
+
+    def complete(self, prompt: str, max_tokens: int = 300) -> str:
+        return "".join(self.stream(prompt, max_tokens))
+
+    def _record(self, route: Route, ttft: Optional[float] = None, waited: Optional[float] = None,
+                failed: bool = False) -> None:
+        with self._lock:
+            if failed:
+                route.stats.failure()
+            elif ttft is not None:
+                route.stats.success(ttft)
+            elif waited is not None:
+                route.stats.slow(waited)
+
+    def stats(self) -> Dict[str, dict]:
+        """Per provider: healthy, error rate, p50/p95 TTFT in ms and sample count."""
+        now = time.time()
+        report = {}
+        for route in self.routes:
+            stats = route.stats
+            p50, p95 = stats.p50(), stats.p95()
+            report[route.name] = {
+                "healthy": stats.healthy(now), "error_rate": round(stats.error_rate(), 3), "samples": len(stats.ttft),
+                "p50_ms": None if p50 is None else round(p50 * 1000, 1),
+                "p95_ms": None if p95 is None else round(p95 * 1000, 1),
+            }
+        return report
+
+    def save(self) -> None:
+        """Write the statistics to `stats_path` (best effort)."""
+        if not self.stats_path:
+            return
+        with self._lock:
+            data = {route.name: route.stats.to_dict() for route in self.routes}
+        try:
+            directory = os.path.dirname(self.stats_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.stats_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.stats_path)
+        except OSError:
+            pass
+
+
+def load_stats(path: str) -> Dict[str, ProviderStats]:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    stats = {}
+    for name, entry in data.items() if isinstance(data, dict) else ():
+        try:
+            stats[name] = ProviderStats(entry.get("ttft", ()), entry.get("outcomes", ()),
+                                        int(entry.get("failures", 0)), float(entry.get("failed_at", 0.0)))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return stats
+
+
+def default_stats_path() -> str:
+    from .cache import default_cache_dir
+    return os.path.join(default_cache_dir(), STATS_FILE)
+
+
+def make_router(providers: Sequence[str], api_key: Optional[str] = None,
+                stats_path: Optional[str] = None) -> Optional[Router]:
+    """A Router over the `providers` that are configured (have a key, or need none).
+
+    `api_key` is used for the first provider only.  None if none is usable.
+    """
+    from .client import PROVIDERS, LLMClient
+
+    routes = []
+    for i, name in enumerate(providers):
+        adapter = PROVIDERS.get(name)
+        key = (api_key if i == 0 else None) or (adapter.api_key() if adapter else None)
+        if adapter is None or (adapter.needs_key and not key):
+            continue
+        routes.append(Route(name, LLMClient(name, api_key=key)))
+    if not routes:
+        return None
+    return Router(routes, stats_path=stats_path or default_stats_path())
@@ -0,0 +1,299 @@
+"""Local rules for errors whose cause and fix are mechanical.
+
+A rule is a function registered for one or more exception types of one
+language (Python by default), with an optional regex the message must
+match.  It receives the error and the match object and may return an
+`Answer` (explanation, fix, confidence), or None to pass.  Lookup is a dict access by exception type (qualified names
+such as `json.decoder.JSONDecodeError` also try their last component), then
+one regex per candidate rule, so unrelated errors cost almost nothing.
+
+The explainer asks the rules before the cache and the LLM: an answer at or
+above `CONFIDENT` is used as is and no request is made; a weaker one only
+replaces the generic built-in text when the LLM is unavailable.
+"""
+import builtins
+import difflib
+import keyword
+import os
+import re
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+from .parser import ParsedError
+from .source import default_cache
+
+CONFIDENT = 0.8
+
+# Import names whose PyPI distribution is named differently
+PIP_NAMES = {
+    "attr": "attrs",
+    "bs4": "beautifulsoup4",
+    "cv2": "opencv-python",
+    "Crypto": "pycryptodome",
+    "dateutil": "python-dateutil",
+    "dotenv": "python-dotenv",
+    "fitz": "PyMuPDF",
+    "gi": "PyGObject",
+    "jose": "python-jose",
+    "jwt": "PyJWT",
+    "magic": "python-magic",
+    "MySQLdb": "mysqlclient",
+    "OpenSSL": "pyOpenSSL",
+    "PIL": "Pillow",
+    "psycopg2": "psycopg2-binary",
+    "serial": "pyserial",
+    "skimage": "scikit-image",
+    "sklearn": "scikit-learn",
+    "telegram": "python-telegram-bot",
+    "win32api": "pywin32",
+    "yaml": "PyYAML",
+    "zmq": "pyzmq",
+}
+
+# Names usually imported under a conventional alias or from a module
+COMMON_IMPORTS = {
+    "np": "import numpy as np",
+    "pd": "import pandas as pd",
+    "plt": "import matplotlib.pyplot as plt",
+    "tf": "import tensorflow as tf",
+    "sns": "import seaborn as sns",
+    "Path": "from pathlib import Path",
+    "datetime": "from datetime import datetime",
+    "defaultdict": "from collections import defaultdict",
+    "Counter": "from collections import Counter",
+    "dataclass": "from dataclasses import dataclass",
+    "Optional": "from typing import Optional",
+    "List": "from typing import List",
+    "Dict": "from typing import Dict",
+    "Any": "from typing import Any",
+}
+# ... where the module itself is as likely meant (`datetime.now()` vs
+# `datetime.datetime.now()`): only a hint, the LLM decides
+AMBIGUOUS_IMPORTS = {"datetime": "import datetime"}
+
+_STDLIB = frozenset(getattr(sys, "stdlib_module_names", ()))
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class Answer:
+    __slots__ = ("explanation", "fix", "confidence", "rule")
+
+    def __init__(self, explanation: str, fix: str, confidence: float, rule: str = ""):
+        self.explanation = explanation
+        self.fix = fix
+        self.confidence = confidence
+        self.rule = rule
+
+    @property
+    def confident(self) -> bool:
+        return self.confidence >= CONFIDENT
+
+    def __repr__(self) -> str:
+        return f"Answer({self.rule!r}, {self.confidence:.2f})"
+
+
+RuleFunc = Callable[[ParsedError, Optional["re.Match"]], Optional[Answer]]
+
+
+class RuleEngine:
+    """Rules indexed by exception type, with hit counters."""
+
+    def __init__(self):
+        self._rules: Dict[Tuple[str, str], List[Tuple[Optional[Pattern], RuleFunc]]] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits: Dict[str, int] = {}
+        self.confident = 0
+
+    def register(self, types, pattern: Optional[str] = None, language: str = "python") -> Callable[[RuleFunc], RuleFunc]:
+        """Decorator: run the function for `language` errors of `types` whose message matches `pattern`."""
+        compiled = re.compile(pattern) if pattern else None
+
+        def decorator(func: RuleFunc) -> RuleFunc:
+            for name in (types,) if isinstance(types, str) else types:
+                self._rules.setdefault((language, name), []).append((compiled, func))
+            return func
+        return decorator
+
+    def candidates(self, error: ParsedError) -> List[Tuple[Optional[Pattern], RuleFunc]]:
+        found = self._rules.get((error.language, error.error_type))
+        if found is None and "." in error.error_type:
+            found = self._rules.get((error.language, error.error_type.rsplit(".", 1)[1]))
+        return found or []
+
+    def answer(self, error: ParsedError) -> Optional[Answer]:
+        """The most confident answer of the rules for this error, if any."""
+        best = None
+        for pattern, func in self.candidates(error):
+            match = None
+            if pattern is not None:
+                match = pattern.search(error.message)
+                if match is None:
+                    continue
+            try:
+                answer = func(error, match)
+            except (OSError, ValueError, IndexError):
+                continue
+            if answer is not None and (best is None or answer.confidence > best.confidence):
+                answer.rule = answer.rule or func.__name__
+                best = answer
+        with self._lock:
+            self.lookups += 1
+            if best is not None:
+                self.hits[best.rule] = self.hits.get(best.rule, 0) + 1
+                self.confident += best.confident
+        return best
+
+    @property
+    def hit_rate(self) -> float:
+        return sum(self.hits.values()) / self.lookups if self.lookups else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": sum(self.hits.values()),
+                "confident": self.confident,
+                "hit_rate": round(self.hit_rate, 3),
+                "by_rule": dict(self.hits),
+            }
+
+
+engine = RuleEngine()
+rule = engine.register
+
+
+def _source_line(error: ParsedError) -> str:
+    """The innermost frame's source line, from the traceback or the file."""
+    if not error.frames:
+        return ""
+    frame = error.frames[-1]
+    if frame.source:
+        return frame.source.strip()
+    return default_cache.getline(frame.file, frame.line).strip()
+
+
+def _user_frame(error: ParsedError):
+    for frame in reversed(error.frames):
+        if not frame.is_library:
+            return frame
+    return None
+
+
+# -- built-in rules ----------------------------------------------------------
+
+@rule("ModuleNotFoundError", r"No module named '([\w.]+)'")
+def module_not_found(error: ParsedError, match) -> Optional[Answer]:
+    module = match.group(1)
+    top = module.split(".", 1)[0]
+    frame = _user_frame(error)
+    if frame is not None:
+        here = os.path.dirname(frame.file)
+        if os.path.exists(os.path.join(here, top + ".py")) or os.path.isdir(os.path.join(here, top)):
+            # The module is the project's own; an install would not help
+            return Answer(
+                f"Python cannot import '{module}' although {top} exists next to {os.path.basename(frame.file)}. "
+                "The script is probably run from another directory, or the package lacks an __init__.py.",
+                f"# Run from the project root, e.g.\npython -m {os.path.splitext(os.path.basename(frame.file))[0]}",
+                0.6,
+            )
+    if top in _STDLIB:
+        return Answer(
+            f"'{module}' is not part of this Python's standard library build (or was removed in this version).",
+            f"# Check `{sys.executable} -c 'import {top}'` and your Python version",
+            0.5,
+        )
+    package = PIP_NAMES.get(top, top.replace("_", "-"))
+    note = f" The package that provides it is called '{package}'." if package != top else ""
+    if module != top:
+        explanation = (f"The package '{top}' is not installed in the Python environment running this code, "
+                       f"so '{module}' cannot be imported.{note}")
+    else:
+        explanation = (f"The module '{top}' is not installed in the Python environment running this code."
+                       f"{note} If it is installed, it is in a different environment than the one used here.")
+    return Answer(explanation, f"python -m pip install {package}", 0.9)
+
+
+@rule("NameError", r"name '(\w+)' is not defined")
+def undefined_name(error: ParsedError, match) -> Optional[Answer]:
+    name = match.group(1)
+    suggested = re.search(r"Did you mean: '(\w+)'", error.message)
+    source = _source_line(error)
+    if name in AMBIGUOUS_IMPORTS:
+        fix = AMBIGUOUS_IMPORTS[name] if f"{name}.{name}" in source else COMMON_IMPORTS[name]
+        return Answer(f"'{name}' is used but never imported in this module.", fix, 0.6)
+    if name in COMMON_IMPORTS:
+        return Answer(f"'{name}' is used but never imported in this module.", COMMON_IMPORTS[name], 0.9)
+    if suggested:
+        fixed = re.sub(rf"\b{name}\b", suggested.group(1), source) if source else suggested.group(1)
+        return Answer(f"'{name}' is not defined; it looks like a typo for '{suggested.group(1)}'.", fixed, 0.95)
+    known = set(dir(builtins)) | set(keyword.kwlist)
+    frame = _user_frame(error)
+    if frame is not None:
+        try:
+            with open(frame.file, encoding="utf-8", errors="replace") as f:
+                known.update(_IDENT_RE.findall(f.read(1 << 20)))
+        except OSError:
+            pass
+    known.discard(name)
+    close = difflib.get_close_matches(name, known, n=1, cutoff=0.75)
+    if close:
+        fixed = re.sub(rf"\b{name}\b", close[0], source) if source else close[0]
+        return Answer(f"'{name}' is not defined; it looks like a typo for '{close[0]}'.", fixed, 0.85)
+    return Answer(
+        f"'{name}' is used before anything assigned, imported or defined it in this scope.",
+        f"# Define or import {name} before this line",
+        0.5,
+    )
+
+
+@rule("KeyError", r"^(['\"])(.*)\1$")
+def missing_key(error: ParsedError, match) -> Optional[Answer]:
+    key = match.group(0)
+    source = _source_line(error)
+    lookup = re.search(r"([\w.\]\)]+)\[\s*" + re.escape(key) + r"\s*\]", source) if source else None
+    if lookup and not re.match(r"\s*[-+*/%|&^]?=(?!=)", source.split(lookup.group(0), 1)[1]):
+        container = lookup.group(1)
+        fixed = source.replace(lookup.group(0), f"{container}.get({key})")
+        return Answer(
+            f"{container} has no key {key} when this line runs. Use .get() to allow it to be missing, "
+            "or make sure whatever fills the dict sets it.",
+            fixed, 0.85,
+        )
+    return Answer(
+        f"The dictionary being read has no key {key}.",
+        f"value = mapping.get({key})  # or check `{key} in mapping` first",
+        0.6,
+    )
+
+
+@rule(("FileNotFoundError", "IsADirectoryError", "NotADirectoryError"),
+      r"No such file or directory: '([^']+)'")
+def missing_file(error: ParsedError, match) -> Optional[Answer]:
+    path = match.group(1)
+    frame = _user_frame(error)
+    script_dir = os.path.dirname(frame.file) if frame is not None else None
+    if not os.path.isabs(path) and script_dir and os.path.exists(os.path.join(script_dir, path)):
+        return Answer(
+            f"'{path}' is relative, so it is looked up from the current directory ({os.getcwd()}), "
+            f"but the file is next to the script in {script_dir}.",
+            f"from pathlib import Path\npath = Path(__file__).parent / {path!r}",
+            0.9,
+        )
+    directory = os.path.dirname(os.path.join(os.getcwd(), path)) or "."
+    try:
+        siblings = os.listdir(directory)
+    except OSError:
+        return Answer(
+            f"The directory {os.path.dirname(path) or '.'!r} does not exist, so '{path}' cannot be opened.",
+            f"# Create it first: os.makedirs({os.path.dirname(path)!r}, exist_ok=True)",
+            0.7,
+        )
+    close = difflib.get_close_matches(os.path.basename(path), siblings, n=1, cutoff=0.7)
+    if close:
+        fixed = os.path.join(os.path.dirname(path), close[0])
+        return Answer(f"There is no '{path}', but there is '{fixed}'; the name is probably misspelled.",
+                      repr(fixed), 0.85)
+    return Answer(f"'{path}' does not exist (looked up from {os.getcwd()}).",
+                  f"# Check the path, or create the file before opening {path!r}", 0.6)
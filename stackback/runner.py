@@ -0,0 +1,253 @@
+"""Streaming command runner.
+
+The child's stdout is inherited untouched, so it reaches the terminal with no
+extra copies.  Stderr is read through a pipe in fixed-size chunks, written to
+our own stderr as it arrives and fed to a `TracebackScanner`.
+Only a bounded tail of stderr is kept in memory for parsing.  Tools that
+report failures on stdout (pytest) can have stdout piped the same way with
+`capture_stdout`; it is still written through as it arrives.
+
+This module sits on the `sb` startup path, so it stays import-light: the
+parser is only imported once the child actually writes to stderr.
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from .profile import profiler
+
+DEFAULT_TAIL_BYTES = 256 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Signals we relay to the child instead of acting on them ourselves.
+FORWARDED_SIGNALS = ("SIGTERM", "SIGHUP", "SIGQUIT", "SIGUSR1", "SIGUSR2")
+
+
+class TailBuffer:
+    """Keeps the last `limit` bytes written to it."""
+
+    def __init__(self, limit: int = DEFAULT_TAIL_BYTES):
+        self.limit = limit
+        self.total = 0
+        self._chunks: deque = deque()
+        self._size = 0
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total += len(data)
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._chunks and self._size - len(self._chunks[0]) >= self.limit:
+            self._size -= len(self._chunks.popleft())
+
+    def getvalue(self) -> bytes:
+        data = b"".join(self._chunks)
+        return data[-self.limit:] if len(data) > self.limit else data
+
+
+class RunResult:
+    """Outcome of `stream_command`: exit status, output tails and last error."""
+
+    __slots__ = ("returncode", "stderr_tail", "stderr_bytes", "error", "error_count", "stdout_tail")
+
+    def __init__(
+        self,
+        returncode: int,
+        stderr_tail: bytes,
+        stderr_bytes: int,
+        error: Optional["ParsedError"] = None,
+        error_count: int = 0,
+        stdout_tail: bytes = b"",
+    ):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.stderr_bytes = stderr_bytes
+        self.error = error
+        self.error_count = error_count
+        self.stdout_tail = stdout_tail
+
+    @property
+    def error_detected(self) -> bool:
+        return self.error is not None
+
+    @property
+    def signal(self) -> Optional[int]:
+        """Signal number that killed the child, if any."""
+        return -self.returncode if self.returncode < 0 else None
+
+    @property
+    def exit_code(self) -> int:
+        """Shell-style exit code (128 + N for a child killed by signal N)."""
+        return 128 + -self.returncode if self.returncode < 0 else self.returncode
+
+    @property
+    def stderr_text(self) -> str:
+        return self.stderr_tail.decode("utf-8", errors="replace")
+
+    @property
+    def output_text(self) -> str:
+        """The captured stdout tail (if any) followed by the stderr tail."""
+        if not self.stdout_tail:
+            return self.stderr_text
+        return self.stdout_tail.decode("utf-8", errors="replace") + "\n" + self.stderr_text
+
+
+def _pump(fd: int, sink, tail: TailBuffer, on_chunk: Optional[Callable[[bytes], None]]) -> None:
+    """Copy `fd` to `sink` chunk by chunk until EOF."""
+    while True:
+        try:
+            chunk = os.read(fd, CHUNK_SIZE)
+        except OSError:
+            break
+        if not chunk:
+            break
+        if sink is not None:
+            try:
+                sink.write(chunk)
+                sink.flush()
+            except (OSError, ValueError):
+                sink = None
+        tail.write(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+
+
+def stream_command(
+    command: List[str],
+    tail_bytes: int = DEFAULT_TAIL_BYTES,
+    on_stderr: Optional[Callable[[bytes], None]] = None,
+    stderr_sink=None,
+    capture_stdout: bool = False,
+) -> RunResult:
+    """Run `command`, streaming its stderr live and keeping a bounded tail.
+
+    With `capture_stdout`, stdout is streamed and tailed the same way (but
+    not scanned).  Raises FileNotFoundError if the command does not exist.
+    """
+    if stderr_sink is None:
+        stderr_sink = getattr(sys.stderr, "buffer", None)
+    scanners = []
+    last = []
+    # Time spent scanning stderr: [first chunk, total seconds, chunks]
+    detect = [0.0, 0.0, 0]
+
+    def on_chunk(chunk: bytes) -> None:
+        started = time.perf_counter() if profiler.enabled else 0.0
+        if not scanners:
+            from .parser import TracebackScanner
+            scanners.append(TracebackScanner())
+        found = scanners[0].feed(chunk)
+        if found:
+            last[:] = found[-1:]
+        if started:
+            detect[0] = detect[0] or started
+            detect[1] += time.perf_counter() - started
+            detect[2] += 1
+        if on_stderr is not None:
+            on_stderr(chunk)
+
+    env = None
+    if capture_stdout:
+        # The child no longer sees a terminal; keep its colours and line flushing
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        if sys.stdout.isatty() and not os.environ.get("NO_COLOR"):
+            env.setdefault("PY_COLORS", "1")
+    with profiler.span("spawn", command=os.path.basename(command[0])):
+        proc = subprocess.Popen(
+            command, stderr=subprocess.PIPE, stdout=subprocess.PIPE if capture_stdout else None, bufsize=0, env=env,
+        )
+    spawned = time.perf_counter()
+    tail = TailBuffer(tail_bytes)
+    pumps = [threading.Thread(
+        target=_pump, args=(proc.stderr.fileno(), stderr_sink, tail, on_chunk), daemon=True
+    )]
+    stdout_tail = TailBuffer(tail_bytes)
+    if capture_stdout:
+        pumps.append(threading.Thread(
+            target=_pump, args=(proc.stdout.fileno(), getattr(sys.stdout, "buffer", None), stdout_tail, None),
+            daemon=True,
+        ))
+    for pump in pumps:
+        pump.start()
+
+    previous = _install_forwarding(proc)
+    try:
+        returncode = proc.wait()
+        for pump in pumps:
+            pump.join()
+    finally:
+        _restore_handlers(previous)
+        proc.stderr.close()
+        if proc.stdout is not None:
+            proc.stdout.close()
+    if scanners:
+        found = scanners[0].close()
+        if found:
+            last[:] = found[-1:]
+    if profiler.enabled:
+        profiler.add("capture", spawned, time.perf_counter(), stderr_bytes=tail.total, returncode=returncode)
+        if detect[2]:
+            profiler.add("detect", detect[0], detect[0] + detect[1], chunks=detect[2])
+
+    return RunResult(
+        returncode=returncode,
+        stderr_tail=tail.getvalue(),
+        stderr_bytes=tail.total,
+        error=last[0] if last else None,
+        error_count=scanners[0].errors_seen if scanners else 0,
+        stdout_tail=stdout_tail.getvalue(),
+    )
+
+
+def _install_forwarding(proc: subprocess.Popen) -> dict:
+    """Relay termination signals to the child while it runs.
+
+    SIGINT is ignored here: the terminal already delivers Ctrl-C to the whole
+    foreground process group, so the child decides how to react to it.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return {}
+    previous = {}
+
+    def forward(signum, frame):
+        try:
+            proc.send_signal(signum)
+        except OSError:
+            pass
+
+    previous[signal.SIGINT] = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name in FORWARDED_SIGNALS:
+        signum = getattr(signal, name, None)
+        if signum is not None:
+            previous[signum] = signal.signal(signum, forward)
+    return previous
+
+
+def _restore_handlers(previous: dict) -> None:
+    for signum, handler in previous.items():
+        signal.signal(signum, handler)
+
+
+def exit_like(returncode: int) -> None:
+    """Exit the current process the same way the child did.
+
+    A child killed by a signal is mirrored by re-raising that signal on
+    ourselves, so parents (shells, CI runners) see an identical wait status.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if returncode < 0:
+        signum = -returncode
+        try:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+        except (OSError, ValueError):
+            pass
+        sys.exit(128 + signum)
+    sys.exit(returncode)
@@ -0,0 +1,181 @@
+"""Source lines around traceback frames, read through a shared cache.
+
+`SourceCache` is a small LRU of files keyed by path and validated against
+(mtime, size), like `linecache` but with bounded memory: small files are
+read once and split into lines, larger ones are memory-mapped and only
+indexed up to the highest line asked for.  A traceback with hundreds of
+frames in a handful of files costs one stat and at most one read per file.
+
+`attach_source_context` fills `ParsedError.context` for the innermost user
+frames; `render_context` turns it into the numbered listing used in
+prompts and in the TUI.
+"""
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .parser import ParsedError
+
+RADIUS = 3
+MAX_FRAMES = 8
+MAX_FILES = 64
+MMAP_THRESHOLD = 256 * 1024
+MAX_LINE_CHARS = 200
+
+
+class _File:
+    """One cached file: its lines, or an mmap plus the line offsets found so far."""
+
+    __slots__ = ("stamp", "lines", "data", "offsets")
+
+    def __init__(self, path: str, stamp: Tuple[int, int]):
+        self.stamp = stamp
+        self.lines: Optional[List[str]] = None
+        self.data = None
+        self.offsets = array("Q", [0])
+        with open(path, "rb") as f:
+            if stamp[1] < MMAP_THRESHOLD:
+                self.lines = f.read().decode("utf-8", "replace").splitlines()
+            elif stamp[1]:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, first: int, last: int) -> List[str]:
+        """Lines `first`..`last` (1-based, inclusive) that exist."""
+        if self.lines is not None:
+            return self.lines[max(first, 1) - 1:last]
+        if self.data is None:
+            return []
+        data, offsets = self.data, self.offsets
+        while len(offsets) <= last and offsets[-1] < len(data):
+            newline = data.find(b"\n", offsets[-1])
+            offsets.append(len(data) if newline < 0 else newline + 1)
+        lines = []
+        for number in range(max(first, 1), min(last, len(offsets) - 1) + 1):
+            raw = data[offsets[number - 1]:offsets[number]]
+            lines.append(raw.decode("utf-8", "replace").rstrip("\r\n"))
+        return lines
+
+    @property
+    def closed(self) -> bool:
+        return self.data is not None and self.data.closed
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+
+
+class SourceCache:
+    """LRU cache of source files, revalidated by mtime and size."""
+
+    def __init__(self, max_files: int = MAX_FILES):
+        self.max_files = max_files
+        self._files: "OrderedDict[str, _File]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def _file(self, path: str) -> Optional[_File]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and entry.stamp == stamp:
+                self._files.move_to_end(path)
+                return entry
+        try:
+            entry = _File(path, stamp)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self.reads += 1
+            old = self._files.pop(path, None)
+            if old is not None:
+                old.close()
+            self._files[path] = entry
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)[1].close()
+        return entry
+
+    def lines(self, path: str, first: int, last: int) -> List[str]:
+        """Lines `first`..`last` of `path` (1-based, inclusive); [] if unreadable."""
+        for _ in range(2):
+            entry = self._file(path)
+            if entry is None:
+                return []
+            # Under the lock, so another thread cannot evict and close the mmap mid-read
+            with self._lock:
+                if not entry.closed:
+                    return entry.get(first, last)
+            # Evicted since `_file` returned it: look the file up again
+        return []
+
+    def getline(self, path: str, number: int) -> str:
+        lines = self.lines(path, number, number)
+        return lines[0] if lines else ""
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._files.values():
+                entry.close()
+            self._files.clear()
+
+
+default_cache = SourceCache()
+
+
+def attach_source_context(
+    error: ParsedError,
+    radius: int = RADIUS,
+    max_frames: int = MAX_FRAMES,
+    cache: Optional[SourceCache] = None,
+) -> ParsedError:
+    """Read `radius` lines around the innermost `max_frames` user frames.
+
+    Sets `error.context` to {frame index: (first line number, lines)}, and
+    does the same for the error's cause.  Library frames and files that
+    cannot be read are skipped.  Returns the error.
+    """
+    cache = cache or default_cache
+    context: Dict[int, Tuple[int, Tuple[str, ...]]] = {}
+    for index in range(len(error.frames) - 1, -1, -1):
+        if len(context) >= max_frames:
+            break
+        frame = error.frames[index]
+        if frame.is_library or not frame.line or frame.file.startswith("<"):
+            continue
+        first = max(1, frame.line - radius)
+        lines = cache.lines(frame.file, first, frame.line + radius)
+        if lines:
+            context[index] = (first, tuple(line[:MAX_LINE_CHARS] for line in lines))
+    error.context = context
+    if error.cause is not None and error.cause.context is None:
+        attach_source_context(error.cause, radius, max_frames, cache)
+    return error
+
+
+def render_context(error: ParsedError, max_frames: Optional[int] = None) -> str:
+    """Numbered source listings for the innermost frames with context.
+
+        app/handler.py, in handle:
+          11 |     uid = req.args["id"]
+        > 12 |     user = users[uid]
+    """
+    if not error.context:
+        return ""
+    blocks = []
+    for index in sorted(error.context, reverse=True)[:max_frames]:
+        frame = error.frames[index]
+        first, lines = error.context[index]
+        width = len(str(first + len(lines) - 1))
+        header = f"{frame.file}, in {frame.function}:" if frame.function else f"{frame.file}:"
+        body = [
+            f"{'>' if number == frame.line else ' '} {number:>{width}} | {line}"
+            for number, line in enumerate(lines, first)
+        ]
+        blocks.append("\n".join([header] + body))
+    return "\n\n".join(blocks)
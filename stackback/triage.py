@@ -0,0 +1,208 @@
+"""Batch triage of existing logs: `sb triage <logfile|dir> ...`.
+
+Files are memory-mapped and cut into slices at safe boundaries (the start
+of an unindented "Traceback (most recent call last):" line that does not
+continue an exception chain), so no traceback is split between two slices.
+Slices are parsed in a process pool with `parse_all(keep_raw=False)`.  Each
+worker groups its errors by fingerprint before sending anything back, so
+only one small record per distinct error crosses the process boundary.
+"""
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .fingerprint import fingerprint
+from .parser import PARSE_CHUNK_SIZE, ParsedError, parse_all
+
+MIN_SLICE = 4 * 1024 * 1024
+MAX_SLICE = 64 * 1024 * 1024
+BOUNDARY_WINDOW = 1024 * 1024
+POOL_THRESHOLD = 8 * 1024 * 1024
+
+_HEADER = b"\nTraceback (most recent call last):"
+_CHAIN_MARKERS = (b"above exception", b"following exception")
+
+Slice = Tuple[str, int, int]
+
+
+class ErrorGroup:
+    """All occurrences of one fingerprint."""
+
+    __slots__ = ("fingerprint", "count", "first", "last", "files", "error")
+
+    def __init__(self, fingerprint: str, error: ParsedError, location: Tuple[str, int]):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.first = location
+        self.last = location
+        self.files = set()
+        self.error = error
+
+    def add(self, count: int, first: Tuple[str, int], last: Tuple[str, int]) -> None:
+        self.count += count
+        self.last = last
+        self.files.add(first[0])
+        self.files.add(last[0])
+
+    def to_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "first_seen": "%s:%d" % self.first,
+            "last_seen": "%s:%d" % self.last,
+            "files": sorted(self.files),
+            "error": self.error.to_dict(),
+        }
+
+
+class TriageReport:
+    def __init__(self, groups: List[ErrorGroup], files: int, size: int, elapsed: float, jobs: int):
+        self.groups = groups
+        self.files = files
+        self.bytes = size
+        self.elapsed = elapsed
+        self.jobs = jobs
+
+    @property
+    def total(self) -> int:
+        return sum(group.count for group in self.groups)
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes / 1e6 / self.elapsed if self.elapsed else 0.0
+
+
+def find_files(paths: Iterable[str]) -> List[str]:
+    """Regular files named in `paths`, walking directories (hidden entries skipped)."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                found.extend(os.path.join(root, n) for n in sorted(names) if not n.startswith("."))
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            raise FileNotFoundError(path)
+    return found
+
+
+def _safe_boundary(data, pos: int) -> Optional[int]:
+    """Offset of the first safe split point at or after `pos`, if one is near."""
+    limit = min(len(data), pos + BOUNDARY_WINDOW)
+    while True:
+        hit = data.find(_HEADER, pos - 1, limit)
+        if hit < 0:
+            return None
+        # Skip back over blank lines to the line before the header
+        before = data.rfind(b"\n", max(0, hit - 512), hit)
+        prev = data[before + 1:hit].strip() if before >= 0 else b""
+        while not prev and before > 0:
+            end = before
+            before = data.rfind(b"\n", max(0, end - 512), end)
+            prev = data[before + 1:end].strip()
+        if not any(marker in prev for marker in _CHAIN_MARKERS):
+            return hit + 1
+        pos = hit + len(_HEADER)
+
+
+def split_file(path: str, size: int, slice_size: int) -> List[Slice]:
+    """(path, start, end) slices of one file, cut at safe boundaries."""
+    if size <= slice_size:
+        return [(path, 0, size)]
+    slices = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while size - start > slice_size:
+            target = start + slice_size
+            cut = _safe_boundary(data, target)
+            if cut is None:
+                if target + BOUNDARY_WINDOW >= size:
+                    break
+                # No traceback starts in a whole window, so any traceback
+                # running through `target` has ended by its far side
+                newline = data.find(b"\n", target + BOUNDARY_WINDOW)
+                cut = newline + 1 if newline >= 0 else size
+            if cut >= size:
+                break
+            slices.append((path, start, cut))
+            start = cut
+    slices.append((path, start, size))
+    return slices
+
+
+def parse_slice(piece: Slice) -> Tuple[Dict[str, list], int]:
+    """Group the errors of one slice by fingerprint.
+
+    Returns ({fingerprint: [count, first line, last line, error dict]},
+    newlines in the slice); line numbers are relative to the slice.
+    """
+    path, start, end = piece
+    groups: Dict[str, list] = {}
+    memo: Dict[tuple, str] = {}
+    if end <= start:
+        return groups, 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        chunks = (data[i:min(i + PARSE_CHUNK_SIZE, end)] for i in range(start, end, PARSE_CHUNK_SIZE))
+        line, seen = 1, start
+        for error in parse_all(chunks, keep_raw=False):
+            offset = start + (error.start or 0)
+            line += data[seen:offset].count(b"\n")
+            seen = offset
+            # Repeats of one error are the common case; hash each variant once
+            memo_key = (error.error_type, error.message, error.filename, error.frames)
+            key = memo.get(memo_key)
+            if key is None:
+                key = memo[memo_key] = fingerprint(error)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [1, line, line, error.to_dict()]
+            else:
+                group[0] += 1
+                group[2] = line
+        newlines = line - 1 + data[seen:end].count(b"\n")
+    return groups, newlines
+
+
+def _map(pieces: List[Slice], jobs: int) -> Iterator[Tuple[Dict[str, list], int]]:
+    if jobs <= 1:
+        return map(parse_slice, pieces)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return iter(list(pool.map(parse_slice, pieces)))
+
+
+def triage(paths: Iterable[str], jobs: Optional[int] = None, slice_size: Optional[int] = None) -> TriageReport:
+    """Parse every file under `paths` and group the errors by fingerprint.
+
+    `jobs` defaults to every core, or to one for input too small to be
+    worth a process pool; an explicit value is always used.
+    """
+    started = time.perf_counter()
+    files = find_files(paths)
+    sizes = [os.path.getsize(path) for path in files]
+    total = sum(sizes)
+    if jobs is None:
+        # Below the threshold the pool costs more than it saves
+        jobs = 1 if total < POOL_THRESHOLD else os.cpu_count() or 1
+    jobs = max(1, jobs)
+    if slice_size is None:
+        slice_size = min(MAX_SLICE, max(MIN_SLICE, total // (jobs * 4) + 1))
+    pieces: List[Slice] = []
+    for path, size in zip(files, sizes):
+        pieces.extend(split_file(path, size, slice_size))
+
+    groups: Dict[str, ErrorGroup] = {}
+    path, base = None, 0
+    for piece, (found, newlines) in zip(pieces, _map(pieces, jobs)):
+        if piece[0] != path:
+            path, base = piece[0], 0
+        for key, (count, first, last, data) in found.items():
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = ErrorGroup(key, ParsedError.from_dict(data), (path, base + first))
+            group.add(count, (path, base + first), (path, base + last))
+        base += newlines
+    ranked = sorted(groups.values(), key=lambda g: (-g.count, g.first))
+    return TriageReport(ranked, len(files), total, time.perf_counter() - started, jobs)
@@ -1,5 +1,12 @@
-from typing import Optional
+import os
+import textwrap
+from typing import List, Optional
 from .parser import ParsedError
+from .prefetch import Prefetcher
+from .profile import profiler
+
+# Stack Overflow tag for each ParsedError.language
+SO_TAGS = {"python": "python", "node": "node.js", "go": "go", "rust": "rust", "java": "java"}
 
 def show_error_header(error: ParsedError) -> None:
     """Display the error header."""
@@ -8,47 +15,179 @@ def show_error_header(error: ParsedError) -> None:
         location = f"  ({error.filename}:{error.line_number})"
     print(f"\n✗ {error.error_type}: {error.message}{location}\n")
 
-def show_menu() -> str:
+def show_menu(can_apply: bool = False) -> str:
     """Show interactive menu and return choice."""
     print("What would you like to do?")
     print("  [1] Explain — what went wrong and why")
     print("  [2] Fix — get a code fix suggestion")
     print("  [3] Stack Overflow — search for solutions")
     print("  [4] Skip — continue without action")
+    if can_apply:
+        print("  [5] Apply fix — patch a copy, re-run, keep the fix if the error is gone")
     print()
-    
+    last = '5' if can_apply else '4'
+    choices = ('1', '2', '3', '4', 'q', 'skip') + (('5',) if can_apply else ())
+
     while True:
         try:
-            choice = input("Choice [1-4]: ").strip()
-            if choice in ('1', '2', '3', '4', 'q', 'skip'):
+            choice = input(f"Choice [1-{last}]: ").strip()
+            if choice in choices:
                 return choice
-            print("Please enter 1, 2, 3, or 4")
+            print("Please enter 1, 2, 3, 4" + (" or 5" if can_apply else ""))
         except (EOFError, KeyboardInterrupt):
             return '4'
 
-def run_interactive(error: ParsedError, explainer=None) -> str:
-    """Run interactive TUI flow. Returns action taken."""
+def render_stream(stream) -> str:
+    """Print tokens as they arrive and return the full text."""
+    with profiler.span("render") as span:
+        tokens = 0
+        for token in stream:
+            print(token, end="", flush=True)
+            tokens += 1
+        print()
+    ttft = getattr(stream, "ttft", None)
+    saved = getattr(stream, "saved", None)
+    if span is not None:
+        span.args.update(tokens=tokens, first_token_ms=round(ttft * 1000, 1) if ttft is not None else None)
+    if ttft is not None:
+        note = f"first token after {ttft * 1000:.0f} ms"
+        if saved:
+            note += f", prefetch saved {saved * 1000:.0f} ms"
+        print(f"\n({note})")
+    return getattr(stream, "text", "")
+
+def show_local_answers(error: ParsedError, k: int = 3) -> bool:
+    """Print the best matches from the offline knowledge base, if one is built."""
+    from .kb import open_default
+    kb = open_default()
+    if kb is None:
+        return False
+    try:
+        hits = kb.search(error, k)
+        if not hits:
+            return False
+        print("\nFrom your local knowledge base:\n")
+        for number, hit in enumerate(hits, 1):
+            print(f"  {number}. {hit.title}")
+            if hit.excerpt:
+                print(textwrap.indent(textwrap.fill(hit.excerpt, 76), "     "))
+            if hit.url:
+                print(f"     {hit.url}")
+            print()
+        return True
+    finally:
+        kb.close()
+
+def apply_fix(error: ParsedError, command: List[str], explainer=None, prefetcher=None) -> str:
+    """Try the suggested fixes in scratch copies and offer to keep the first that works."""
+    from .autofix import candidate_patches, try_fixes
+    from .rules import engine
+
+    suggestions = []
+    # The explainer has already asked the rules (and counted it)
+    rule_answer = getattr(explainer, "_rule_answer", None)
+    answer = rule_answer(error) if rule_answer is not None else engine.answer(error)
+    if answer is not None:
+        suggestions.append(answer.fix)
+    if explainer:
+        prefetcher.cancel(keep=("fix",))
+        print("\nSuggested fix:\n")
+        suggestions.append(render_stream(prefetcher.stream("fix")))
+    patches = []
+    for suggestion in suggestions:
+        patches.extend(candidate_patches(error, suggestion))
+    if not patches:
+        print("\nCould not turn the suggestion into a patch for this project.")
+        return 'apply'
+
+    def report(attempt) -> None:
+        if attempt.cancelled:
+            status = "stopped"
+        elif attempt.passed:
+            status = "passed"
+        elif attempt.returncode is None:
+            status = "timed out"
+        elif attempt.error is not None and attempt.error.error_type != error.error_type:
+            status = f"failed with {attempt.error.error_type}"
+        else:
+            status = f"failed (exit {attempt.returncode})"
+        print(f"  {attempt.patch.label:<32} {status:<28} {attempt.elapsed:6.2f} s")
+
+    print(f"\nTrying {len(patches)} candidate fix(es) in isolated copies...")
+    try:
+        result = try_fixes(patches, command, on_attempt=report)
+    except (OSError, ValueError) as exc:
+        print(f"Could not try the fixes: {exc}")
+        return 'apply'
+    print(f"  ({result.elapsed:.2f} s in total)")
+    if result.winner is None:
+        print("\nNo candidate made the command pass; nothing was changed.")
+        return 'apply'
+    patch = result.winner.patch
+    print(f"\n{patch.diff(os.getcwd())}")
+    try:
+        keep = input(f"Apply this change to {os.path.relpath(patch.path)}? [y/N]: ").strip().lower()
+    except (EOFError, KeyboardInterrupt):
+        keep = ""
+    if keep in ("y", "yes"):
+        try:
+            patch.apply()
+        except (OSError, RuntimeError) as exc:
+            print(f"Not applied: {exc}")
+        else:
+            print("Applied.")
+    return 'apply'
+
+def run_interactive(error: ParsedError, explainer=None, prefetch=("explain",),
+                    command: Optional[List[str]] = None) -> str:
+    """Run interactive TUI flow. Returns action taken.
+
+    The answers named in `prefetch` ("explain", "fix") are requested in the
+    background while the menu is shown.  With the failed `command`, the
+    menu also offers to apply and verify a fix.
+    """
+    prefetcher = Prefetcher(explainer, error, prefetch).start() if explainer else None
     show_error_header(error)
-    choice = show_menu()
+    with profiler.span("menu"):
+        choice = show_menu(can_apply=command is not None)
+    profiler.fields["choice"] = choice
+
+    if choice == '5':
+        return apply_fix(error, command, explainer, prefetcher)
     
     if choice == '1':
         if explainer:
+            prefetcher.cancel(keep=("explain",))
             print("\nExplanation:\n")
-            print(explainer.explain(error))
+            render_stream(prefetcher.stream("explain"))
         else:
             print(f"\n{error.error_type}: {error.message}")
         return 'explain'
     elif choice == '2':
         if explainer:
+            prefetcher.cancel(keep=("fix",))
             print("\nSuggested fix:\n")
-            print(explainer.suggest_fix(error))
+            render_stream(prefetcher.stream("fix"))
         else:
+            from .source import attach_source_context, render_context
+            if error.context is None:
+                attach_source_context(error)
             print(f"\n# Check line {error.line_number} in {error.filename}")
+            listing = render_context(error, 2)
+            if listing:
+                print(f"\n{listing}")
         return 'fix'
-    elif choice == '3':
+    if prefetcher:
+        prefetcher.cancel()
+    if choice == '3':
+        if show_local_answers(error):
+            return 'stackoverflow'
         import urllib.parse
         query = urllib.parse.quote(f"{error.error_type} {error.message[:80]}")
-        url = f"https://stackoverflow.com/search?q={query}&tagged=python"
+        url = f"https://stackoverflow.com/search?q={query}"
+        tag = SO_TAGS.get(error.language)
+        if tag:
+            url += f"&tagged={tag}"
         print(f"\nStack Overflow search:\n{url}")
         try:
             import webbrowser
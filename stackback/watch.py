@@ -0,0 +1,221 @@
+"""`sb watch`: re-run a command whenever the source tree changes.
+
+The tree is polled: each poll is one `os.scandir` walk comparing
+(mtime_ns, size) per file against the previous snapshot, skipping caches,
+VCS and environment directories.  A burst of changes (an editor saving
+several files, a formatter rewriting them) is debounced into one re-run.
+
+The `sb watch` process itself stays up between runs, so the parser, the
+rules, the explanation cache and the pooled LLM connection are warm for
+every run after the first.  Each error is fingerprinted: if it is the one
+already explained (or any error seen earlier in the session), the earlier
+explanation is shown again without a request; only a new error costs an
+LLM call.
+"""
+import os
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .fingerprint import fingerprint
+from .parser import ParsedError
+
+INTERVAL = 0.3
+DEBOUNCE = 0.2
+# Directories never watched: VCS metadata, caches, environments, build output
+IGNORED_DIRS = frozenset((
+    ".git", ".hg", ".svn", "__pycache__", ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox", ".nox",
+    ".venv", "venv", "node_modules", "target", "build", "dist", ".idea", ".vscode",
+))
+# Editor swap and backup files
+IGNORED_SUFFIXES = (".swp", ".swx", ".swo", "~", ".tmp", ".pyc")
+
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def snapshot(roots: Iterable[str]) -> Snapshot:
+    """(mtime_ns, size) of every watched file under `roots`."""
+    files: Snapshot = {}
+    stack = [os.path.abspath(root) for root in roots]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                name = entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if name not in IGNORED_DIRS and not name.endswith(".egg-info"):
+                            stack.append(entry.path)
+                    elif not name.endswith(IGNORED_SUFFIXES) and not name.startswith(".#"):
+                        st = entry.stat()
+                        files[entry.path] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    continue  # removed while walking
+    return files
+
+
+def changes(old: Snapshot, new: Snapshot) -> List[str]:
+    """Paths added, removed or modified between two snapshots."""
+    changed = [path for path, stamp in new.items() if old.get(path) != stamp]
+    changed.extend(path for path in old if path not in new)
+    return sorted(changed)
+
+
+class Watcher:
+    """Polls `roots` and reports debounced batches of changed files."""
+
+    def __init__(self, roots: Iterable[str], interval: float = INTERVAL, debounce: float = DEBOUNCE):
+        self.roots = list(roots)
+        self.interval = interval
+        self.debounce = debounce
+        self.state = snapshot(self.roots)
+
+    def rebase(self) -> None:
+        """Forget changes made so far (e.g. files the command itself wrote)."""
+        self.state = snapshot(self.roots)
+
+    def poll(self) -> List[str]:
+        current = snapshot(self.roots)
+        changed = changes(self.state, current)
+        self.state = current
+        return changed
+
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        """Block until files change and then stay quiet for `debounce` seconds.
+
+        Returns the changed paths, or [] if `timeout` passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending: List[str] = []
+        quiet_since = 0.0
+        while True:
+            changed = self.poll()
+            now = time.monotonic()
+            if changed:
+                pending.extend(path for path in changed if path not in pending)
+                quiet_since = now
+            elif pending and now - quiet_since >= self.debounce:
+                return pending
+            if not pending and deadline is not None and now >= deadline:
+                return []
+            time.sleep(min(self.interval, self.debounce / 2) if pending else self.interval)
+
+
+class Session:
+    """What the previous runs found: the last fingerprint and every explanation so far."""
+
+    def __init__(self, explainer=None):
+        self.explainer = explainer
+        self.previous: Optional[str] = None
+        self.answers: Dict[str, str] = {}
+        self.requests = 0
+
+    def classify(self, error: Optional[ParsedError]) -> str:
+        """"fixed", "clean", "same", "seen" (earlier in the session) or "new"."""
+        if error is None:
+            status = "fixed" if self.previous else "clean"
+            self.previous = None
+            return status
+        key = fingerprint(error)
+        if key == self.previous:
+            status = "same"
+        elif key in self.answers:
+            status = "seen"
+        else:
+            status = "new"
+        self.previous = key
+        return status
+
+    def explain(self, error: ParsedError, render: Callable) -> Optional[str]:
+        """The explanation for `error`: reused if known, else streamed through `render`."""
+        key = fingerprint(error)
+        if key in self.answers:
+            return self.answers[key]
+        if self.explainer is None:
+            return None
+        self.requests += 1
+        text = render(self.explainer.explain_stream(error))
+        if text:
+            self.answers[key] = text
+        return text
+
+
+def run_once(command: List[str]):
+    """Run the command once; (RunResult, ParsedError or None)."""
+    from .languages import registry
+    from .main import _reports_on_stdout
+    from .parser import parse_error
+    from .runner import stream_command
+
+    result = stream_command(command, capture_stdout=_reports_on_stdout(command))
+    error = result.error
+    text = result.output_text
+    if error is None or registry.classify(text):
+        error = parse_error(text) or error
+    return result, error
+
+
+def watch(
+    command: List[str],
+    roots: Iterable[str] = (".",),
+    explainer=None,
+    interval: float = INTERVAL,
+    debounce: float = DEBOUNCE,
+    clear: bool = False,
+    max_runs: Optional[int] = None,
+) -> Session:
+    """Run `command`, then re-run it after every debounced change under `roots`.
+
+    Runs until interrupted (or `max_runs` runs) and returns the session.
+    FileNotFoundError from the first run means the command does not exist.
+    """
+    from .history import record
+    from .tui import render_stream, show_error_header
+
+    session = Session(explainer)
+    if explainer is not None and hasattr(explainer, "warm"):
+        explainer.warm()  # a local model loads while the first run executes
+    watcher = Watcher(roots, interval, debounce)
+    runs = 0
+    changed: List[str] = []
+    while True:
+        if clear and sys.stdout.isatty():
+            print("\033[2J\033[H", end="")
+        if changed:
+            shown = ", ".join(os.path.relpath(path) for path in changed[:3])
+            more = f" and {len(changed) - 3} more" if len(changed) > 3 else ""
+            print(f"\n── changed: {shown}{more}")
+        print(f"── running: {' '.join(command)}\n", flush=True)
+        started = time.perf_counter()
+        result, error = run_once(command)
+        elapsed = time.perf_counter() - started
+        status = session.classify(error)
+        runs += 1
+        if error is not None:
+            record(error, command, result.returncode)
+        if error is None:
+            note = "error fixed, " if status == "fixed" else ""
+            mark = "✓" if result.returncode == 0 else "✗ no traceback recognised,"
+            print(f"\n{mark} {note}exit {result.returncode} in {elapsed:.2f} s")
+        else:
+            show_error_header(error)
+            if status in ("same", "seen"):
+                label = "Same error as the last run" if status == "same" else "Seen earlier in this session"
+                answer = session.answers.get(fingerprint(error))
+                if answer:
+                    print(f"{label}; explanation from then:\n\n{answer}")
+                else:
+                    print(f"{label}.")
+            elif explainer is not None:
+                print("Explanation:\n")
+                session.explain(error, render_stream)
+        if max_runs is not None and runs >= max_runs:
+            return session
+        print(f"\n── watching {', '.join(watcher.roots)} (Ctrl-C to stop)", flush=True)
+        # Files the command wrote while running are not a reason to re-run
+        watcher.rebase()
+        changed = watcher.wait()
@@ -0,0 +1,118 @@
+import sys
+import time
+
+import pytest
+
+from stackback.autofix import candidate_patches, try_fixes
+from stackback.llm import LLMExplainer
+from stackback.parser import parse_error
+from stackback.rules import engine
+from stackback.tui import run_interactive
+
+APP = """import json
+
+
+def load(config):
+    host = config['host']
+    return host
+
+
+print(load({"hostname": "db"}))
+"""
+
+
+def _project(tmp_path, monkeypatch, source=APP):
+    (tmp_path / "app.py").write_text(source)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "x.txt").write_text("x")
+    monkeypatch.chdir(tmp_path)
+    error = parse_error(
+        "Traceback (most recent call last):\n"
+        f'  File "{tmp_path / "app.py"}", line 9, in <module>\n'
+        '    print(load({"hostname": "db"}))\n'
+        f'  File "{tmp_path / "app.py"}", line 5, in load\n'
+        "    host = config['host']\n"
+        "KeyError: 'host'\n"
+    )
+    return error, [sys.executable, "app.py"]
+
+
+def test_snippets_become_patches(tmp_path, monkeypatch):
+    error, _ = _project(tmp_path, monkeypatch)
+    [line] = candidate_patches(error, "host = config.get('hostname')")
+    assert line.label == "replace line 5"
+    assert "    host = config.get('hostname')\n" in line.text
+    assert "-    host = config['host']\n+    host = config.get('hostname')" in line.diff(str(tmp_path))
+
+    patches = candidate_patches(error, "Use this:\n```python\ndef load(config):\n    return config.get('host')\n```")
+    assert patches[0].label == "replace load (lines 4-6)"
+    assert "def load(config):\n    return config.get('host')\n\n\nprint" in patches[0].text
+
+    [imports] = candidate_patches(error, "import os")
+    assert imports.label == "add import" and imports.text.startswith("import json\nimport os\n")
+    assert candidate_patches(error, "# Fix for KeyError\n# Check: 'host'") == []
+
+
+def test_first_passing_fix_wins_and_nothing_changes_until_applied(tmp_path, monkeypatch):
+    error, command = _project(tmp_path, monkeypatch)
+    bad = candidate_patches(error, "host = config['port']")
+    good = candidate_patches(error, "host = config.get('hostname')")
+    result = try_fixes(bad + good, command, jobs=1)
+    assert [a.passed for a in result.attempts] == [False, True]
+    assert result.attempts[0].error.error_type == "KeyError"
+    assert result.winner.patch is good[0]
+    assert (tmp_path / "app.py").read_text() == APP
+    assert not list(tmp_path.glob("*.tmp"))
+    result.winner.patch.apply()
+    assert "config.get('hostname')" in (tmp_path / "app.py").read_text()
+    # A stale patch is refused
+    with pytest.raises(RuntimeError):
+        bad[0].apply()
+
+
+def test_parallel_candidates_stop_when_one_passes(tmp_path, monkeypatch):
+    error, command = _project(tmp_path, monkeypatch, APP.replace("import json", "import json\nimport time"))
+    error = parse_error(error.traceback.replace("line 5", "line 6").replace("line 9", "line 10"))
+    slow = candidate_patches(error, "time.sleep(30)")
+    good = candidate_patches(error, "host = config.get('hostname')")
+    started = time.perf_counter()
+    result = try_fixes(slow + good, command, jobs=2)
+    assert result.winner.patch is good[0]
+    assert time.perf_counter() - started < 10
+    assert any(a.cancelled for a in result.attempts)
+
+
+def test_menu_applies_verified_fix(tmp_path, monkeypatch, capsys):
+    error, command = _project(tmp_path, monkeypatch)
+    answers = iter(["5", "y"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    # The built-in KeyError rule suggests config.get('host'), which runs cleanly
+    assert run_interactive(error, command=command) == "apply"
+    out = capsys.readouterr().out
+    assert "[5] Apply fix" in out and "passed" in out and "Applied." in out
+    assert "host = config.get('host')" in (tmp_path / "app.py").read_text()
+
+
+def test_menu_reuses_the_explainers_rule_answer(tmp_path, monkeypatch, capsys):
+    error, command = _project(tmp_path, monkeypatch)
+    answers = iter(["5", "y"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    explainer = LLMExplainer(api_key="", provider="mock", cache=False)
+    lookups = engine.lookups
+    assert run_interactive(error, explainer, command=command) == "apply"
+    assert engine.lookups == lookups + 1
+
+
+def test_candidates_cannot_write_to_the_real_repository(tmp_path, monkeypatch):
+    error, command = _project(tmp_path, monkeypatch)
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    before = sorted((str(p), p.read_bytes()) for p in tmp_path.rglob("*") if p.is_file())
+    writes = candidate_patches(
+        error,
+        "host = __import__('os').makedirs('.git', exist_ok=True) or open('.git/HEAD', 'w').write('x')"
+        " and open('data/x.txt', 'w').write('y') and config.get('hostname')",
+    )
+    result = try_fixes(writes, command, jobs=1)
+    assert result.winner is not None
+    assert sorted((str(p), p.read_bytes()) for p in tmp_path.rglob("*") if p.is_file()) == before
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from stackback.batch import RateLimiter, explain_many
+from stackback.llm import LLMExplainer
+from stackback.parser import ParsedError
+
+
+class SlowExplainer:
+    """Fake explainer that tracks how many calls overlap."""
+
+    provider = "mock"
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def explain(self, error):
+        with self._lock:
+            self.calls.append(error.message)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return f"about {error.message}"
+
+    suggest_fix = explain
+
+
+def _errors(messages):
+    return [ParsedError("KeyError", m, "app.py", 3, frames=()) for m in messages]
+
+
+def test_duplicates_share_one_request():
+    explainer = SlowExplainer()
+    errors = _errors(["'a'", "'b'", "'a'", "'c'", "'b'", "'a'"])
+    results = explain_many(errors, explainer)
+    assert results == ["about 'a'", "about 'b'", "about 'a'", "about 'c'", "about 'b'", "about 'a'"]
+    assert sorted(explainer.calls) == ["'a'", "'b'", "'c'"]
+
+
+def test_concurrency_is_bounded_and_used():
+    explainer = SlowExplainer(delay=0.1)
+    started = time.perf_counter()
+    explain_many(_errors([f"'k{i}'" for i in range(8)]), explainer, concurrency=4)
+    assert explainer.peak == 4
+    assert time.perf_counter() - started < 0.6  # 8 serial calls would take 0.8 s
+
+
+def test_rate_limit_spaces_requests():
+    explainer = SlowExplainer(delay=0)
+    started = time.perf_counter()
+    explain_many(_errors([f"'k{i}'" for i in range(5)]), explainer, concurrency=1, rate_limit=20)
+    assert time.perf_counter() - started >= 0.18  # 4 waits of 50 ms after the first
+
+
+def test_cached_answers_skip_the_request(tmp_path):
+    from stackback.cache import ExplanationCache
+
+    explainer = LLMExplainer(api_key="sk-fake", cache=ExplanationCache(str(tmp_path / "c.db")))
+    errors = _errors(["'a'", "'b'"])
+    explainer._store(errors[0], "explain", "from cache")
+    seen = []
+    explainer.explain = lambda error: "fresh"
+    results = explainer.explain_many(errors, on_result=lambda error, text: seen.append(text))
+    assert results == ["from cache", "fresh"]
+    assert sorted(seen) == ["fresh", "from cache"]
+
+
+def test_rate_limiter_bursts_then_waits():
+    import asyncio
+
+    async def run():
+        limiter = RateLimiter(rate=10, burst=3)
+        started = time.monotonic()
+        for _ in range(4):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    assert 0.08 <= asyncio.run(run()) < 0.3
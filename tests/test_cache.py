@@ -0,0 +1,79 @@
+"""Tests for error fingerprints and the on-disk explanation cache."""
+import multiprocessing
+import time
+from unittest.mock import MagicMock, patch
+
+from stackback.cache import ExplanationCache
+from stackback.fingerprint import fingerprint, normalize_message
+from stackback.llm import LLMExplainer
+from stackback.parser import parse_error
+
+TRACEBACK = '''Traceback (most recent call last):
+  File "/home/alice/app/app.py", line {line}, in <module>
+    name = config["database"]["host"]
+  File "/home/alice/app/config.py", line 3, in load
+    return data[key]
+KeyError: {key}'''
+
+
+def test_normalize_message_masks_volatile_values():
+    message = "<Foo object at 0x7f3a2b1c> failed after 3.5s for id 8c5f0d4e-1b2a-4c3d-9e8f-0a1b2c3d4e5f"
+    assert normalize_message(message) == "<Foo object at <addr>> failed after <n>s for id <uuid>"
+
+
+def test_fingerprint_ignores_line_numbers_and_home_dir():
+    a = parse_error(TRACEBACK.format(line=15, key="'host'"))
+    b = parse_error(TRACEBACK.format(line=19, key="'host'").replace("/home/alice", "/builds/ci"))
+    c = parse_error(TRACEBACK.format(line=15, key="'port'"))
+    assert fingerprint(a) == fingerprint(b)
+    assert fingerprint(a) != fingerprint(c)
+
+
+def test_cache_roundtrip_and_ttl(tmp_path):
+    cache = ExplanationCache(str(tmp_path / "c.db"), ttl=60)
+    assert cache.get("k", "explain") is None
+    cache.put("k", "explain", "because")
+    assert cache.get("k", "explain") == "because"
+    assert cache.get("k", "fix") is None
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.get("k", "explain") is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ExplanationCache(str(tmp_path / "c.db"), max_entries=3)
+    for key in "abc":
+        cache.put(key, "explain", key)
+        time.sleep(0.01)
+    assert cache.get("a", "explain") == "a"  # touch a so b is the oldest
+    cache.put("d", "explain", "d")
+    assert len(cache) == 3
+    assert cache.get("b", "explain") is None
+    assert cache.get("a", "explain") == "a"
+
+
+def _writer(path, worker):
+    cache = ExplanationCache(path)
+    for i in range(50):
+        cache.put(f"{worker}-{i}", "explain", "x")
+
+
+def test_cache_concurrent_processes(tmp_path):
+    path = str(tmp_path / "c.db")
+    procs = [multiprocessing.Process(target=_writer, args=(path, w)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert len(ExplanationCache(path)) == 200
+
+
+def test_explainer_serves_repeat_from_cache(tmp_path):
+    explainer = LLMExplainer(api_key="sk-fake", cache=ExplanationCache(str(tmp_path / "c.db")))
+    client = MagicMock()
+    client.stream.side_effect = lambda prompt, max_tokens: iter(["cached answer"])
+    error = parse_error(TRACEBACK.format(line=15, key="'host'"))
+    with patch.object(explainer, "_get_client", return_value=client):
+        assert explainer.explain(error) == "cached answer"
+        assert explainer.explain(parse_error(TRACEBACK.format(line=16, key="'host'"))) == "cached answer"
+    assert client.stream.call_count == 1
@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from stackback.client import LLMClient, LLMError
+from stackback.llm import LLMExplainer
+from stackback.parser import ParsedError
+
+
+def _sse(events):
+    return "".join(f"data: {json.dumps(e)}\n\n" for e in events)
+
+
+RESPONSES = {
+    "/v1/chat/completions": (
+        "text/event-stream",
+        _sse([{"choices": [{"delta": {"content": "Hello "}}]}, {"choices": [{"delta": {"content": "there"}}]}])
+        + "data: [DONE]\n\n",
+    ),
+    "/v1/messages": (
+        "text/event-stream",
+        "event: message_start\n" + _sse([{"type": "message_start"}])
+        + _sse([{"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hello "}},
+                {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "there"}},
+                {"type": "message_stop"}]),
+    ),
+    "/v1beta/models/gemini-1.5-flash:streamGenerateContent": (
+        "text/event-stream",
+        _sse([{"candidates": [{"content": {"parts": [{"text": "Hello "}]}}]},
+              {"candidates": [{"content": {"parts": [{"text": "there"}]}}]}]),
+    ),
+    "/api/chat": (
+        "application/x-ndjson",
+        json.dumps({"message": {"content": "Hello "}, "done": False}) + "\n"
+        + json.dumps({"message": {"content": "there"}, "done": False}) + "\n"
+        + json.dumps({"done": True}) + "\n",
+    ),
+    "/api/generate": ("application/json", json.dumps({"response": "", "done": True})),
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.requests.append((self.path, dict(self.headers), body, self.client_address[1]))
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        if server.failures:
+            status = server.failures.pop(0)
+            payload = json.dumps({"error": {"message": "overloaded"}}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", "0")
+        else:
+            content_type, text = RESPONSES[self.path.split("?")[0]]
+            payload = text.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.flush()
+        time.sleep(server.stall)  # headers sent, first token late
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests, server.failures = [], []
+    server.delay, server.stall, server.active, server.peak, server.lock = 0.0, 0.0, 0, 0, threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("provider, base", [
+    ("openai", "/v1"), ("claude", ""), ("gemini", ""), ("ollama", ""),
+])
+def test_every_provider_streams_from_stub(stub, provider, base):
+    client = LLMClient(provider, api_key="k", base_url=stub.url + base)
+    assert list(client.stream("why?", max_tokens=50)) == ["Hello ", "there"]
+    path, headers, body, _ = stub.requests[0]
+    assert "why?" in json.dumps(body)
+
+
+def test_provider_auth_headers(stub):
+    LLMClient("openai", api_key="sk-1", base_url=stub.url + "/v1").complete("q")
+    LLMClient("claude", api_key="sk-2", base_url=stub.url).complete("q")
+    assert stub.requests[0][1]["Authorization"] == "Bearer sk-1"
+    assert stub.requests[1][1]["x-api-key"] == "sk-2"
+    assert stub.requests[1][1]["anthropic-version"]
+
+
+def test_connection_is_reused_across_clients(stub):
+    for _ in range(3):
+        assert LLMClient("ollama", base_url=stub.url).complete("q") == "Hello there"
+    assert len({port for *_, port in stub.requests}) == 1
+
+
+def test_retries_with_backoff_then_succeeds(stub):
+    stub.failures = [503, 429]
+    client = LLMClient("openai", api_key="k", base_url=stub.url + "/v1", retries=2, backoff=0)
+    assert client.complete("q") == "Hello there"
+    assert len(stub.requests) == 3
+
+
+def test_gives_up_after_retries_and_on_client_errors(stub):
+    stub.failures = [503, 503]
+    client = LLMClient("openai", api_key="k", base_url=stub.url + "/v1", retries=1, backoff=0)
+    with pytest.raises(LLMError) as info:
+        client.complete("q")
+    assert info.value.status == 503
+    assert "overloaded" in str(info.value)
+
+    stub.failures = [401]
+    with pytest.raises(LLMError):
+        client.complete("q")
+    assert len(stub.requests) == 3  # 401 is not retried
+
+
+def test_unreachable_server_raises_llm_error():
+    client = LLMClient("ollama", base_url="http://127.0.0.1:9", retries=0, timeout=(0.5, 0.5))
+    with pytest.raises(LLMError):
+        client.complete("q")
+
+
+def test_explainer_uses_any_provider(stub, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", stub.url)
+    explainer = LLMExplainer(api_key="sk-ant", provider="claude", cache=False)
+    error = ParsedError("KeyError", "'host'", "app.py", 15, "Traceback...")
+    assert explainer.explain(error) == "Hello there"
+    assert stub.requests[0][2]["model"] == explainer.model
+
+
+def test_ollama_keeps_the_model_loaded_and_warms_it(stub, monkeypatch):
+    monkeypatch.setenv("OLLAMA_KEEP_ALIVE", "1h")
+    client = LLMClient("ollama", base_url=stub.url)
+    assert client.warm() is True
+    assert stub.requests[0][0] == "/api/generate"
+    assert stub.requests[0][2] == {"model": client.model, "keep_alive": "1h"}
+    client.complete("q")
+    assert stub.requests[1][2]["keep_alive"] == "1h"
+
+    monkeypatch.setenv("OLLAMA_KEEP_ALIVE", "-1")
+    client.complete("q")
+    assert stub.requests[2][2]["keep_alive"] == -1
+    assert LLMClient("openai", api_key="k", base_url=stub.url + "/v1").warm() is False
+    assert len(stub.requests) == 3
+
+    monkeypatch.setenv("OLLAMA_HOST", stub.url)
+    LLMExplainer(provider="ollama", cache=False).warm().join(5)
+    assert stub.requests[3][0] == "/api/generate"
+
+
+def test_simultaneous_ollama_requests_are_admitted_in_server_sized_batches(stub, monkeypatch):
+    monkeypatch.setenv("OLLAMA_NUM_PARALLEL", "2")
+    stub.delay = 0.1
+    answers = []
+    threads = [
+        threading.Thread(target=lambda: answers.append(LLMClient("ollama", base_url=stub.url).complete("q")))
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert answers == ["Hello there"] * 6
+    assert stub.peak == 2
+
+
+def test_abort_stops_a_stream_waiting_for_its_first_token(stub):
+    stub.stall = 5
+    client = LLMClient("ollama", base_url=stub.url, retries=0)
+    opened, tokens = [], []
+
+    def run():
+        try:
+            tokens.extend(client.stream("q", on_open=opened.append))
+        except LLMError:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if opened:
+            break
+        time.sleep(0.02)
+    started = time.perf_counter()
+    LLMClient.abort(opened[0])
+    thread.join(2)
+    assert not thread.is_alive() and tokens == []
+    assert time.perf_counter() - started < 1
@@ -0,0 +1,94 @@
+from stackback.compact import compact_frames, compact_traceback, estimate_tokens
+from stackback.llm import LLMExplainer
+from stackback.parser import Frame, ParsedError, parse_error
+
+
+def _error(frames, message="boom", error_type="ValueError"):
+    return ParsedError(error_type, message, frames=tuple(frames))
+
+
+def _user(i):
+    return Frame(f"/srv/app/module_{i}.py", 10 + i, f"handler_{i}", f"return stage_{i}(request)")
+
+
+def test_short_traceback_is_unchanged():
+    error = _error([_user(0)])
+    assert compact_traceback(error) == error.traceback
+
+
+def test_deep_stack_keeps_innermost_frame_and_exception_line():
+    error = _error([_user(i) for i in range(200)], message="bad input")
+    text = compact_traceback(error, budget_tokens=200)
+    assert estimate_tokens(text) <= 200
+    assert text.endswith("ValueError: bad input")
+    assert "handler_199" in text
+    assert "handler_0," not in text
+    assert "outer entries omitted" in text
+    # A plain character cut keeps the outer frames and loses the rest
+    assert "bad input" not in error.traceback[:800]
+
+
+def test_library_runs_are_collapsed():
+    lib = "/usr/lib/python3.11/site-packages/requests/sessions.py"
+    frames = [_user(0)] + [Frame(lib, n, "send") for n in range(5)] + [_user(1), Frame(lib, 99, "raise_for_status")]
+    lines = compact_frames(frames)
+    assert lines[1] == "  [5 library frames omitted: requests]"
+    # The innermost frame is shown even though it is library code
+    assert "raise_for_status" in lines[-1]
+
+
+def test_recursion_cycles_are_collapsed():
+    cycle = [Frame("/srv/app/tree.py", 5, "visit"), Frame("/srv/app/tree.py", 9, "walk")]
+    error = _error([_user(0)] + cycle * 400, "maximum recursion depth exceeded", "RecursionError")
+    text = compact_traceback(error, budget_tokens=100)
+    assert "[Previous 2 frames repeated 399 more times]" in text
+    assert text.count("in visit") == 1
+    assert text.endswith("RecursionError: maximum recursion depth exceeded")
+
+
+def test_cause_is_included_when_room_is_left():
+    cause = _error([_user(i) for i in range(3)], "missing key", "KeyError")
+    error = _error([_user(i) for i in range(100)], "lookup failed")
+    error.cause, error.cause_kind = cause, "cause"
+    text = compact_traceback(error, budget_tokens=400)
+    assert "KeyError: missing key" in text
+    assert "direct cause" in text
+    assert text.endswith("ValueError: lookup failed")
+
+
+def test_chained_cause_is_kept_when_everything_fits():
+    error = parse_error(
+        "Traceback (most recent call last):\n  File \"a.py\", line 2, in <module>\n    d['k']\nKeyError: 'k'\n\n"
+        "During handling of the above exception, another exception occurred:\n\n"
+        "Traceback (most recent call last):\n  File \"a.py\", line 4, in <module>\n    raise ValueError('v')\n"
+        "ValueError: v\n"
+    )
+    text = compact_traceback(error, budget_tokens=10000)
+    assert text.index("KeyError: 'k'") < text.index("During handling") < text.index("ValueError: v")
+    assert text.endswith(error.traceback)
+
+
+def test_other_languages_keep_their_own_format():
+    node = parse_error("TypeError: Cannot read properties of undefined (reading 'host')\n"
+                       + "".join(f"    at fn{i} (/app/m{i}.js:{i + 1}:3)\n" for i in range(300)))
+    text = compact_traceback(node, budget_tokens=100)
+    assert estimate_tokens(text) <= 100
+    assert "Traceback" not in text and 'File "' not in text
+    assert text.startswith("TypeError: Cannot read properties") and "    at fn0 (/app/m0.js:1:3)" in text
+    assert text.endswith("lines omitted ...]")
+
+    java = parse_error('Exception in thread "main" java.lang.IllegalStateException: could not load config\n'
+                       + "".join(f"\tat com.example.C{i}.m(C{i}.java:{i + 1})\n" for i in range(200))
+                       + "Caused by: java.lang.NullPointerException: s is null\n"
+                       + "".join(f"\tat com.example.D{i}.m(D{i}.java:{i + 1})\n" for i in range(200)))
+    text = compact_traceback(java, budget_tokens=120)
+    assert estimate_tokens(text) <= 120
+    assert "\tat com.example.C0.m(C0.java:1)" in text
+    assert "Caused by: java.lang.NullPointerException: s is null\n\tat com.example.D0.m(D0.java:1)" in text
+
+
+def test_prompt_uses_compacted_traceback():
+    error = _error([_user(i) for i in range(300)], "bad input")
+    prompt = LLMExplainer(api_key=None, cache=False, budget_tokens=150)._build_prompt(error)
+    assert "ValueError: bad input" in prompt
+    assert "handler_299" in prompt
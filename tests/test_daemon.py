@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+from stackback.daemon import DaemonServer, RemoteExplainer, connect
+from stackback.prefetch import Prefetcher
+
+TRACEBACK = """Traceback (most recent call last):
+  File "/srv/app/main.py", line 15, in load
+    host = config['host']
+KeyError: 'host'
+"""
+
+
+class CountingExplainer:
+    """Slow fake explainer that records how often it is asked."""
+
+    def __init__(self, combined=True, **options):
+        self.combined = combined
+        self.options = options
+        self.calls = []
+
+    def _slow(self, kind, words):
+        self.calls.append(kind)
+        for word in words:
+            time.sleep(0.05)
+            yield word
+
+    def explain_stream(self, error):
+        return self._slow("explain", ["The ", "key ", f"{error.message} ", "is missing."])
+
+    def suggest_fix_stream(self, error):
+        return self._slow("fix", ["config.get(", "'host')"])
+
+    def explain_and_fix_stream(self, error, want=None):
+        self.calls.append("both")
+        yield "explain", "Missing key."
+        yield "fix", "config.get('host')"
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    made = []
+
+    def factory(**options):
+        made.append(CountingExplainer(**options))
+        return made[-1]
+
+    server = DaemonServer(str(tmp_path / "sb.sock"), idle_timeout=0, make_explainer=factory)
+    server.made = made
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.server.shutdown()
+    thread.join(2)
+
+
+def test_connect_without_daemon_returns_none(tmp_path):
+    assert connect(str(tmp_path / "missing.sock")) is None
+
+
+def test_connect_can_be_disabled(daemon, monkeypatch):
+    monkeypatch.setenv("STACKBACK_DAEMON", "0")
+    assert connect(daemon.path) is None
+
+
+def test_parse_and_explain_through_daemon(daemon):
+    client = connect(daemon.path)
+    error = client.parse("noise\n" + TRACEBACK)
+    assert error.error_type == "KeyError"
+    assert error.frames[0].function == "load"
+
+    explainer = RemoteExplainer(client, {"provider": "mock", "combined": False}, rules=False)
+    assert explainer.explain(error) == "The key 'host' is missing."
+    assert explainer.suggest_fix(error) == "config.get('host')"
+    # One warm explainer serves every request with the same options
+    assert len(daemon.made) == 1
+    assert daemon.made[0].options == {"provider": "mock", "no_rules": True}
+
+
+def test_identical_requests_are_coalesced(daemon):
+    client = connect(daemon.path)
+    error = client.parse(TRACEBACK)
+    explainer = RemoteExplainer(client, {"provider": "mock"}, rules=False)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(explainer.explain(error))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["The key 'host' is missing."] * 3
+    assert daemon.made[0].calls == ["explain"]
+    assert client.ping()["coalesced"] == 2
+
+
+def test_prefetcher_works_with_remote_explainer(daemon):
+    client = connect(daemon.path)
+    error = client.parse(TRACEBACK)
+    explainer = RemoteExplainer(client, {"provider": "mock", "combined": True}, rules=False)
+    prefetcher = Prefetcher(explainer, error, kinds=("explain", "fix")).start()
+    assert "".join(prefetcher.stream("fix")) == "config.get('host')"
+    assert "".join(prefetcher.stream("explain")) == "Missing key."
+    assert daemon.made[0].calls == ["both"]
+
+
+def test_shutdown_removes_socket(daemon):
+    connect(daemon.path).shutdown()
+    deadline = time.monotonic() + 2
+    while connect(daemon.path) is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert connect(daemon.path) is None
+
+
+def test_api_key_is_not_sent_to_daemon(daemon):
+    client = connect(daemon.path)
+    explainer = RemoteExplainer(client, {"provider": "mock", "api_key": "sk-secret"}, rules=False)
+    explainer.explain(client.parse(TRACEBACK))
+    assert daemon.made[0].options == {"provider": "mock", "no_rules": True}
+
+
+def test_socket_directory_must_be_private(tmp_path, daemon):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    shared.chmod(0o777)
+    with pytest.raises(RuntimeError, match="refusing"):
+        DaemonServer(str(shared / "sb.sock"), idle_timeout=0, make_explainer=CountingExplainer)
+
+    # A listener in a directory others can reach (or behind a symlink) is not used
+    link = tmp_path / "link"
+    link.symlink_to(tmp_path)
+    assert connect(str(link / "sb.sock")) is None
+    tmp_path.chmod(0o755)
+    try:
+        assert connect(daemon.path) is None
+    finally:
+        tmp_path.chmod(0o700)
+    assert connect(daemon.path) is not None
+
+
+def test_source_context_is_read_in_the_clients_directory(daemon, tmp_path, monkeypatch):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "app.py").write_text("config = {}\nhost = config['host']\n")
+    seen = []
+    original = CountingExplainer.explain_stream
+    monkeypatch.setattr(CountingExplainer, "explain_stream",
+                        lambda self, error: seen.append(error.context) or original(self, error))
+
+    # The daemon was started elsewhere; the client runs in the project
+    monkeypatch.chdir(project)
+    client = connect(daemon.path)
+    error = client.parse('Traceback (most recent call last):\n  File "app.py", line 2, in <module>\n'
+                         "    host = config['host']\nKeyError: 'host'\n")
+    RemoteExplainer(client, {"provider": "mock", "combined": False}, rules=False).explain(error)
+    assert seen == [{0: (1, ("config = {}", "host = config['host']"))}]
+
+
+def test_rules_run_in_the_clients_directory(daemon, tmp_path, monkeypatch):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "data.csv").write_text("a,b\n")
+    monkeypatch.chdir(project)
+    client = connect(daemon.path)
+    error = client.parse('Traceback (most recent call last):\n  File "/srv/app/main.py", line 3, in main\n'
+                         "    open('dta.csv')\nFileNotFoundError: [Errno 2] No such file or directory: 'dta.csv'\n")
+    explainer = RemoteExplainer(client, {"provider": "mock"})
+    assert "'data.csv'" in explainer.explain(error)
+    assert explainer.suggest_fix(error) == "'data.csv'"
+    # Answered here, without a request; the daemon itself never runs the rules
+    assert daemon.made == []
+    RemoteExplainer(client, {"provider": "mock", "no_rules": True}).explain(error)
+    assert daemon.made[0].options == {"provider": "mock", "no_rules": True}
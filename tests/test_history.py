@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from stackback import history
+from stackback.history import History, compact, export, record
+from stackback.parser import parse_error
+
+
+def _error(n: int):
+    return parse_error(
+        f'Traceback (most recent call last):\n  File "/app/mod{n}.py", line 3, in <module>\n'
+        f'    main()\nKeyError: \'key{n}\'\n'
+    )
+
+
+def _fill(directory, kinds, start=1000.0):
+    for i, kind in enumerate(kinds):
+        assert record(_error(kind), ["python", f"job{kind}.py"], 1, str(directory), ts=start + i)
+
+
+def test_uncompacted_log_is_queryable(tmp_path):
+    _fill(tmp_path, [0, 1, 0, 2, 0])
+    with History(str(tmp_path)) as runs:
+        assert len(runs) == 5
+        (first, count), *_ = runs.top(3)
+        assert (first.message, count, first.first, first.first_command) == ("'key0'", 3, 1000, "python job0.py")
+        assert [row["message"] for row in runs.recent(2)] == ["'key2'", "'key0'"]
+        assert runs.error(first.fingerprint[:6]) is first
+        assert runs.error("nope") is None
+
+
+def test_compaction_keeps_every_row_and_merges_segments(tmp_path):
+    _fill(tmp_path, [0, 1, 0, 2, 0])
+    with History(str(tmp_path)) as runs:
+        before = list(runs.rows())
+    assert compact(str(tmp_path)) == 5
+    _fill(tmp_path, [1, 1, 3], start=1003.5)  # overlaps the first segment in time
+    assert compact(str(tmp_path)) == 3
+    assert compact(str(tmp_path)) == 0
+    files = sorted(os.listdir(tmp_path))
+    assert files == ["index.json", "lock", "segment-000003.sbh"]  # the two segments were merged
+
+    with History(str(tmp_path)) as runs:
+        rows = list(runs.rows())
+        assert [row["ts"] for row in rows] == sorted(row["ts"] for row in rows) and len(rows) == 8
+        assert [row for row in rows if row["ts"] in (1000, 1001, 1002, 1003, 1004)] == before
+        assert [(stats.message, count) for stats, count in runs.top(2)] == [("'key0'", 3), ("'key1'", 3)]
+        assert runs.error(runs.top(1)[0][0].fingerprint).last == 1004
+
+
+def test_windowed_top_and_trend(tmp_path):
+    _fill(tmp_path, [0] * 6 + [1] * 4)
+    compact(str(tmp_path))
+    _fill(tmp_path, [1, 1], start=1010)
+    with History(str(tmp_path)) as runs:
+        one = runs.top(2)[1][0]
+        assert [(stats.message, count) for stats, count in runs.top(2, since=1005)] == [("'key1'", 6), ("'key0'", 1)]
+        assert runs.trend(1000, 1012, 3) == [4, 4, 4]
+        assert runs.trend(1000, 1012, 3, one.fingerprint) == [0, 2, 4]
+        assert runs.trend(1000, 1012, 3, "ffffffff") == [0, 0, 0]
+
+
+def test_leftover_log_parts_are_not_counted_twice(tmp_path):
+    _fill(tmp_path, [0, 0])
+    compact(str(tmp_path))
+    # A compaction that died after writing the index but before deleting its input
+    index = json.loads((tmp_path / "index.json").read_text())
+    leftover = {"ts": 1000, "fingerprint": index["errors"][0]["fingerprint"], "command": "x", "exit_code": 1}
+    (tmp_path / "log.jsonl.1").write_text(json.dumps(leftover) + "\n")
+    index["ingested"] = ["log.jsonl.1"]
+    (tmp_path / "index.json").write_text(json.dumps(index))
+    assert compact(str(tmp_path)) == 0
+    with History(str(tmp_path)) as runs:
+        assert len(runs) == 2 and runs.top(1)[0][1] == 2
+
+
+def test_log_is_compacted_automatically(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "COMPACT_BYTES", 1000)
+    _fill(tmp_path, [0, 1, 2] * 5)
+    assert any(name.endswith(".sbh") for name in os.listdir(tmp_path))
+    with History(str(tmp_path)) as runs:
+        assert len(runs) == 15
+
+
+def test_export_formats(tmp_path):
+    _fill(tmp_path / "h", [0, 1])
+    with History(str(tmp_path / "h")) as runs:
+        assert export(runs, str(tmp_path / "runs.jsonl")) == 2
+        assert export(runs, str(tmp_path / "runs.csv"), since=1001) == 1
+        with pytest.raises(ValueError):
+            export(runs, str(tmp_path / "runs.xml"))
+    lines = (tmp_path / "runs.jsonl").read_text().splitlines()
+    assert [json.loads(line)["message"] for line in lines] == ["'key0'", "'key1'"]
+    header, row = (tmp_path / "runs.csv").read_text().splitlines()
+    assert header.split(",") == list(history.FIELDS) and "job1.py" in row
+
+
+def test_recording_can_be_turned_off(tmp_path, monkeypatch):
+    monkeypatch.setenv("STACKBACK_HISTORY", "0")
+    assert history.history_dir() is None
+    assert record(_error(0), ["python"], 1) is False
+
+
+def test_failing_runs_are_recorded_and_reported(tmp_path):
+    env = {"STACKBACK_HISTORY": str(tmp_path), "PATH": "/usr/bin:/bin"}
+    code = "import sys; from stackback.main import main; main(sys.argv[1:])"
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", code, "--no-ai", sys.executable, "-c", "raise ValueError('bad value')"],
+                       capture_output=True, stdin=subprocess.DEVNULL, env=env)
+    proc = subprocess.run([sys.executable, "-c", code, "stats", "--json"], capture_output=True, text=True, env=env)
+    (top,) = json.loads(proc.stdout)
+    assert (top["error_type"], top["message"], top["count"]) == ("ValueError", "bad value", 2)
+    assert len(top["daily"]) == 14 and top["daily"][-1] == 2
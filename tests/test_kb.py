@@ -0,0 +1,99 @@
+import json
+
+from stackback.kb import KnowledgeBase, build_index, query_terms, read_source, tokenize
+from stackback.parser import parse_error
+from stackback.tui import run_interactive
+
+NOTES = [
+    {"title": "KeyError when reading config", "body": "config['host'] raises KeyError; use config.get('host').",
+     "url": "https://wiki/keyerror"},
+    {"title": "ModuleNotFoundError: No module named requests", "body": "pip install requests in the venv.",
+     "url": "https://wiki/modules"},
+    {"title": "RecursionError in tree walk", "body": "Use an explicit stack instead of recursion.",
+     "url": "https://wiki/recursion"},
+    {"title": "Connection reset by database", "body": "ConnectionResetError from psycopg2; enable pool_pre_ping.",
+     "url": "https://wiki/db"},
+]
+POSTS = """<?xml version="1.0" encoding="utf-8"?>
+<posts>
+  <row Id="1" PostTypeId="1" AcceptedAnswerId="3" Score="10" Tags="&lt;python&gt;&lt;json&gt;"
+       Title="JSONDecodeError: Expecting value" Body="&lt;p&gt;json.loads fails on an empty string&lt;/p&gt;" />
+  <row Id="2" PostTypeId="2" ParentId="1" Score="50" Body="&lt;p&gt;Popular but wrong&lt;/p&gt;" />
+  <row Id="3" PostTypeId="2" ParentId="1" Score="5" Body="&lt;p&gt;Check the response body is not empty &amp;amp; is JSON&lt;/p&gt;" />
+  <row Id="4" PostTypeId="1" Score="3" Tags="&lt;java&gt;" Title="NullPointerException" Body="&lt;p&gt;npe&lt;/p&gt;" />
+  <row Id="5" PostTypeId="2" ParentId="4" Score="1" Body="&lt;p&gt;check for null&lt;/p&gt;" />
+</posts>
+"""
+TRACEBACK = """Traceback (most recent call last):
+  File "/srv/app/settings.py", line 15, in load_config
+    host = config['host']
+KeyError: 'host'
+"""
+
+
+def _build(tmp_path):
+    notes = tmp_path / "notes.jsonl"
+    notes.write_text("".join(json.dumps(note) + "\n" for note in NOTES))
+    path = str(tmp_path / "kb.idx")
+    assert build_index(read_source(str(notes)), path) == len(NOTES)
+    return path
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("ModuleNotFoundError in load_config") == [
+        "modulenotfounderror", "module", "found", "error", "load_config", "load", "config",
+    ]
+
+
+def test_search_ranks_matching_note_first(tmp_path):
+    kb = KnowledgeBase(_build(tmp_path))
+    assert len(kb) == 4
+    hits = kb.search("No module named requests")
+    assert hits[0].url == "https://wiki/modules"
+    assert kb.search("psycopg2 ConnectionResetError", k=1)[0].title == "Connection reset by database"
+    assert kb.search("zzz unrelated") == []
+    kb.close()
+
+
+def test_search_with_parsed_error(tmp_path):
+    error = parse_error(TRACEBACK)
+    terms = query_terms(error)
+    assert terms["keyerror"] > terms["host"] and "load_config" in terms
+    kb = KnowledgeBase(_build(tmp_path))
+    assert kb.search(error)[0].url == "https://wiki/keyerror"
+    kb.close()
+
+
+def test_stackexchange_dump_uses_accepted_answer(tmp_path):
+    posts = tmp_path / "Posts.xml"
+    posts.write_text(POSTS)
+    docs = list(read_source(str(posts), tag="python"))
+    assert len(docs) == 1
+    assert docs[0]["url"] == "https://stackoverflow.com/questions/1"
+    assert docs[0]["excerpt"] == "Check the response body is not empty & is JSON"
+    path = str(tmp_path / "so.idx")
+    build_index(docs, path)
+    kb = KnowledgeBase(path)
+    assert kb.search("json.decoder.JSONDecodeError: Expecting value")[0].title == "JSONDecodeError: Expecting value"
+    kb.close()
+
+
+def test_menu_shows_local_answers_instead_of_browser(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("STACKBACK_KB", _build(tmp_path))
+    monkeypatch.setattr("builtins.input", lambda prompt: "3")
+    monkeypatch.setattr("webbrowser.open", lambda url: (_ for _ in ()).throw(AssertionError(url)))
+    assert run_interactive(parse_error(TRACEBACK)) == "stackoverflow"
+    out = capsys.readouterr().out
+    assert "KeyError when reading config" in out and "https://wiki/keyerror" in out
+
+
+def test_menu_falls_back_to_search_url_without_index(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("STACKBACK_KB", str(tmp_path / "missing.idx"))
+    monkeypatch.setattr("builtins.input", lambda prompt: "3")
+    opened = []
+    monkeypatch.setattr("webbrowser.open", opened.append)
+    run_interactive(parse_error(TRACEBACK))
+    assert opened and "stackoverflow.com/search" in opened[0] and opened[0].endswith("&tagged=python")
+    run_interactive(parse_error("panic: runtime error: index out of range [3] with length 3\n\n"
+                                "goroutine 1 [running]:\nmain.main()\n\t/app/main.go:8 +0x1d\nexit status 2\n"))
+    assert opened[1].endswith("&tagged=go")
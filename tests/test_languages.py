@@ -0,0 +1,204 @@
+import pytest
+
+from stackback.languages import LanguageParser, Registry, registry
+from stackback.parser import is_error_output, parse_error
+
+NODE = """/app/a.js:1
+function load(cfg) { return cfg.db.host; }
+                                   ^
+
+TypeError: Cannot read properties of undefined (reading 'host')
+    at load (/app/a.js:1:36)
+    at main (/app/a.js:2:26)
+    at Object.<anonymous> (/app/a.js:3:1)
+    at Module._compile (node:internal/modules/cjs/loader:1521:14)
+    at node:internal/main/run_main_module:28:49
+
+Node.js v20.19.5
+"""
+
+NODE_MODULE = """Error: Cannot find module 'leftpad'
+Require stack:
+- /app/b.js
+    at Module._resolveFilename (node:internal/modules/cjs/loader:1207:15)
+    at Object.<anonymous> (/app/b.js:1:11)
+    at Function.executeUserEntryPoint [as runMain] (node:internal/modules/run_main:164:12) {
+  code: 'MODULE_NOT_FOUND',
+  requireStack: [ '/app/b.js' ]
+}
+"""
+
+GO_PANIC = """panic: runtime error: index out of range [5] with length 3
+
+goroutine 1 [running]:
+main.get(...)
+\t/app/main.go:3
+main.main()
+\t/app/main.go:7 +0x18
+exit status 2
+"""
+
+GO_BUILD = """# command-line-arguments
+./main.go:4:2: undefined: fmt
+./main.go:4:14: undefined: x
+"""
+
+RUST_PANIC = """thread 'main' panicked at r.rs:1:42:
+index out of bounds: the len is 3 but the index is 5
+stack backtrace:
+   0: core::panicking::panic_bounds_check
+             at /rustc/1159e78c/library/core/src/panicking.rs:280:5
+   1: r::get
+             at ./r.rs:1:42
+   2: r::main
+             at ./r.rs:2:49
+note: Some details are omitted, run with `RUST_BACKTRACE=full` for a verbose backtrace.
+"""
+
+RUST_COMPILE = """error[E0425]: cannot find value `y` in this scope
+ --> e.rs:1:28
+  |
+1 | fn main() { println!("{}", y); }
+  |                            ^ not found in this scope
+
+error: aborting due to 1 previous error
+"""
+
+JAVA = """Exception in thread "main" java.lang.IllegalStateException: could not load config
+\tat com.example.App.load(App.java:21)
+\tat com.example.App.main(App.java:9)
+Caused by: java.lang.NullPointerException: Cannot invoke "String.length()" because "s" is null
+\tat java.base/java.util.Objects.requireNonNull(Objects.java:209)
+\tat com.example.Config.parse(Config.java:14)
+\t... 1 more
+"""
+
+PYTEST = """=================================== FAILURES ===================================
+___________________________________ test_key ___________________________________
+
+    def test_key():
+>       helper({})
+
+test_x.py:5:
+_ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _ _
+
+d = {}
+
+    def helper(d):
+>       return d["missing"]
+E       KeyError: 'missing'
+
+test_x.py:2: KeyError
+_________________________________ test_assert __________________________________
+
+    def test_assert():
+>       assert 1 + 2 == 4
+E       assert (1 + 2) == 4
+
+test_x.py:8: AssertionError
+=========================== short test summary info ============================
+FAILED test_x.py::test_key - KeyError: 'missing'
+FAILED test_x.py::test_assert - assert (1 + 2) == 4
+"""
+
+PYTHON = """Traceback (most recent call last):
+  File "/app/main.py", line 3, in <module>
+    main()
+ValueError: bad value
+"""
+
+
+@pytest.mark.parametrize("text, language, error_type, message, location", [
+    (NODE, "node", "TypeError", "Cannot read properties of undefined (reading 'host')", ("/app/a.js", 1)),
+    (NODE_MODULE, "node", "Error", "Cannot find module 'leftpad'", ("/app/b.js", 1)),
+    (GO_PANIC, "go", "panic", "runtime error: index out of range [5] with length 3", ("/app/main.go", 3)),
+    (GO_BUILD, "go", "build error", "undefined: fmt", ("./main.go", 4)),
+    (RUST_PANIC, "rust", "panic", "index out of bounds: the len is 3 but the index is 5", ("./r.rs", 1)),
+    (RUST_COMPILE, "rust", "E0425", "cannot find value `y` in this scope", ("e.rs", 1)),
+    (JAVA, "java", "java.lang.IllegalStateException", "could not load config", ("com/example/App.java", 21)),
+    (PYTEST, "python", "KeyError", "'missing'", ("test_x.py", 2)),
+    (PYTHON, "python", "ValueError", "bad value", ("/app/main.py", 3)),
+])
+def test_each_language_is_parsed(text, language, error_type, message, location):
+    error = parse_error(text)
+    assert (error.language, error.error_type, error.message) == (language, error_type, message)
+    assert (error.filename, error.line_number) == location
+    assert is_error_output(text)
+
+
+@pytest.mark.parametrize("text", [
+    "# Results\nall good", "==== build ok ====", "____ summary ____", "FAILED to fetch cache, retrying",
+    "\x1b[31mFAILED to connect", "goroutine pool started", "    at the end of the day", "\tat home",
+    "thread 'main' is fine", "error[E] nothing", "error: nothing happened", "Exception in thread pool: none",
+    "Caused by: weather",
+])
+def test_signature_literals_alone_are_not_errors(text):
+    assert parse_error(text) is None
+    assert not is_error_output(text)
+
+
+def test_frames_are_outermost_first():
+    node = parse_error(NODE)
+    assert [f.function for f in node.frames][-3:] == ["Object.<anonymous>", "main", "load"]
+    assert node.frames[0].is_library and not node.frames[-1].is_library
+
+    rust = parse_error(RUST_PANIC)
+    assert [f.function for f in rust.frames] == ["r::main", "r::get", "core::panicking::panic_bounds_check"]
+
+    go = parse_error(GO_PANIC)
+    assert [(f.function, f.line) for f in go.frames] == [("main.main", 7), ("main.get", 3)]
+
+
+def test_java_cause_chain():
+    error = parse_error(JAVA)
+    assert error.cause_kind == "cause"
+    assert error.cause.error_type == "java.lang.NullPointerException"
+    assert (error.cause.filename, error.cause.line_number) == ("com/example/Config.java", 14)
+    assert error.cause.frames[-1].file == "java.base/java/util/Objects.java"
+    assert error.cause.frames[-1].is_library
+
+
+def test_pytest_sources_and_short_tracebacks():
+    error = parse_error(PYTEST)
+    assert [(f.function, f.source) for f in error.frames] == [
+        ("test_key", "helper({})"), ("helper", 'return d["missing"]')]
+    short = parse_error(
+        "___ test_assert ___\n"
+        "test_x.py:8: in test_assert\n"
+        "    assert 1 + 2 == 4\n"
+        "E   assert (1 + 2) == 4\n"
+        "FAILED test_x.py::test_assert - assert (1 + 2) == 4\n"
+    )
+    assert (short.error_type, short.message, short.line_number) == ("AssertionError", "assert (1 + 2) == 4", 8)
+    # Colour codes from PY_COLORS=1 do not get in the way
+    assert parse_error("\x1b[31mFAILED\x1b[0m test_x.py::test_a - ValueError: x\n").error_type == "ValueError"
+
+
+def test_classify_finds_signatures_at_line_starts_only():
+    assert [p.name for p in registry.classify(GO_PANIC.encode())] == ["go"]
+    assert [p.name for p in registry.classify(NODE)] == ["node"]
+    assert registry.classify("log: nothing to see, panic: not at a line start\n") == []
+    assert registry.classify(b"") == []
+    # Node frames inside unrelated output still reach the Python fallback
+    assert parse_error("noise\n    at nothing useful\n" + PYTHON).error_type == "ValueError"
+
+
+def test_registry_tries_candidates_in_order():
+    class Fixed(LanguageParser):
+        def __init__(self, name, signatures, found):
+            self.name, self.signatures, self.found = name, signatures, found
+            self.calls = 0
+
+        def parse(self, text):
+            self.calls += 1
+            return parse_error(PYTHON) if self.found else None
+
+    first, second, unrelated = Fixed("a", (b"!!", b"ERR "), False), Fixed("b", (b"ERR ",), True), Fixed("c", (b"zzzz",), True)
+    local = Registry()
+    for parser in (first, second, unrelated):
+        local.register(parser)
+    assert local.parse("ok\nERR boom\n") is not None
+    assert (first.calls, second.calls, unrelated.calls) == (1, 1, 0)
+    assert local.parse("nothing\n") is None
+    with pytest.raises(ValueError):
+        local.register(Fixed("d", (b"",), True))
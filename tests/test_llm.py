@@ -1,10 +1,16 @@
 import os
-from unittest.mock import patch
+import tempfile
+from unittest.mock import MagicMock, patch
+from stackback.client import LLMError
 from stackback.llm import LLMExplainer
 from stackback.parser import ParsedError
 
 # Ensure no real API calls are made during tests
 os.environ["OPENAI_API_KEY"] = "sk-fake-key-for-testing"
+os.environ["OPENAI_BASE_URL"] = "http://127.0.0.1:9/v1"
+os.environ["STACKBACK_RETRIES"] = "0"
+# Keep the explanation cache out of the user's home directory
+os.environ.setdefault("STACKBACK_CACHE_DIR", tempfile.mkdtemp(prefix="stackback-test-"))
 
 def test_mock_explain_type_error():
     """Test that the fallback explanation is used when no API key is provided."""
@@ -45,10 +51,8 @@ def test_suggest_fix_returns_string():
         line_number=25,
         traceback="Traceback...",
     )
-    with patch("openai.OpenAI") as mock_openai:
+    with patch("stackback.client.LLMClient.stream", side_effect=LLMError("API call failed")):
         # Prevent actual API call
-        mock_openai.return_value.chat.completions.create.side_effect = Exception("API call failed")
-        
         fix_suggestion = explainer.suggest_fix(error)
         assert isinstance(fix_suggestion, str)
         assert "# Fix for ValueError" in fix_suggestion
@@ -63,9 +67,89 @@ def test_llm_initialization_with_env_var():
 def test_no_api_key_provided():
     """Test that the explainer works without any API key."""
     with patch.dict(os.environ, clear=True):
-        explainer = LLMExplainer(api_key=None)
+        explainer = LLMExplainer(api_key=None, rules=False)
         assert explainer.api_key is None
         error = ParsedError("NameError", "name 'x' is not defined", "test.py", 1, "...")
         explanation = explainer.explain(error)
         assert "NameError" in explanation
         assert "variable name that hasn't been defined" in explanation
+
+def test_explain_stream_yields_tokens_and_ttft():
+    """Streaming goes through the API client chunk by chunk."""
+    explainer = LLMExplainer(api_key="sk-fake", cache=False)
+    client = MagicMock()
+    client.stream.return_value = iter(["The key ", "is missing."])
+    error = ParsedError("KeyError", "'host'", "app.py", 15, "Traceback...")
+    with patch.object(explainer, "_get_client", return_value=client):
+        stream = explainer.explain_stream(error)
+        assert stream.ttft is None
+        assert list(stream) == ["The key ", "is missing."]
+    assert stream.ttft is not None and stream.ttft >= 0
+    assert stream.text == "The key is missing."
+    assert "KeyError" in client.stream.call_args.args[0]
+
+def test_mock_fallback_streams_offline():
+    """Without a client the built-in text is streamed word by word."""
+    explainer = LLMExplainer(api_key=None, provider="mock")
+    error = ParsedError("IndexError", "list index out of range", "app.py", 3, "...")
+    tokens = list(explainer.explain_stream(error))
+    assert len(tokens) > 5
+    assert "".join(tokens) == explainer.explain(error)
+    assert "".join(explainer.suggest_fix_stream(error)).startswith("# Fix for IndexError")
+
+def test_stream_error_midway_keeps_partial_text():
+    explainer = LLMExplainer(api_key="sk-fake", cache=False)
+
+    def broken():
+        yield "partial "
+        raise ConnectionError("reset")
+
+    client = MagicMock()
+    client.stream.return_value = broken()
+    error = ParsedError("ValueError", "bad", "app.py", 1, "...")
+    with patch.object(explainer, "_get_client", return_value=client):
+        assert explainer.explain(error) == "partial "
+
+def test_malformed_provider_event_falls_back():
+    explainer = LLMExplainer(api_key="sk-fake", cache=False, rules=False)
+    client = MagicMock()
+    client.stream.side_effect = KeyError("choices")
+    error = ParsedError("IndexError", "list index out of range", "app.py", 3, "...")
+    with patch.object(explainer, "_get_client", return_value=client):
+        assert "IndexError" in explainer.explain(error)
+        assert explainer.explain_and_fix(error)[1].startswith("# Fix for IndexError")
+    assert isinstance(explainer.last_error, KeyError)
+
+COMBINED_ANSWER = ["EXPLA", "NATION:\nThe dict has no ", "'host' key.\nF", "IX:\n", "host = config.get(", "'host')"]
+
+def test_combined_call_serves_both_menu_choices():
+    """One request fills both the explanation and the fix."""
+    explainer = LLMExplainer(api_key="sk-fake", cache=False, combined=True)
+    client = MagicMock()
+    client.stream.side_effect = lambda prompt, max_tokens: iter(COMBINED_ANSWER)
+    error = ParsedError("KeyError", "'host'", "app.py", 15, "Traceback...")
+    with patch.object(explainer, "_get_client", return_value=client):
+        assert list(explainer.explain_stream(error)) == ["The dict has no ", "'host' key.\n"]
+        assert explainer.suggest_fix(error) == "host = config.get('host')"
+        assert explainer.explain(error) == "The dict has no 'host' key."
+    assert client.stream.call_count == 1
+    assert "EXPLANATION:" in client.stream.call_args.args[0]
+
+def test_explain_and_fix_without_client_uses_fallbacks():
+    explainer = LLMExplainer(api_key=None, provider="mock", combined=True, rules=False)
+    error = ParsedError("KeyError", "'host'", "app.py", 15, "...")
+    explanation, fix = explainer.explain_and_fix(error)
+    assert "KeyError" in explanation
+    assert fix.startswith("# Fix for KeyError")
+
+def test_prefetch_all_uses_one_combined_request():
+    from stackback.prefetch import Prefetcher
+    explainer = LLMExplainer(api_key="sk-fake", cache=False, combined=True)
+    client = MagicMock()
+    client.stream.side_effect = lambda prompt, max_tokens: iter(COMBINED_ANSWER)
+    error = ParsedError("KeyError", "'host'", "app.py", 15, "...")
+    with patch.object(explainer, "_get_client", return_value=client):
+        prefetcher = Prefetcher(explainer, error, kinds=("explain", "fix")).start()
+        assert "".join(prefetcher.stream("fix")) == "host = config.get('host')"
+        assert "".join(prefetcher.stream("explain")).strip() == "The dict has no 'host' key."
+    assert client.stream.call_count == 1
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+from stackback.main import parse_fast_args
+
+
+def test_import_does_not_load_heavy_modules():
+    code = (
+        "import sys, stackback.main; "
+        "print(sorted(m for m in ('typer', 'rich', 'openai') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_parse_fast_args_splits_command_and_options():
+    command, options = parse_fast_args(["python", "app.py", "-p", "mock", "--no-ai", "--prefetch=all"])
+    assert command == ["python", "app.py"]
+    assert options["provider"] == "mock"
+    assert options["no_ai"] is True
+    assert options["prefetch"] == "all"
+    assert options["combined"] is True
+
+
+def test_parse_fast_args_double_dash_ends_options():
+    command, options = parse_fast_args(["--separate", "--", "grep", "-v", "x"])
+    assert command == ["grep", "-v", "x"]
+    assert options["combined"] is False
+    assert options["verbose"] is False
+
+
+def test_parse_fast_args_defers_to_full_cli():
+    assert parse_fast_args([]) is None
+    assert parse_fast_args(["--help"]) is None
+    assert parse_fast_args(["python", "--provider"]) is None
+    assert parse_fast_args(["python", "--prefetch", "bogus"]) is None
+
+
+def test_parse_fast_args_integer_options():
+    _, options = parse_fast_args(["--prompt-tokens", "800", "python", "app.py"])
+    assert options["prompt_tokens"] == 800
+    assert parse_fast_args(["--prompt-tokens=lots", "python"]) is None
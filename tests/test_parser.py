@@ -1,4 +1,6 @@
 """Tests for the error parser."""
+import json
+
 import pytest
 from stackback.parser import parse_error, parse_output, is_error_output, ParsedError
 
@@ -223,3 +225,219 @@ def test_llm_build_prompt():
     assert "ValueError" in prompt
     assert "invalid value" in prompt
     assert "app.py" in prompt
+
+
+# === Incremental scanner tests ===
+
+def test_scanner_emits_on_exception_line():
+    from stackback.parser import TracebackScanner
+    scanner = TracebackScanner()
+    assert scanner.feed(b"starting\nTraceback (most recent call last):\n") == []
+    assert scanner.in_traceback
+    assert scanner.feed('  File "app.py", line 4, in <module>\n    main()\n') == []
+    found = scanner.feed(b"KeyError: 'host'\nmore output\n")
+    assert len(found) == 1
+    assert found[0].error_type == "KeyError"
+    assert found[0].filename == "app.py"
+    assert found[0].line_number == 4
+    assert not scanner.in_traceback
+
+
+def test_scanner_byte_at_a_time():
+    from stackback.parser import TracebackScanner
+    output = b'''noise
+Traceback (most recent call last):
+  File "main.py", line 20, in main
+    result = process(data)
+ValueError: bad'''
+    scanner = TracebackScanner()
+    found = []
+    for i in range(len(output)):
+        found.extend(scanner.feed(output[i:i + 1]))
+    found.extend(scanner.close())
+    assert [e.error_type for e in found] == ["ValueError"]
+    assert found[0].traceback == output.decode().split("\n", 1)[1]
+
+
+def test_scanner_multiple_tracebacks():
+    from stackback.parser import scan_errors
+    output = "\n".join([
+        "Traceback (most recent call last):",
+        '  File "a.py", line 1, in <module>',
+        "TypeError: first",
+        "log line",
+        "Traceback (most recent call last):",
+        '  File "b.py", line 2, in <module>',
+        "KeyboardInterrupt",
+    ])
+    found = scan_errors(output)
+    assert [(e.error_type, e.filename) for e in found] == [("TypeError", "a.py"), ("KeyboardInterrupt", "b.py")]
+
+
+def test_scanner_truncated_traceback_at_close():
+    from stackback.parser import TracebackScanner
+    scanner = TracebackScanner()
+    scanner.feed("Traceback (most recent call last):\n  File \"a.py\", line 3, in f\n")
+    found = scanner.close()
+    assert found[0].error_type == "UnknownError"
+    assert found[0].line_number == 3
+
+
+def test_parse_prefers_user_frame_over_library():
+    output = '''Traceback (most recent call last):
+  File "app.py", line 9, in <module>
+    json.loads(raw)
+  File "/usr/lib/python3.11/json/__init__.py", line 346, in loads
+    return _default_decoder.decode(s)
+json.decoder.JSONDecodeError: Expecting value: line 1 column 1 (char 0)'''
+    result = parse_error(output)
+    assert result.error_type == "json.decoder.JSONDecodeError"
+    assert result.filename == "app.py"
+    assert result.line_number == 9
+
+
+# === parse_all tests ===
+
+CHAINED = '''Traceback (most recent call last):
+  File "app.py", line 4, in load
+    return config["host"]
+KeyError: 'host'
+
+During handling of the above exception, another exception occurred:
+
+Traceback (most recent call last):
+  File "app.py", line 6, in load
+    raise ConfigError("missing host") from None
+ConfigError: missing host
+'''
+
+EXCEPTION_GROUP = '''  + Exception Group Traceback (most recent call last):
+  |   File "tasks.py", line 2, in run
+  |     raise ExceptionGroup("eg", [ValueError(1), ExceptionGroup("inner", [TypeError(2)])])
+  | ExceptionGroup: eg (2 sub-exceptions)
+  +-+---------------- 1 ----------------
+    | ValueError: 1
+    +---------------- 2 ----------------
+    | ExceptionGroup: inner (1 sub-exception)
+    +-+---------------- 1 ----------------
+      | TypeError: 2
+      +------------------------------------
+'''
+
+
+def test_parse_all_yields_every_traceback_with_offsets():
+    from stackback.parser import parse_all
+    first = 'Traceback (most recent call last):\n  File "a.py", line 1, in <module>\nTypeError: first\n'
+    second = 'Traceback (most recent call last):\n  File "b.py", line 2, in <module>\nValueError: second\n'
+    data = ("log\n" + first + "more log\n" + second).encode()
+    found = list(parse_all(data))
+    assert [e.error_type for e in found] == ["TypeError", "ValueError"]
+    assert data[found[0].start:found[0].end] == first.encode()
+    assert data[found[1].start:found[1].end] == second.encode()
+
+
+def test_parse_all_links_chained_exceptions():
+    from stackback.parser import parse_all
+    found = list(parse_all(CHAINED))
+    assert len(found) == 1
+    error = found[0]
+    assert error.error_type == "ConfigError"
+    assert error.cause_kind == "context"
+    assert error.cause.error_type == "KeyError"
+    assert error.start == 0
+    assert error.end == len(CHAINED.encode())
+
+
+def test_parse_all_direct_cause_marker():
+    from stackback.parser import parse_all
+    output = CHAINED.replace(
+        "During handling of the above exception, another exception occurred:",
+        "The above exception was the direct cause of the following exception:",
+    )
+    error = next(parse_all(output))
+    assert error.cause_kind == "cause"
+
+
+def test_parse_all_unrelated_lines_break_chain():
+    from stackback.parser import parse_all
+    output = CHAINED.replace("\nDuring handling", "\nunrelated log line\nDuring handling")
+    assert [e.error_type for e in parse_all(output)] == ["KeyError", "ConfigError"]
+
+
+def test_parse_all_exception_group_tree():
+    from stackback.parser import parse_all
+    found = list(parse_all(EXCEPTION_GROUP + "done\n"))
+    assert len(found) == 1
+    group = found[0]
+    assert group.error_type == "ExceptionGroup"
+    assert group.message == "eg (2 sub-exceptions)"
+    assert group.filename == "tasks.py"
+    assert [e.error_type for e in group.exceptions] == ["ValueError", "ExceptionGroup"]
+    assert [e.error_type for e in group.exceptions[1].exceptions] == ["TypeError"]
+    assert group.end == len(EXCEPTION_GROUP)
+
+
+def test_parse_all_reads_file_objects(tmp_path):
+    from stackback.parser import parse_all
+    path = tmp_path / "worker.log"
+    path.write_text(("ok\n" * 1000 + CHAINED) * 3)
+    with open(path, "rb") as f:
+        found = list(parse_all(f))
+    assert [e.error_type for e in found] == ["ConfigError"] * 3
+
+
+# === Frame / compact storage tests ===
+
+def test_frames_are_structured():
+    output = '''Traceback (most recent call last):
+  File "main.py", line 20, in main
+    result = process(data)
+  File "processor.py", line 15, in process
+    return transform(item)
+           ^^^^^^^^^^^^^^^
+ValueError: bad'''
+    result = parse_error(output)
+    assert [(f.file, f.line, f.function) for f in result.frames] == [
+        ("main.py", 20, "main"),
+        ("processor.py", 15, "process"),
+    ]
+    assert result.frames[1].source == "return transform(item)"
+    assert not hasattr(result.frames[0], "__dict__")
+    assert not hasattr(result, "__dict__")
+
+
+def test_parse_all_without_raw_text_rebuilds_traceback():
+    from stackback.parser import parse_all
+    output = '''Traceback (most recent call last):
+  File "app.py", line 15, in <module>
+    name = config["database"]["host"]
+KeyError: 'host\''''
+    error = next(parse_all(output, keep_raw=False))
+    assert not error.has_raw
+    assert error.traceback == output
+
+
+def test_repeated_paths_are_shared():
+    from stackback.parser import parse_all
+    one = 'Traceback (most recent call last):\n  File "/srv/app/views.py", line 3, in get\nKeyError: 1\n'
+    first, second = parse_all(one * 2, keep_raw=False)
+    assert first.frames[0].file is second.frames[0].file
+
+
+def test_parsed_error_dict_round_trip():
+    text = (
+        "Traceback (most recent call last):\n"
+        '  File "/srv/app/a.py", line 3, in f\n'
+        "    d['k']\n"
+        "KeyError: 'k'\n"
+        "\nThe above exception was the direct cause of the following exception:\n\n"
+        "Traceback (most recent call last):\n"
+        '  File "/srv/app/a.py", line 5, in g\n'
+        "    raise RuntimeError('lookup failed') from e\n"
+        "RuntimeError: lookup failed\n"
+    )
+    error = parse_error(text)
+    copy = ParsedError.from_dict(json.loads(json.dumps(error.to_dict())))
+    assert copy == error
+    assert copy.traceback == error.traceback
+    assert copy.cause == error.cause and copy.cause_kind == "cause"
@@ -0,0 +1,91 @@
+"""Tests for speculative prefetching of LLM answers."""
+import threading
+import time
+
+from stackback.parser import ParsedError
+from stackback.prefetch import Prefetcher
+from stackback.tui import run_interactive
+
+ERROR = ParsedError("KeyError", "'host'", "app.py", 15, "Traceback...")
+
+
+class SlowExplainer:
+    """Fake explainer whose streams take `delay` seconds per token."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.closed = threading.Event()
+
+    def _tokens(self, kind, words):
+        self.calls.append(kind)
+        try:
+            for word in words:
+                time.sleep(self.delay)
+                yield word
+        finally:
+            self.closed.set()
+
+    def explain_stream(self, error):
+        return self._tokens("explain", ["It ", "is ", "missing."])
+
+    def suggest_fix_stream(self, error):
+        return self._tokens("fix", ["config.get(", "'host')"])
+
+
+def test_prefetched_stream_replays_all_tokens():
+    prefetcher = Prefetcher(SlowExplainer(delay=0.01), ERROR, kinds=("explain",)).start()
+    time.sleep(0.1)
+    stream = prefetcher.stream("explain")
+    assert "".join(stream) == "It is missing."
+    assert stream.saved is not None and stream.saved > 0
+
+
+def test_reader_joins_stream_in_flight():
+    prefetcher = Prefetcher(SlowExplainer(delay=0.05), ERROR, kinds=("explain",)).start()
+    stream = prefetcher.stream("explain")
+    assert list(stream) == ["It ", "is ", "missing."]
+
+
+def test_unprefetched_kind_starts_on_demand():
+    explainer = SlowExplainer(delay=0)
+    prefetcher = Prefetcher(explainer, ERROR, kinds=("explain",)).start()
+    assert "".join(prefetcher.stream("fix")) == "config.get('host')"
+    assert sorted(explainer.calls) == ["explain", "fix"]
+
+
+def test_skip_cancels_prefetch(monkeypatch, capsys):
+    explainer = SlowExplainer(delay=0.05)
+    monkeypatch.setattr("builtins.input", lambda prompt: "4")
+    assert run_interactive(ERROR, explainer, prefetch=("explain", "fix")) == "skip"
+    assert explainer.closed.wait(1)
+
+
+def test_menu_choice_uses_prefetched_answer(monkeypatch, capsys):
+    explainer = SlowExplainer(delay=0.01)
+    monkeypatch.setattr("builtins.input", lambda prompt: (time.sleep(0.1), "1")[1])
+    assert run_interactive(ERROR, explainer) == "explain"
+    out = capsys.readouterr().out
+    assert "It is missing." in out
+    assert "prefetch saved" in out
+    assert explainer.calls == ["explain"]
+
+
+def test_cancelled_combined_prefetch_of_a_plain_iterator():
+    class ListExplainer:
+        combined = True
+
+        def __init__(self):
+            self.go = threading.Event()
+
+        def explain_and_fix_stream(self, error, want=None):
+            # Like the daemon client answering from a rule: a list iterator, no close()
+            self.go.wait(2)
+            return iter([("explain", "Missing key."), ("fix", "config.get('host')")])
+
+    explainer = ListExplainer()
+    prefetcher = Prefetcher(explainer, ERROR, kinds=("explain", "fix")).start()
+    prefetcher.cancel()
+    explainer.go.set()
+    for task in prefetcher.tasks.values():
+        assert task.future.exception(timeout=2) is None
@@ -0,0 +1,123 @@
+import json
+import subprocess
+import sys
+
+from stackback import profile
+from stackback.llm import LLMExplainer
+from stackback.parser import parse_error
+from stackback.profile import Profiler, percentile, read_metrics, summarize
+
+TRACEBACK = """Traceback (most recent call last):
+  File "/app/main.py", line 3, in <module>
+    main()
+ValueError: bad value
+"""
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    with profiler.span("parse") as span:
+        pass
+    profiler.add("capture", 0.0, 1.0)
+    profiler.mark("cache_hit")
+    assert span is None and profiler.spans == []
+
+
+def test_spans_breakdown_and_chrome_trace():
+    profiler = Profiler(enabled=True)
+    with profiler.span("parse", bytes=10) as span:
+        span.args["found"] = True
+    profiler.add("capture", profiler.origin, profiler.origin + 0.25, returncode=1)
+    profiler.mark("cache_hit")
+    totals = profiler.totals()
+    assert list(totals) == ["capture", "parse", "cache_hit"]
+    assert totals["parse"]["args"] == {"bytes": 10, "found": True}
+    assert "capture" in profiler.breakdown() and "returncode=1" in profiler.breakdown()
+
+    events = profiler.chrome_trace()["traceEvents"]
+    phases = {event["name"]: event["ph"] for event in events}
+    assert phases == {"parse": "X", "capture": "X", "cache_hit": "i", "thread_name": "M"}
+    capture = next(event for event in events if event["name"] == "capture")
+    assert (capture["ts"], capture["dur"]) == (0.0, 250000.0)
+
+
+def test_llm_span_has_ttft_and_tokens(monkeypatch):
+    class Client:
+        def stream(self, prompt, max_tokens):
+            yield from ["EXPLANATION:\nBad ", "value.\n", "FIX:\nx = 1"]
+
+    monkeypatch.setattr(profile, "profiler", Profiler(enabled=True))
+    monkeypatch.setattr("stackback.llm.profiler", profile.profiler)
+    explainer = LLMExplainer(api_key="k", cache=False, rules=False, combined=True)
+    monkeypatch.setattr(explainer, "_get_client", lambda: Client())
+    explanation, fix = explainer.explain_and_fix(parse_error(TRACEBACK))
+    assert (explanation.strip(), fix) == ("Bad value.", "x = 1")
+    (span,) = profile.profiler.spans
+    assert span.name == "llm" and span.args["tokens"] == 3 and span.args["ttft_ms"] >= 0
+    assert span.args["provider"] == "openai" and span.args["prompt_tokens"] > 0
+
+
+def test_metrics_log_and_percentiles(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    for wall in range(1, 101):
+        profile.append_metrics({"wall_ms": wall, "stages": {"parse": wall / 10}}, path)
+    records = read_metrics(path)
+    assert len(records) == 100
+    summary = summarize(records)
+    assert (summary["wall_ms"]["p50"], summary["wall_ms"]["p95"], summary["wall_ms"]["max"]) == (50, 95, 100)
+    assert summary["parse"]["p99"] == 9.9
+    assert percentile([3.0], 95) == 3.0
+
+
+def test_metrics_log_is_trimmed(tmp_path, monkeypatch):
+    monkeypatch.setattr(profile, "MAX_METRICS_BYTES", 2000)
+    path = str(tmp_path / "metrics.jsonl")
+    for run in range(200):
+        profile.append_metrics({"run": run}, path)
+    records = read_metrics(path)
+    assert records[-1] == {"run": 199} and len(records) < 200
+    assert [r["run"] for r in records] == list(range(records[0]["run"], 200))
+
+
+def test_profile_flag_and_metrics_log(tmp_path):
+    trace, metrics = tmp_path / "trace.json", tmp_path / "metrics.jsonl"
+    code = "import sys; from stackback.main import main; main(sys.argv[1:])"
+    proc = subprocess.run(
+        [sys.executable, "-c", code, "--no-ai", "--profile", "--profile-out", str(trace),
+         sys.executable, "-c", "raise ValueError('bad value')"],
+        capture_output=True, text=True, stdin=subprocess.DEVNULL,
+        env={"STACKBACK_METRICS": str(metrics), "STACKBACK_HISTORY": str(tmp_path / "history"), "PATH": "/usr/bin:/bin"},
+    )
+    assert proc.returncode == 1
+    assert "sb profile:" in proc.stderr and "capture" in proc.stderr
+    names = {event["name"] for event in json.loads(trace.read_text())["traceEvents"]}
+    assert {"spawn", "capture", "detect", "import"} <= names
+    (record,) = read_metrics(str(metrics))
+    assert record["error_type"] == "ValueError" and record["stages"]["capture"] > 0
+
+
+def test_verbose_prints_the_breakdown_without_a_trace(tmp_path):
+    code = "import sys; from stackback.main import main; main(sys.argv[1:])"
+    proc = subprocess.run(
+        [sys.executable, "-c", code, "--no-ai", "-v", sys.executable, "-c", "raise ValueError('bad value')"],
+        capture_output=True, text=True, stdin=subprocess.DEVNULL, cwd=str(tmp_path),
+        env={"STACKBACK_CACHE_DIR": str(tmp_path / "cache"), "STACKBACK_HISTORY": "0", "PATH": "/usr/bin:/bin"},
+    )
+    assert proc.returncode == 1
+    assert "sb profile:" in proc.stderr and "capture" in proc.stderr and "trace:" not in proc.stderr
+
+
+def test_rule_counters_reach_the_metrics_log(tmp_path):
+    from stackback.main import _finish_profile
+    from stackback.rules import engine
+
+    engine.answer(parse_error("Traceback (most recent call last):\n  File \"a.py\", line 1, in <module>\n"
+                              "    config['host']\nKeyError: 'host'\n"))
+    path = str(tmp_path / "metrics.jsonl")
+    _finish_profile(["python"], False, None, path)
+    (record,) = read_metrics(path)
+    assert record["rules"]["lookups"] >= 1 and record["rules"]["by_rule"]["missing_key"] >= 1
+    total = profile.summarize_rules([record, record, {"stages": {}}])
+    assert total["lookups"] == 2 * record["rules"]["lookups"]
+    assert total["hit_rate"] == record["rules"]["hit_rate"]
+    assert profile.summarize_rules([{"stages": {}}]) is None
@@ -0,0 +1,108 @@
+import re
+import threading
+import time
+
+import pytest
+
+from stackback.client import LLMError
+from stackback.llm import LLMExplainer, make_explainer
+from stackback.parser import ParsedError
+from stackback.router import ProviderStats, Route, Router, load_stats
+
+
+class FakeProvider:
+    """Answers after `delay` seconds unless the router closes the response first."""
+
+    def __init__(self, text="answer", delay=0.0, fail=None):
+        self.text = text
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.aborted = threading.Event()
+
+    def close(self):  # the "response" handed to on_open
+        self.aborted.set()
+
+    def stream(self, prompt, max_tokens, on_open=None):
+        self.calls += 1
+        if on_open is not None:
+            on_open(self)
+        if self.aborted.wait(self.delay):
+            raise LLMError("aborted")
+        if self.fail:
+            raise self.fail
+        yield from re.findall(r"\S+\s*", self.text)
+
+
+def _router(*providers, **options):
+    return Router([Route(name, provider) for name, provider in providers], **options)
+
+
+def test_fastest_healthy_provider_is_tried_first():
+    slow, fast, broken, new = ProviderStats([2.0] * 5), ProviderStats([0.2] * 5), ProviderStats([0.1] * 5), ProviderStats()
+    for _ in range(3):
+        broken.failure()
+    router = Router([Route("slow", None, slow), Route("new", None, new),
+                     Route("broken", None, broken), Route("fast", None, fast)])
+    assert [route.name for route in router.ranked()] == ["fast", "slow", "new", "broken"]
+    assert not broken.healthy() and broken.healthy(now=time.time() + 60) is False  # still mostly failures
+    assert router.deadline(router.routes[0]) == 2.0 and router.deadline(router.routes[1]) == 3.0
+
+
+def test_fast_primary_is_not_hedged():
+    a, b = FakeProvider("from a"), FakeProvider("from b")
+    router = _router(("a", a), ("b", b), hedge_after=0.5)
+    assert router.complete("q") == "from a"
+    assert (a.calls, b.calls) == (1, 0) and router.last_route == {"provider": "a", "hedged": False}
+    assert len(router.routes[0].stats.ttft) == 1
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    a, b = FakeProvider("from a", delay=5), FakeProvider("from b", delay=0.05)
+    router = _router(("a", a), ("b", b), hedge_after=0.1)
+    started = time.perf_counter()
+    assert router.complete("q") == "from b"
+    assert time.perf_counter() - started < 1
+    assert router.last_route == {"provider": "b", "hedged": True}
+    assert a.aborted.wait(1)
+    stats = {route.name: route.stats for route in router.routes}
+    assert stats["a"].ttft[0] >= 0.1 and list(stats["a"].outcomes) == []  # slow, not failed
+    assert list(stats["b"].outcomes) == [1]
+
+
+def test_failure_falls_through_to_the_next_provider():
+    a, b, c = FakeProvider(fail=LLMError("down")), FakeProvider("from b"), FakeProvider("from c")
+    router = _router(("a", a), ("b", b), ("c", c), hedge_after=5)
+    assert router.complete("q") == "from b"
+    assert c.calls == 0 and list(router.routes[0].stats.outcomes) == [0]
+
+    router.routes[1].client = FakeProvider(fail=ConnectionError("reset"))
+    router.routes[2].client = FakeProvider(fail=LLMError("quota"))
+    with pytest.raises(LLMError, match="quota"):
+        router.complete("q")
+
+
+def test_stats_are_saved_and_loaded(tmp_path):
+    path = str(tmp_path / "router.json")
+    router = _router(("a", FakeProvider(fail=LLMError("down"))), ("b", FakeProvider("ok")),
+                     hedge_after=5, stats_path=path)
+    for _ in range(5):
+        router.complete("q")
+    stats = load_stats(path)
+    # Two failures in a row put "a" in cooldown: the last three runs went straight to "b"
+    assert list(stats["a"].outcomes) == [0, 0] and len(stats["b"].ttft) == 5
+    again = _router(("a", FakeProvider()), ("b", FakeProvider()), stats_path=path)
+    assert [route.name for route in again.ranked()] == ["b", "a"]
+    assert again.stats()["a"]["healthy"] is False and again.stats()["b"]["samples"] == 5
+
+
+def test_explainer_streams_through_the_router(monkeypatch):
+    router = _router(("a", FakeProvider("Check the key.")), hedge_after=5)
+    explainer = LLMExplainer(provider="a", client=router, cache=False, rules=False)
+    error = ParsedError("KeyError", "'host'", "app.py", 15, "Traceback...")
+    assert explainer.explain(error) == "Check the key."
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-1")
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    routed = make_explainer(provider="openai,claude,ollama")
+    assert [route.name for route in routed._get_client().routes] == ["openai", "ollama"]
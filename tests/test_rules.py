@@ -0,0 +1,100 @@
+from unittest.mock import MagicMock
+
+from stackback.llm import LLMExplainer
+from stackback.parser import parse_error
+from stackback.rules import RuleEngine, engine
+
+
+def _error(message, source="x = 1", path="/srv/app/main.py"):
+    return parse_error(
+        "Traceback (most recent call last):\n"
+        f'  File "{path}", line 3, in main\n'
+        f"    {source}\n"
+        f"{message}\n"
+    )
+
+
+def test_module_not_found_maps_import_to_package():
+    answer = engine.answer(_error("ModuleNotFoundError: No module named 'yaml'", "import yaml"))
+    assert answer.confident and answer.rule == "module_not_found"
+    assert answer.fix == "python -m pip install PyYAML"
+    answer = engine.answer(_error("ModuleNotFoundError: No module named 'requests.adapters'"))
+    assert answer.fix == "python -m pip install requests"
+
+
+def test_module_not_found_for_local_module_is_not_confident(tmp_path):
+    (tmp_path / "helpers.py").write_text("")
+    answer = engine.answer(_error("ModuleNotFoundError: No module named 'helpers'", path=str(tmp_path / "app.py")))
+    assert not answer.confident and "pip" not in answer.fix
+
+
+def test_name_error_typos_and_missing_imports(tmp_path):
+    answer = engine.answer(_error("NameError: name 'prnt' is not defined", "prnt(total)"))
+    assert answer.confident and answer.fix == "print(total)"
+    answer = engine.answer(_error("NameError: name 'np' is not defined", "np.zeros(3)"))
+    assert answer.fix == "import numpy as np"
+    # `datetime` may be the module or the class: a hint for the LLM, not an answer
+    answer = engine.answer(_error("NameError: name 'datetime' is not defined", "datetime.now()"))
+    assert not answer.confident and answer.fix == "from datetime import datetime"
+    answer = engine.answer(_error("NameError: name 'datetime' is not defined", "datetime.datetime.now()"))
+    assert answer.fix == "import datetime"
+    # Names from the script itself are candidates too
+    script = tmp_path / "job.py"
+    script.write_text("def load_records():\n    pass\n\nload_recods()\n")
+    answer = engine.answer(_error("NameError: name 'load_recods' is not defined", "load_recods()", str(script)))
+    assert answer.fix == "load_records()"
+
+
+def test_key_error_rewrites_the_subscript():
+    answer = engine.answer(_error("KeyError: 'host'", "host = config['host']"))
+    assert answer.confident and answer.fix == "host = config.get('host')"
+    answer = engine.answer(_error("KeyError: 'n'", "counts['n'] += 1"))
+    assert not answer.confident
+
+
+def test_file_not_found_relative_to_script(tmp_path, monkeypatch):
+    (tmp_path / "data.csv").write_text("a,b\n")
+    monkeypatch.chdir("/")
+    error = _error("FileNotFoundError: [Errno 2] No such file or directory: 'data.csv'",
+                   "open('data.csv')", str(tmp_path / "app.py"))
+    answer = engine.answer(error)
+    assert answer.confident and "Path(__file__).parent" in answer.fix
+    monkeypatch.chdir(tmp_path)
+    answer = engine.answer(_error("FileNotFoundError: [Errno 2] No such file or directory: 'dta.csv'"))
+    assert answer.fix == "'data.csv'"
+
+
+def test_dispatch_by_type_and_hit_rate():
+    rules = RuleEngine()
+    calls = []
+
+    @rules.register("ValueError", r"invalid literal for int\(\) with base \d+: '(.*)'")
+    def bad_int(error, match):
+        from stackback.rules import Answer
+        calls.append(match.group(1))
+        return Answer("Not a number.", "int(value.strip())", 0.9)
+
+    assert rules.answer(_error("KeyError: 'x'")) is None
+    assert rules.answer(_error("ValueError: math domain error")) is None
+    assert rules.answer(_error("ValueError: invalid literal for int() with base 10: 'abc'")).rule == "bad_int"
+    assert calls == ["abc"]
+    assert rules.stats() == {"lookups": 3, "hits": 1, "confident": 1, "hit_rate": 0.333, "by_rule": {"bad_int": 1}}
+
+
+def test_confident_rule_skips_the_llm():
+    explainer = LLMExplainer(api_key="sk-fake", cache=False, combined=True)
+    client = MagicMock()
+    explainer._client = client
+    error = _error("ModuleNotFoundError: No module named 'cv2'", "import cv2")
+    assert explainer.suggest_fix(error) == "python -m pip install opencv-python"
+    assert "not installed" in explainer.explain(error)
+    assert client.stream.call_count == 0
+    # Not confident: the LLM is asked
+    client.stream.side_effect = lambda prompt, max_tokens: iter(["EXPLANATION:\nok\nFIX:\nx"])
+    explainer.explain(_error("KeyError: 'k'"))
+    assert client.stream.call_count == 1
+    # And rules can be turned off
+    off = LLMExplainer(api_key="sk-fake", cache=False, rules=False)
+    off._client = client
+    off.explain(error)
+    assert client.stream.call_count == 2
@@ -0,0 +1,35 @@
+"""Tests for the streaming command runner."""
+import io
+import signal
+import sys
+
+from stackback.runner import TailBuffer, stream_command
+
+
+def test_tail_buffer_keeps_last_bytes():
+    tail = TailBuffer(limit=10)
+    for _ in range(100):
+        tail.write(b"0123456789abc")
+    assert tail.getvalue() == b"3456789abc"
+    assert tail.total == 1300
+
+
+def test_stream_command_tees_stderr_and_keeps_tail():
+    sink = io.BytesIO()
+    code = "import sys; sys.stderr.write('x' * 100000 + '\\nKeyError: 1\\n'); sys.exit(3)"
+    result = stream_command([sys.executable, "-c", code], tail_bytes=64, stderr_sink=sink)
+    assert result.returncode == 3
+    assert result.exit_code == 3
+    assert result.error_detected
+    assert result.error.error_type == "KeyError"
+    assert result.stderr_bytes == len(sink.getvalue()) == 100013
+    assert len(result.stderr_tail) == 64
+    assert result.stderr_text.endswith("KeyError: 1\n")
+
+
+def test_stream_command_reports_signal():
+    code = "import os, signal; os.kill(os.getpid(), signal.SIGTERM)"
+    result = stream_command([sys.executable, "-c", code], stderr_sink=io.BytesIO())
+    assert result.signal == signal.SIGTERM
+    assert result.exit_code == 128 + signal.SIGTERM
+    assert not result.error_detected
@@ -0,0 +1,121 @@
+import os
+
+from stackback.llm import LLMExplainer
+from stackback.parser import ParsedError, parse_error
+from stackback.source import SourceCache, attach_source_context, render_context
+from stackback.tui import run_interactive
+
+SCRIPT = "".join(f"line_{n} = {n}\n" for n in range(1, 21))
+
+
+def _traceback(path, lines, library=False):
+    frames = "".join(f'  File "{path}", line {n}, in f{n}\n    line_{n} = {n}\n' for n in lines)
+    if library:
+        frames += '  File "/usr/lib/python3.11/site-packages/lib/core.py", line 5, in g\n    x\n'
+    return f"Traceback (most recent call last):\n{frames}ValueError: bad\n"
+
+
+def test_one_read_per_file_for_many_frames(tmp_path):
+    path = tmp_path / "app.py"
+    path.write_text(SCRIPT)
+    cache = SourceCache()
+    error = parse_error(_traceback(path, [2, 5, 9, 12, 15, 19] * 30, library=True))
+    attach_source_context(error, radius=1, max_frames=200, cache=cache)
+    assert cache.reads == 1
+    # Library frames are skipped, every user frame is read
+    assert len(error.context) == 180 and len(error.frames) - 1 not in error.context
+    assert error.context[0] == (1, ("line_1 = 1", "line_2 = 2", "line_3 = 3"))
+    attach_source_context(error, cache=cache)
+    assert cache.reads == 1
+
+
+def test_changed_files_are_reread(tmp_path):
+    path = tmp_path / "app.py"
+    path.write_text(SCRIPT)
+    cache = SourceCache()
+    assert cache.getline(str(path), 3) == "line_3 = 3"
+    path.write_text(SCRIPT.replace("line_3 = 3", "line_3 = 'three'"))
+    assert cache.getline(str(path), 3) == "line_3 = 'three'"
+    assert cache.reads == 2
+    assert cache.getline(str(tmp_path / "missing.py"), 1) == ""
+
+
+def test_large_files_are_mapped_and_indexed_lazily(tmp_path, monkeypatch):
+    monkeypatch.setattr("stackback.source.MMAP_THRESHOLD", 0)
+    path = tmp_path / "big.py"
+    path.write_text(SCRIPT + "tail_without_newline")
+    cache = SourceCache()
+    assert cache.lines(str(path), 4, 5) == ["line_4 = 4", "line_5 = 5"]
+    entry = cache._files[str(path)]
+    assert entry.data is not None and len(entry.offsets) == 6
+    assert cache.lines(str(path), 20, 30) == ["line_20 = 20", "tail_without_newline"]
+    cache.clear()
+
+
+def test_mapped_file_evicted_during_a_read_is_read_again(tmp_path, monkeypatch):
+    monkeypatch.setattr("stackback.source.MMAP_THRESHOLD", 0)
+    big, other = tmp_path / "big.py", tmp_path / "other.py"
+    big.write_text(SCRIPT)
+    other.write_text(SCRIPT)
+    cache = SourceCache(max_files=1)
+    lookup = cache._file
+
+    def racing(path):
+        # Another thread evicts (and closes) the entry right after it is returned
+        entry = lookup(path)
+        monkeypatch.setattr(cache, "_file", lookup)
+        lookup(str(other))
+        return entry
+
+    monkeypatch.setattr(cache, "_file", racing)
+    assert cache.lines(str(big), 4, 5) == ["line_4 = 4", "line_5 = 5"]
+    assert cache.reads == 3
+    cache.clear()
+
+
+def test_lru_evicts_least_recently_used(tmp_path):
+    cache = SourceCache(max_files=2)
+    paths = []
+    for name in "abc":
+        paths.append(str(tmp_path / f"{name}.py"))
+        with open(paths[-1], "w") as f:
+            f.write(SCRIPT)
+    cache.getline(paths[0], 1)
+    cache.getline(paths[1], 1)
+    cache.getline(paths[0], 2)
+    cache.getline(paths[2], 1)
+    assert list(cache._files) == [paths[0], paths[2]]
+
+
+def test_context_is_rendered_and_serialized(tmp_path):
+    path = tmp_path / "app.py"
+    path.write_text(SCRIPT)
+    error = attach_source_context(parse_error(_traceback(path, [4, 10])), radius=1, max_frames=1)
+    assert list(error.context) == [1]
+    assert render_context(error) == (
+        f"{path}, in f10:\n"
+        "   9 | line_9 = 9\n"
+        "> 10 | line_10 = 10\n"
+        "  11 | line_11 = 11"
+    )
+    copy = ParsedError.from_dict(error.to_dict())
+    assert copy.context == error.context
+
+
+def test_prompt_includes_source(tmp_path):
+    path = tmp_path / "app.py"
+    path.write_text(SCRIPT)
+    error = parse_error(_traceback(path, [7]))
+    prompt = LLMExplainer(api_key="sk-fake", cache=False)._build_prompt(error)
+    assert "Source around the failing lines" in prompt and ">  7 | line_7 = 7" in prompt
+    off = LLMExplainer(api_key="sk-fake", cache=False, source_context=False)
+    assert "Source around" not in off._build_prompt(parse_error(_traceback(path, [7])))
+
+
+def test_fix_without_explainer_shows_code(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "app.py"
+    path.write_text(SCRIPT)
+    monkeypatch.setattr("builtins.input", lambda prompt: "2")
+    run_interactive(parse_error(_traceback(path, [7])))
+    out = capsys.readouterr().out
+    assert f"# Check line 7 in {path}" in out and ">  7 | line_7 = 7" in out
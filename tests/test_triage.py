@@ -0,0 +1,74 @@
+from stackback.triage import parse_slice, split_file, triage
+
+KEY_ERROR = (
+    "Traceback (most recent call last):\n"
+    '  File "/srv/app/handler.py", line 12, in handle\n'
+    "    user = users[uid]\n"
+    "KeyError: 42\n"
+)
+CHAIN = (
+    "Traceback (most recent call last):\n"
+    '  File "/srv/app/db.py", line 5, in query\n'
+    "    conn.execute(sql)\n"
+    "ConnectionResetError: reset\n"
+    "\nThe above exception was the direct cause of the following exception:\n\n"
+    "Traceback (most recent call last):\n"
+    '  File "/srv/app/api.py", line 9, in get\n'
+    "    raise UpstreamError('db') from exc\n"
+    "UpstreamError: db\n"
+)
+
+
+def _write_log(path, blocks):
+    lines = []
+    for i in range(blocks):
+        lines.append("INFO request %d ok\n" % i)
+        lines.append(KEY_ERROR if i % 2 == 0 else CHAIN)
+    path.write_text("".join(lines))
+    return path
+
+
+def test_slices_never_split_a_traceback_or_chain(tmp_path):
+    log = _write_log(tmp_path / "app.log", 200)
+    size = log.stat().st_size
+    pieces = split_file(str(log), size, 700)
+    assert len(pieces) > 10
+    data = log.read_bytes()
+    for _, start, end in pieces[1:]:
+        assert data[start:].startswith(b"Traceback")
+        assert not data[:start].rstrip().endswith(b"following exception:")
+    whole, _ = parse_slice((str(log), 0, size))
+    counts = {}
+    for piece in pieces:
+        for key, (count, *_rest) in parse_slice(piece)[0].items():
+            counts[key] = counts.get(key, 0) + count
+    assert counts == {key: group[0] for key, group in whole.items()}
+
+
+def test_triage_groups_and_ranks_by_fingerprint(tmp_path):
+    (tmp_path / "logs").mkdir()
+    _write_log(tmp_path / "logs" / "a.log", 9)
+    _write_log(tmp_path / "logs" / "b.log", 4)
+    (tmp_path / "logs" / ".hidden").write_text(KEY_ERROR)
+    report = triage([str(tmp_path / "logs")], slice_size=300)
+    assert report.files == 2
+    assert [(g.error.error_type, g.count) for g in report.groups] == [("KeyError", 7), ("UpstreamError", 6)]
+    top = report.groups[0]
+    assert top.first == (str(tmp_path / "logs" / "a.log"), 2)
+    # b.log: INFO, KeyError (2-5), INFO, chain (7-17), INFO, KeyError at 19
+    assert top.last == (str(tmp_path / "logs" / "b.log"), 19)
+    assert len(top.files) == 2
+    # Chains are reported once, with the cause kept
+    assert report.groups[1].error.cause.error_type == "ConnectionResetError"
+
+
+def test_triage_with_process_pool_matches_serial(tmp_path):
+    log = _write_log(tmp_path / "app.log", 100)
+    # Small input runs in-process unless the jobs are given
+    assert triage([str(log)]).jobs == 1
+    serial = triage([str(log)], jobs=1, slice_size=2000)
+    pooled = triage([str(log)], jobs=2, slice_size=2000)
+    assert pooled.jobs == 2
+    assert [(g.fingerprint, g.count, g.first, g.last) for g in pooled.groups] == [
+        (g.fingerprint, g.count, g.first, g.last) for g in serial.groups
+    ]
@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import time
+
+from stackback.parser import parse_error
+from stackback.watch import Session, Watcher, changes, snapshot, watch
+
+TRACEBACK = """Traceback (most recent call last):
+  File "/app/main.py", line 3, in <module>
+    main()
+KeyError: 'port'
+"""
+
+
+class Stream:
+    def __init__(self, text):
+        self.text = text
+
+    def __iter__(self):
+        yield self.text
+
+
+class CountingExplainer:
+    def __init__(self):
+        self.calls = 0
+
+    def explain_stream(self, error):
+        self.calls += 1
+        return Stream(f"explanation {self.calls} for {error.error_type}")
+
+
+def render(stream):
+    return "".join(stream)
+
+
+def test_snapshot_skips_ignored_dirs_and_reports_changes(tmp_path):
+    (tmp_path / "app.py").write_text("x = 1\n")
+    (tmp_path / "__pycache__").mkdir()
+    (tmp_path / "__pycache__" / "app.cpython.pyc").write_bytes(b"\0")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "index").write_bytes(b"\0")
+    before = snapshot([str(tmp_path)])
+    assert list(before) == [str(tmp_path / "app.py")]
+
+    (tmp_path / "app.py").write_text("x = 22\n")
+    (tmp_path / "new.py").write_text("")
+    assert changes(before, snapshot([str(tmp_path)])) == [str(tmp_path / "app.py"), str(tmp_path / "new.py")]
+    os.remove(tmp_path / "new.py")
+    assert changes(before, snapshot([str(tmp_path)])) == [str(tmp_path / "app.py")]
+
+
+def test_watcher_debounces_a_burst_of_writes(tmp_path):
+    path = tmp_path / "app.py"
+    path.write_text("")
+    watcher = Watcher([str(tmp_path)], interval=0.01, debounce=0.15)
+
+    def burst():
+        for i in range(5):
+            path.write_text("x" * (i + 1))
+            time.sleep(0.03)
+        (tmp_path / "other.py").write_text("")
+
+    writer = threading.Thread(target=burst)
+    started = time.monotonic()
+    writer.start()
+    changed = watcher.wait(timeout=5)
+    writer.join()
+    assert changed == [str(path), str(tmp_path / "other.py")]
+    assert time.monotonic() - started >= 0.15 + 0.12
+    assert watcher.wait(timeout=0.05) == []
+
+
+def test_session_reuses_explanation_for_unchanged_error():
+    explainer = CountingExplainer()
+    session = Session(explainer)
+    error = parse_error(TRACEBACK)
+    other = parse_error(TRACEBACK.replace("KeyError: 'port'", "ValueError: bad"))
+
+    assert session.classify(error) == "new"
+    assert session.explain(error, render) == "explanation 1 for KeyError"
+    assert session.classify(parse_error(TRACEBACK.replace("line 3", "line 7"))) == "same"
+    assert session.explain(error, render) == "explanation 1 for KeyError"
+    assert session.classify(other) == "new"
+    assert session.explain(other, render) == "explanation 2 for ValueError"
+    assert session.classify(error) == "seen"
+    assert session.classify(None) == "fixed" and session.classify(None) == "clean"
+    assert explainer.calls == session.requests == 2
+
+
+def test_watch_reruns_on_change_and_explains_only_new_errors(tmp_path, capsys, monkeypatch):
+    monkeypatch.setenv("STACKBACK_HISTORY", str(tmp_path / "history"))
+    script = tmp_path / "app.py"
+    script.write_text("raise KeyError('port')\n")
+    explainer = CountingExplainer()
+
+    def edit():
+        for source in ("# moved down a line\nraise KeyError('port')\n", "raise ValueError('bad')\n", "print('ok')\n"):
+            time.sleep(0.5)
+            script.write_text(source)
+
+    threading.Thread(target=edit, daemon=True).start()
+    session = watch([sys.executable, str(script)], [str(tmp_path)], explainer,
+                    interval=0.02, debounce=0.05, max_runs=4)
+    out = capsys.readouterr().out
+    assert explainer.calls == 2 and session.previous is None
+    assert "Same error as the last run; explanation from then:\n\nexplanation 1 for KeyError" in out
+    assert "explanation 2 for ValueError" in out
+    assert "error fixed, exit 0" in out